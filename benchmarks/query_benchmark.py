@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Benchmarks the admin and reporting queries of the mail and event tables.
+
+Seed a database once, then run the benchmark before and after migrating django_rebel to compare plans and timings:
+
+    python benchmarks/query_benchmark.py --seed 20000000
+    python manage.py migrate django_rebel 0009
+    python benchmarks/query_benchmark.py
+    python manage.py migrate django_rebel
+    python benchmarks/query_benchmark.py
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(count, chunk_size=1000000):
+    from django.db import connection
+
+    from django_rebel.models import Event, Mail
+
+    with connection.cursor() as cursor:
+        for start in range(0, count, chunk_size):
+            stop = min(count, start + chunk_size)
+
+            cursor.execute("""
+                INSERT INTO {mail_table} (email_from, email_to, message_id, profile, created_at, updated_at,
+                                          has_accepted, has_rejected, has_delivered, has_failed, has_opened,
+                                          has_clicked, has_unsubscribed, has_complained, has_stored,
+                                          open_count, click_count)
+                SELECT 'from@example.com', 'user' || i || '@example.com', 'message_' || i, 'DEFAULT',
+                       now() - (random() * interval '365 days'), now(),
+                       true, false, random() < 0.95, random() < 0.05, random() < 0.3,
+                       random() < 0.05, false, false, false,
+                       0, 0
+                FROM generate_series(%s, %s) AS i
+            """.format(mail_table=Mail._meta.db_table), [start, stop - 1])
+
+            cursor.execute("""
+                INSERT INTO {event_table} (mail_id, name, created_at, updated_at)
+                SELECT id, name, created_at, created_at
+                FROM {mail_table},
+                     LATERAL (VALUES ('delivered', has_delivered), ('opened', has_opened),
+                                     ('clicked', has_clicked)) AS events(name, happened)
+                WHERE happened AND id > (SELECT coalesce(max(mail_id), 0) FROM {event_table})
+            """.format(event_table=Event._meta.db_table, mail_table=Mail._meta.db_table))
+
+            print("Seeded %d mails" % stop, flush=True)
+
+        cursor.execute("ANALYZE %s" % Mail._meta.db_table)
+        cursor.execute("ANALYZE %s" % Event._meta.db_table)
+
+
+def get_queries():
+    from django.utils import timezone
+
+    from django_rebel.models import Event, Mail
+
+    last_week = timezone.now() - timezone.timedelta(days=7)
+    mail_id = Mail.objects.order_by("-id").values_list("id", flat=True).first()
+
+    return [
+        ("admin: opened filter page",
+         Mail.objects.filter(has_opened=True).order_by("-created_at", "-id")[:100]),
+        ("admin: clicked filter page",
+         Mail.objects.filter(has_clicked=True).order_by("-created_at", "-id")[:100]),
+        ("admin: with_event_status page",
+         Mail.objects.with_event_status().order_by("-created_at", "-id")[:100]),
+        ("report: not delivered last week",
+         Mail.objects.filter(has_delivered=False, created_at__gte=last_week).values("id")),
+        ("report: clicked last week",
+         Mail.objects.filter(has_clicked=True, created_at__gte=last_week).values("id")),
+        ("event: opened exists for mail",
+         Event.objects.filter(mail_id=mail_id, name="opened").values("id")[:1]),
+    ]
+
+
+def explain(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return plan[0]
+
+
+def benchmark(repeat):
+    for name, queryset in get_queries():
+        timings = []
+        plan = None
+
+        for _ in range(repeat):
+            plan = explain(queryset)
+            timings.append(plan["Execution Time"])
+
+        print("%-40s %10.2f ms  %s" % (name, min(timings), plan["Plan"]["Node Type"]))
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.test_settings")
+    django.setup()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, help="Insert this many mails with their events before benchmarking")
+    parser.add_argument("--repeat", type=int, default=3)
+    arguments = parser.parse_args()
+
+    if arguments.seed:
+        started_at = time.time()
+        seed(arguments.seed)
+        print("Seeded in %.1f s" % (time.time() - started_at))
+
+    benchmark(arguments.repeat)
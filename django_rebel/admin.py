@@ -1,26 +1,108 @@
 from django.conf import settings
 from django.contrib import admin
 from django.contrib.admin.templatetags.admin_list import _boolean_icon
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.contenttypes.models import ContentType
 from django.utils.html import format_html
 
-from django_rebel.paginator import LargeListPaginator
-from .models import Mail, MailContent, Event, MailLabel
+from django_rebel.registry import label_registry
+from django_rebel.search import ADMIN_SEARCH_FIELDS, get_search_settings, search_mails
+from django_rebel.paginator import LargeListPaginator, KeysetPaginator, InvalidCursor
+from .models import Mail, MailContent, Event, MailLabel, MailDailyStat
+
+
+class LargeListChangeList(ChangeList):
+    """
+    Change list which leaves the list_defer columns of the admin out of the rows
+    """
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+
+        if self.model_admin.list_defer:
+            queryset = queryset.defer(*self.model_admin.list_defer)
+
+        return queryset
 
 
 class LargeListAdminMixin:
     max_num_pages = 100
     paginator = LargeListPaginator
     show_full_result_count = False
+    # Columns which are not displayed in the list, they are still loaded by the change view
+    list_defer = ()
 
     def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
         return self.paginator(self.max_num_pages, queryset, per_page, orphans, allow_empty_first_page)
 
+    def get_changelist(self, request, **kwargs):
+        return LargeListChangeList
+
+
+CURSOR_VAR = "cursor"
+
+
+class KeysetChangeList(LargeListChangeList):
+    """
+    Change list which pages with the cursors of KeysetPaginator, the links are rendered by
+    admin/rebel_keyset_pagination.html
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+
+        return lookup_params
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+        # Links of the filters and the cursors start from the first page
+        cursor = self.params.pop(CURSOR_VAR, None)
+
+        try:
+            page = paginator.get_cursor_page(cursor)
+        except InvalidCursor:
+            page = paginator.get_cursor_page()
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = page.object_list
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = paginator
+        self.page = page
+
+    def get_next_url(self):
+        if self.page.has_next():
+            return self.get_query_string({CURSOR_VAR: self.page.next_cursor})
+
+    def get_previous_url(self):
+        if self.page.has_previous():
+            return self.get_query_string({CURSOR_VAR: self.page.previous_cursor})
+
+
+class KeysetListAdminMixin(LargeListAdminMixin):
+    """
+    Pages the change list by (created_at, id) without a page limit, columns are not sortable
+    """
+    max_num_pages = None
+    paginator = KeysetPaginator
+    sortable_by = ()
+    # Renders the cursor links instead of the page numbers
+    change_list_template = "admin/rebel_keyset_change_list.html"
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
 
 class EventInlineAdmin(admin.StackedInline):
     model = Event
     can_delete = False
     extra = 0
-    readonly_fields = ("name", "created_at", "extra_data")
+    readonly_fields = ("name", "created_at", "provider_id", "extra_data")
 
     def has_add_permission(self, request, obj=None):
         return False
@@ -31,8 +113,12 @@ class EventInlineAdmin(admin.StackedInline):
 
 class MailContentInline(admin.StackedInline):
     model = MailContent
-    readonly_fields = ("subject", "body_text", "html_content")
-    exclude = ("body_plain", "body_html")
+    readonly_fields = ("subject", "text_content", "html_content")
+    exclude = ("body", "body_text", "body_plain", "body_html")
+
+    def text_content(self, obj: MailContent):
+        if obj:
+            return obj.get_body_text()
 
     def html_content(self, obj: MailContent):
         if obj:
@@ -50,16 +136,17 @@ class MailLabelFilter(admin.SimpleListFilter):
     parameter_name = "label_slug"
 
     def lookups(self, request, model_admin):
-        labels = MailLabel.objects.all()
-
-        return (
-            (label.slug, label.name) for label in labels
-        )
+        return label_registry.get_choices()
 
     def queryset(self, request, queryset):
         if self.value():
+            label_id = label_registry.get_id(self.value())
+
+            if label_id is None:
+                return queryset.none()
+
             return queryset.filter(
-                label__slug=self.value()
+                label_id=label_id
             )
 
         return queryset.all()
@@ -127,18 +214,44 @@ class ProfileFilter(admin.SimpleListFilter):
         return queryset.all()
 
 
-class MailAdmin(LargeListAdminMixin, admin.ModelAdmin):
+class MailTagFilter(admin.SimpleListFilter):
+    title = "Tag"
+    parameter_name = "tag"
+
+    def lookups(self, request, model_admin):
+        # Tags are listed from the daily stats, so the mail table is not scanned
+        tags = MailDailyStat.objects.exclude(tag="").order_by("tag").values_list("tag", flat=True).distinct()
+
+        return (
+            (tag, tag) for tag in tags
+        )
+
+    def queryset(self, request, queryset):
+        if self.value():
+            # Comma separated tags match the mails which have any of them
+            tags = [tag.strip() for tag in self.value().split(",") if tag.strip()]
+
+            if len(tags) > 1:
+                return queryset.with_any_tags(*tags)
+
+            return queryset.with_tags(*tags)
+
+        return queryset.all()
+
+
+class MailAdmin(KeysetListAdminMixin, admin.ModelAdmin):
     list_display = ("id", "label", "owner_link", "email_to", "created_at", "tags", "profile",
                     "has_delivered", "has_opened", "has_clicked")
-    search_fields = ("email_from__exact", "email_to__exact",)
     inlines = [EventInlineAdmin, MailContentInline]
     readonly_fields = ("message_id", "email_from", "email_to", "profile", "label", "tags",
                        "created_at", "storage_url",
                        "has_delivered", "has_opened", "has_clicked", "has_accepted", "has_rejected", "has_failed",
                        "has_unsubscribed", "has_complained", "has_stored")
     exclude = ("owner_id", "owner_type")
-    list_select_related = ("content", "label",)
-    list_filter = [ProfileFilter, MailLabelFilter, HasDeliveredEventFilter, HasOpenedEventFilter, HasClickedEventFilter]
+    list_select_related = ("label",)
+    list_defer = ("email_from", "message_id", "storage_url", "first_opened_at", "first_clicked_at", "last_event_at")
+    list_filter = [ProfileFilter, MailLabelFilter, MailTagFilter, HasDeliveredEventFilter, HasOpenedEventFilter,
+                   HasClickedEventFilter]
 
     def owner_display(self, obj: Mail):
         return obj.owner_object.__str__()
@@ -155,21 +268,32 @@ class MailAdmin(LargeListAdminMixin, admin.ModelAdmin):
 
             return format_html("<a href='{url}'>{owner_type}: {content}</a>",
                                url=url,
-                               owner_type=obj.owner_type.name.title(),
+                               owner_type=ContentType.objects.get_for_id(obj.owner_type_id).name.title(),
                                content=str(obj.owner_object.__str__()))
 
     def get_queryset(self, request):
         qs = super(MailAdmin, self).get_queryset(request)
 
-        return qs.with_event_status().prefetch_related("owner_object")
+        # Owners are fetched with one query per owner type, status is read from the has_* columns
+        return qs.prefetch_related("owner_object")
 
     def get_search_fields(self, request):
-        fields = super().get_search_fields(request)
+        fields = ADMIN_SEARCH_FIELDS[get_search_settings()["ADMIN_MODE"]]
 
         fields = list(fields) + settings.REBEL["SEARCH_FIELDS"]
 
         return fields
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+
+        # Addresses are still matched exactly in the content mode
+        if get_search_settings()["ADMIN_MODE"] == "content" and search_term and \
+                not ("@" in search_term and " " not in search_term):
+            return search_mails(search_term, queryset), False
+
+        return super().get_search_results(request, queryset, search_term)
+
     def has_add_permission(self, request):
         return False
 
@@ -182,6 +306,41 @@ class MailLabelAdmin(admin.ModelAdmin):
     list_display = ("name", "slug")
 
 
+class DailyStatTagFilter(admin.SimpleListFilter):
+    title = "Tag"
+    parameter_name = "tag"
+
+    def lookups(self, request, model_admin):
+        tags = MailDailyStat.objects.exclude(tag="").order_by("tag").values_list("tag", flat=True).distinct()
+
+        return (
+            (tag, tag) for tag in tags
+        )
+
+    def queryset(self, request, queryset):
+        # Rows of the tags count the same mails again, they are only listed for their tag
+        return queryset.filter(tag=self.value() or "")
+
+
+class MailDailyStatAdmin(admin.ModelAdmin):
+    list_display = ("day", "label", "profile", "tag", "sent", "delivered", "opened", "clicked", "failed",
+                    "complained")
+    list_filter = [ProfileFilter, MailLabelFilter, DailyStatTagFilter]
+    list_select_related = ("label",)
+    date_hierarchy = "day"
+    show_full_result_count = False
+    ordering = ("-day", "label_id", "profile")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 class SendMailAdminMixin:
     mail_senders = []
 
@@ -219,3 +378,4 @@ class SendMailAdminMixin:
 
 admin.site.register(Mail, MailAdmin)
 admin.site.register(MailLabel, MailLabelAdmin)
+admin.site.register(MailDailyStat, MailDailyStatAdmin)
@@ -0,0 +1,57 @@
+import asyncio
+
+import requests
+
+from .client import Client
+from .sessions import async_sessions
+
+
+class AsyncClient(Client):
+    """
+    Client which sends the prepared requests through a pooled httpx session.
+
+    Requests are still prepared by `requests`, so urls, auth and encoded bodies are identical to the sync client.
+    """
+
+    def get_session(self):
+        return async_sessions.get(self.mailgun.profile, self.get_api_url(), self.api_settings,
+                                  timeout=self.get_timeout())
+
+    async def send(self, prepared_request: requests.PreparedRequest):
+        import httpx
+
+        body = prepared_request.body
+
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        request = httpx.Request(method=prepared_request.method,
+                                url=prepared_request.url,
+                                headers=dict(prepared_request.headers),
+                                content=body or b"")
+
+        throttle = self.get_throttle()
+
+        attempt = 0
+
+        while True:
+            wait = throttle.bucket.reserve()
+
+            if wait:
+                await asyncio.sleep(wait)
+
+            async with throttle.async_slot():
+                try:
+                    response = await self.get_session().send(request)
+                except httpx.TransportError as e:
+                    raise requests.ConnectionError(e)
+
+            delay = throttle.get_retry_delay(prepared_request.method, response, attempt)
+
+            if delay is None:
+                return response
+
+            await response.aclose()
+
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,81 @@
+import json
+
+from .constants import MAX_BATCH_RECIPIENTS, MAX_BATCH_PAYLOAD_SIZE
+
+
+class RecipientChunk:
+    def __init__(self):
+        self.to = []
+        self.cc = []
+        self.bcc = []
+        self.variables = {}
+        self.payload_size = 0
+
+    def __len__(self):
+        return len(self.to) + len(self.cc) + len(self.bcc)
+
+    @property
+    def recipients(self):
+        return self.to + self.cc + self.bcc
+
+    def get_send_kwargs(self, shared_variables: dict):
+        variables = None
+
+        if self.variables or shared_variables:
+            variables = dict(shared_variables)
+            variables.update(self.variables)
+
+        return {
+            "to": self.to or None,
+            "cc": self.cc or None,
+            "bcc": self.bcc or None,
+            "variables": variables,
+        }
+
+
+def _get_variable_size(email: str, value) -> int:
+    # Size of the '"email": value, ' part in the recipient-variables json
+    return len(json.dumps(email)) + len(json.dumps(value)) + 4
+
+
+def split_recipients(to=None, cc=None, bcc=None, variables: dict = None, chunk_size: int = MAX_BATCH_RECIPIENTS,
+                     max_payload_size: int = MAX_BATCH_PAYLOAD_SIZE):
+    """
+    Splits receivers and their recipient variables into chunks which fit into a single batch sending call.
+
+    Variables of addresses which are not a receiver (e.g. the placeholder of batch mode) are shared by every chunk.
+    Returns the chunks and the shared variables.
+    """
+    variables = variables or {}
+
+    receivers = [("to", email) for email in to or []] + \
+                [("cc", email) for email in cc or []] + \
+                [("bcc", email) for email in bcc or []]
+
+    receiver_emails = set(email for _, email in receivers)
+
+    shared_variables = {email: value for email, value in variables.items() if email not in receiver_emails}
+    shared_size = sum(_get_variable_size(email, value) for email, value in shared_variables.items())
+
+    chunks = []
+    chunk = RecipientChunk()
+
+    for mode, email in receivers:
+        size = _get_variable_size(email, variables[email]) if email in variables else 0
+
+        is_full = len(chunk) >= chunk_size or shared_size + chunk.payload_size + size > max_payload_size
+
+        if len(chunk) and is_full:
+            chunks.append(chunk)
+            chunk = RecipientChunk()
+
+        getattr(chunk, mode).append(email)
+
+        if email in variables and email not in chunk.variables:
+            chunk.variables[email] = variables[email]
+            chunk.payload_size += size
+
+    if len(chunk):
+        chunks.append(chunk)
+
+    return chunks, shared_variables
@@ -1,16 +1,29 @@
+import time
+
 import requests
 
+from .sessions import sessions
+from .throttling import throttles, Throttle
+
 
 class Client:
     DEFAULT_API_URL = "https://api.mailgun.net/v3"
+    DEFAULT_TIMEOUT = (5, 30)
 
     def __init__(self, mailgun):
         self.mailgun = mailgun
 
+    @property
+    def api_settings(self):
+        return self.mailgun.profile_settings["API"]
+
     def prepare_request(self, url: str, method="get", data=None, headers=None, params=None, **kwargs):
-        real_url = "%s/%s/%s" % (self.get_api_url(), self.mailgun.profile_settings["API"]["DOMAIN"], url)
+        real_url = "%s/%s/%s" % (self.get_api_url(), self.api_settings["DOMAIN"], url)
 
-        auth = ("api", self.mailgun.profile_settings["API"]["API_KEY"])
+        return self.prepare_url_request(real_url, method=method, data=data, headers=headers, params=params, **kwargs)
+
+    def prepare_url_request(self, real_url: str, method="get", data=None, headers=None, params=None, **kwargs):
+        auth = ("api", self.api_settings["API_KEY"])
 
         req = requests.Request(method=method,
                                url=real_url,
@@ -23,7 +36,45 @@ class Client:
         return req.prepare()
 
     def get_api_url(self):
-        if "API_URL" in self.mailgun.profile_settings["API"].keys():
-            return self.mailgun.profile_settings["API"]["API_URL"]
+        if "API_URL" in self.api_settings.keys():
+            return self.api_settings["API_URL"]
 
         return self.DEFAULT_API_URL
+
+    def get_timeout(self):
+        timeout = self.api_settings.get("TIMEOUT", self.DEFAULT_TIMEOUT)
+
+        if isinstance(timeout, list):
+            timeout = tuple(timeout)
+
+        return timeout
+
+    def get_session(self) -> requests.Session:
+        return sessions.get(self.mailgun.profile, self.get_api_url(), self.api_settings)
+
+    def get_throttle(self) -> Throttle:
+        return throttles.get(self.mailgun.profile, self.api_settings["DOMAIN"], self.api_settings.get("RATE_LIMIT", {}))
+
+    def send(self, prepared_request: requests.PreparedRequest) -> requests.Response:
+        throttle = self.get_throttle()
+
+        attempt = 0
+
+        while True:
+            wait = throttle.bucket.reserve()
+
+            if wait:
+                time.sleep(wait)
+
+            with throttle.slot():
+                response = self.get_session().send(prepared_request, timeout=self.get_timeout())
+
+            delay = throttle.get_retry_delay(prepared_request.method, response, attempt)
+
+            if delay is None:
+                return response
+
+            response.close()
+
+            attempt += 1
+            time.sleep(delay)
@@ -9,3 +9,15 @@ class EVENT_TYPES:
     UNSUBSCRIBED = "unsubscribed"
     COMPLAINED = "complained"
     STORED = "stored"
+
+
+# Mailgun accepts at most 1000 recipients per batch sending call
+MAX_BATCH_RECIPIENTS = 1000
+
+# Upper bound of the recipient-variables json which is sent on a single batch call
+MAX_BATCH_PAYLOAD_SIZE = 5 * 1024 * 1024
+
+DEFAULT_BATCH_WORKERS = 4
+
+# Events api returns at most 300 items per page
+MAX_EVENTS_PAGE_SIZE = 300
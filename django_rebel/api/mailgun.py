@@ -1,7 +1,7 @@
 from django_rebel.settings import get_settings, get_profile_settings
 
 from .client import Client
-from .requesters import Message, Event
+from .requesters import Message, Event, AsyncMessage, AsyncEvent
 
 
 class Mailgun:
@@ -21,3 +21,16 @@ class Mailgun:
 
     def client(self):
         return Client(self)
+
+
+class AsyncMailgun(Mailgun):
+    def __init__(self, profile):
+        self.profile = profile
+
+        self.message = AsyncMessage(self)
+        self.event = AsyncEvent(self)
+
+    def client(self):
+        from .async_client import AsyncClient
+
+        return AsyncClient(self)
@@ -0,0 +1,104 @@
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+def to_timestamp(value):
+    """
+    Converts datetime filters of the events api to unix timestamps
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+
+        return value.timestamp()
+
+    return value
+
+
+def get_next_page_url(page):
+    paging = page.get("paging") or {}
+
+    return paging.get("next")
+
+
+class EventPaginator:
+    """
+    Lazy iterator over the items of an events api query.
+
+    The api returns an empty page when there is nothing left, which ends the iteration.
+    """
+
+    def __init__(self, requester, prepared_request, prefetch=True):
+        self.requester = requester
+        self.prepared_request = prepared_request
+        self.prefetch = prefetch
+
+    def fetch_page(self, url):
+        return self.requester.get_page(self.requester.prepare_page_request(url))
+
+    def __iter__(self):
+        page = self.requester.get_page(self.prepared_request)
+
+        if not self.prefetch:
+            while page.get("items"):
+                yield from page["items"]
+
+                next_url = get_next_page_url(page)
+
+                if next_url is None:
+                    return
+
+                page = self.fetch_page(next_url)
+
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while page.get("items"):
+                next_url = get_next_page_url(page)
+                next_page = executor.submit(self.fetch_page, next_url) if next_url else None
+
+                yield from page["items"]
+
+                if next_page is None:
+                    return
+
+                page = next_page.result()
+
+
+class AsyncEventPaginator(EventPaginator):
+    async def fetch_page(self, url):
+        return await self.requester.get_page(self.requester.prepare_page_request(url))
+
+    def __iter__(self):
+        raise TypeError("Use 'async for' with async event paginator")
+
+    async def __aiter__(self):
+        page = await self.requester.get_page(self.prepared_request)
+
+        next_page = None
+
+        try:
+            while page.get("items"):
+                next_url = get_next_page_url(page)
+
+                if next_url is None:
+                    next_page = None
+                elif self.prefetch:
+                    next_page = asyncio.ensure_future(self.fetch_page(next_url))
+                else:
+                    next_page = self.fetch_page(next_url)
+
+                for item in page["items"]:
+                    yield item
+
+                if next_page is None:
+                    return
+
+                page = await next_page
+                next_page = None
+        finally:
+            if isinstance(next_page, asyncio.Future):
+                next_page.cancel()
+            elif next_page is not None:
+                next_page.close()
@@ -1,12 +1,16 @@
+import asyncio
 import json
+from concurrent.futures import ThreadPoolExecutor
 from json import JSONDecodeError
 from typing import Type
 
 import requests
-from requests import HTTPError
 
 from django_rebel.exceptions import TargetMissing, RebelAPIError, RebelNotValidAddress
 
+from .batching import split_recipients
+from .constants import MAX_BATCH_RECIPIENTS, MAX_BATCH_PAYLOAD_SIZE, DEFAULT_BATCH_WORKERS, MAX_EVENTS_PAGE_SIZE
+from .paging import EventPaginator, AsyncEventPaginator, to_timestamp
 from .responses import Response, MessageResponses
 
 
@@ -17,33 +21,117 @@ class AbstractRequester:
         self.mailgun: Mailgun = mailgun
 
     def _get_response(self, response_class: Type[Response], prepared_request: requests.PreparedRequest, **kwargs):
-        s = requests.Session()
+        response = self.mailgun.client().send(prepared_request)
 
-        response = s.send(prepared_request)
+        return self._build_response(response_class, prepared_request, response, **kwargs)
 
-        try:
-            response.raise_for_status()
-        except HTTPError as e:
+    def _build_response(self, response_class: Type[Response], prepared_request: requests.PreparedRequest, response,
+                        **kwargs):
+        if response.status_code >= 400:
             try:
-                error_content = e.response.json()
+                error_content = response.json()
 
                 if "message" in error_content.keys():
                     if "is not a valid address" in error_content["message"]:
-                        raise RebelNotValidAddress(request=e.request, response=e.response)
-            except JSONDecodeError:
+                        raise RebelNotValidAddress(request=prepared_request, response=response)
+            except (JSONDecodeError, ValueError, AttributeError):
                 """
                 If there is json decode error, then skip
                 """
 
-            raise RebelAPIError(request=e.request, response=e.response)
+            raise RebelAPIError(request=prepared_request, response=response)
 
         return response_class(base_response=response, base_request=prepared_request, mailgun=self.mailgun, **kwargs)
 
 
+class AsyncRequesterMixin:
+    async def _get_response(self, response_class: Type[Response], prepared_request: requests.PreparedRequest,
+                            **kwargs):
+        response = await self.mailgun.client().send(prepared_request)
+
+        return self._build_response(response_class, prepared_request, response, **kwargs)
+
+
 class Message(AbstractRequester):
     def send(self, subject: str, from_address: str = None, to=None, bcc=None, cc=None, text=None, html=None,
              variables=None, tags: list = None, test_mode: bool = None, inlines: list = None, attachments: list = None):
+        req, sent_mails = self.prepare_send_request(subject=subject, from_address=from_address, to=to, bcc=bcc, cc=cc,
+                                                    text=text, html=html, variables=variables, tags=tags,
+                                                    test_mode=test_mode, inlines=inlines, attachments=attachments)
+
+        response: MessageResponses.SendResponse = self._get_response(MessageResponses.SendResponse, req,
+                                                                     sent_mails=sent_mails)
+
+        return response
+
+    def send_chunked(self, subject: str, to=None, bcc=None, cc=None, variables=None, inlines: list = None,
+                     attachments: list = None, chunk_size: int = None, max_workers: int = None, **kwargs):
+        """
+        Splits receivers and recipient variables into batches which fit into a single api call
+        and sends them concurrently.
+        """
+        chunks, shared_variables = self.split_recipients(to=to, cc=cc, bcc=bcc, variables=variables,
+                                                         chunk_size=chunk_size)
+
+        kwargs.update({
+            "subject": subject,
+            "inlines": self._read_files(inlines),
+            "attachments": self._read_files(attachments),
+        })
+
+        def send_chunk(chunk):
+            try:
+                return self.send(**chunk.get_send_kwargs(shared_variables), **kwargs), None
+            except (RebelAPIError, requests.ConnectionError) as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=self.get_max_workers(max_workers)) as executor:
+            results = list(executor.map(send_chunk, chunks))
+
+        return self._build_chunked_response(results)
 
+    def split_recipients(self, to=None, cc=None, bcc=None, variables=None, chunk_size: int = None):
+        batch_settings = self.mailgun.settings.get("BATCH", {})
+
+        if chunk_size is None:
+            chunk_size = batch_settings.get("CHUNK_SIZE", MAX_BATCH_RECIPIENTS)
+
+        return split_recipients(to=to, cc=cc, bcc=bcc, variables=variables,
+                                chunk_size=min(chunk_size, MAX_BATCH_RECIPIENTS),
+                                max_payload_size=batch_settings.get("MAX_PAYLOAD_SIZE", MAX_BATCH_PAYLOAD_SIZE))
+
+    def get_max_workers(self, max_workers: int = None):
+        if max_workers is not None:
+            return max_workers
+
+        return self.mailgun.settings.get("BATCH", {}).get("WORKERS", DEFAULT_BATCH_WORKERS)
+
+    def _read_files(self, files: list = None):
+        """
+        Every chunk sends the same files, so file objects are read once instead of being shared between threads
+        """
+        if not files:
+            return files
+
+        read_files = []
+
+        for _f in files:
+            if hasattr(_f, "read"):
+                _f = (getattr(_f, "name", "file").split("/")[-1], _f.read())
+
+            read_files.append(_f)
+
+        return read_files
+
+    def _build_chunked_response(self, results: list):
+        responses = [response for response, error in results if error is None]
+        errors = [error for response, error in results if error is not None]
+
+        return MessageResponses.ChunkedSendResponse(responses, errors)
+
+    def prepare_send_request(self, subject: str, from_address: str = None, to=None, bcc=None, cc=None, text=None,
+                             html=None, variables=None, tags: list = None, test_mode: bool = None,
+                             inlines: list = None, attachments: list = None):
         if to is None and bcc is None and cc is None:
             raise TargetMissing()
 
@@ -93,14 +181,74 @@ class Message(AbstractRequester):
 
         req = self.mailgun.client().prepare_request("messages", method="post", data=data, files=files)
 
-        response: MessageResponses.SendResponse = self._get_response(MessageResponses.SendResponse, req,
-                                                                     sent_mails=sent_mails)
+        return req, sent_mails
+
+
+class AsyncMessage(AsyncRequesterMixin, Message):
+    async def send(self, subject: str, from_address: str = None, to=None, bcc=None, cc=None, text=None, html=None,
+                   variables=None, tags: list = None, test_mode: bool = None, inlines: list = None,
+                   attachments: list = None):
+        req, sent_mails = self.prepare_send_request(subject=subject, from_address=from_address, to=to, bcc=bcc, cc=cc,
+                                                    text=text, html=html, variables=variables, tags=tags,
+                                                    test_mode=test_mode, inlines=inlines, attachments=attachments)
+
+        response: MessageResponses.SendResponse = await self._get_response(MessageResponses.SendResponse, req,
+                                                                           sent_mails=sent_mails)
 
         return response
 
+    async def send_chunked(self, subject: str, to=None, bcc=None, cc=None, variables=None, inlines: list = None,
+                           attachments: list = None, chunk_size: int = None, max_workers: int = None, **kwargs):
+        chunks, shared_variables = self.split_recipients(to=to, cc=cc, bcc=bcc, variables=variables,
+                                                         chunk_size=chunk_size)
+
+        kwargs.update({
+            "subject": subject,
+            "inlines": self._read_files(inlines),
+            "attachments": self._read_files(attachments),
+        })
+
+        semaphore = asyncio.Semaphore(self.get_max_workers(max_workers))
+
+        async def send_chunk(chunk):
+            async with semaphore:
+                try:
+                    return await self.send(**chunk.get_send_kwargs(shared_variables), **kwargs), None
+                except (RebelAPIError, requests.ConnectionError) as e:
+                    return None, e
+
+        results = await asyncio.gather(*[send_chunk(chunk) for chunk in chunks])
+
+        return self._build_chunked_response(results)
+
 
 class Event(AbstractRequester):
-    def list(self, message_id=None, event=None, email_list=None):
+    def list(self, message_id=None, event=None, email_list=None, recipient=None, begin=None, end=None, limit=None,
+             ascending=None):
+        req = self.prepare_list_request(message_id=message_id, event=event, email_list=email_list,
+                                        recipient=recipient, begin=begin, end=end, limit=limit, ascending=ascending)
+
+        response: Response = self._get_response(Response, req)
+
+        return response
+
+    def iterate(self, message_id=None, event=None, email_list=None, recipient=None, begin=None, end=None, limit=None,
+                ascending=None, prefetch=True):
+        """
+        Yields event items one by one by following the paging cursors of the api.
+
+        Only the current page is kept in memory, the next one is fetched in the background when prefetch is enabled.
+        """
+        req = self.prepare_list_request(message_id=message_id, event=event, email_list=email_list,
+                                        recipient=recipient, begin=begin, end=end, limit=limit, ascending=ascending)
+
+        return EventPaginator(self, req, prefetch=prefetch)
+
+    def get_page(self, prepared_request: requests.PreparedRequest):
+        return self._get_response(Response, prepared_request)
+
+    def prepare_list_request(self, message_id=None, event=None, email_list=None, recipient=None, begin=None,
+                             end=None, limit=None, ascending=None):
         params = {}
 
         if message_id:
@@ -112,8 +260,43 @@ class Event(AbstractRequester):
         if email_list:
             params["list"] = email_list
 
-        req = self.mailgun.client().prepare_request("events", params=params)
+        if recipient:
+            params["recipient"] = recipient
 
-        response: Response = self._get_response(Response, req)
+        if begin is not None:
+            params["begin"] = to_timestamp(begin)
+
+        if end is not None:
+            params["end"] = to_timestamp(end)
+
+        if limit:
+            params["limit"] = min(limit, MAX_EVENTS_PAGE_SIZE)
+
+        if ascending is not None:
+            params["ascending"] = "yes" if ascending else "no"
+
+        return self.mailgun.client().prepare_request("events", params=params)
+
+    def prepare_page_request(self, url: str):
+        return self.mailgun.client().prepare_url_request(url)
+
+
+class AsyncEvent(AsyncRequesterMixin, Event):
+    async def list(self, message_id=None, event=None, email_list=None, recipient=None, begin=None, end=None,
+                   limit=None, ascending=None):
+        req = self.prepare_list_request(message_id=message_id, event=event, email_list=email_list,
+                                        recipient=recipient, begin=begin, end=end, limit=limit, ascending=ascending)
+
+        response: Response = await self._get_response(Response, req)
 
         return response
+
+    def iterate(self, message_id=None, event=None, email_list=None, recipient=None, begin=None, end=None, limit=None,
+                ascending=None, prefetch=True):
+        req = self.prepare_list_request(message_id=message_id, event=event, email_list=email_list,
+                                        recipient=recipient, begin=begin, end=end, limit=limit, ascending=ascending)
+
+        return AsyncEventPaginator(self, req, prefetch=prefetch)
+
+    async def get_page(self, prepared_request: requests.PreparedRequest):
+        return await self._get_response(Response, prepared_request)
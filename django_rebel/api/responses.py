@@ -19,14 +19,39 @@ class Response(dict):
         return self.base_response.json()
 
     def resend_request(self):
-        s = requests.Session()
+        response = self.mailgun.client().send(self.base_request)
 
-        response = s.send(self.base_request)
+        return self.__class__(mailgun=self.mailgun, base_response=response, base_request=self.base_request,
+                              **self.extra_arguments)
 
-        return self.__class__(base_response=response, base_request=self.base_request, **self.extra_arguments)
+    async def aresend_request(self):
+        response = await self.mailgun.client().send(self.base_request)
+
+        return self.__class__(mailgun=self.mailgun, base_response=response, base_request=self.base_request,
+                              **self.extra_arguments)
 
 
 class MessageResponses:
     class SendResponse(Response):
         def message_id(self):
             return self["id"].replace("<", "").replace(">", "")
+
+    class ChunkedSendResponse(list):
+        """
+        Combined result of a chunked send.
+
+        Holds the responses of the successful chunks and the errors of the failed ones.
+        """
+
+        def __init__(self, responses: list, errors: list):
+            super().__init__(responses)
+
+            self.errors = errors
+
+        def message_ids(self):
+            """
+            Returns message-id -> sent mails mapping of the successful chunks
+            """
+            return {
+                response.message_id(): response.extra_arguments["sent_mails"] for response in self
+            }
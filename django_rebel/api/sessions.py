@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionRegistry:
+    """
+    Process wide registry of pooled http sessions.
+
+    There is one session per (profile, api url) pair, so every request of the profile
+    re-uses the same keep-alive connections instead of paying for a new TCP and TLS handshake.
+    """
+
+    DEFAULT_POOL_CONNECTIONS = 10
+    DEFAULT_POOL_MAXSIZE = 10
+    DEFAULT_KEEP_ALIVE = True
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, profile: str, api_url: str, api_settings: dict) -> requests.Session:
+        key = (profile, api_url)
+
+        session = self._sessions.get(key)
+
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(key)
+
+            if session is None:
+                session = self.create_session(api_settings)
+                self._sessions[key] = session
+
+        return session
+
+    def create_session(self, api_settings: dict) -> requests.Session:
+        session = requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=api_settings.get("POOL_CONNECTIONS", self.DEFAULT_POOL_CONNECTIONS),
+                              pool_maxsize=api_settings.get("POOL_MAXSIZE", self.DEFAULT_POOL_MAXSIZE))
+
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        if not api_settings.get("KEEP_ALIVE", self.DEFAULT_KEEP_ALIVE):
+            session.headers["Connection"] = "close"
+
+        return session
+
+    def clear(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+
+        for session in sessions:
+            session.close()
+
+
+class AsyncSessionRegistry(SessionRegistry):
+    """
+    Registry of pooled httpx sessions for the asyncio client.
+
+    Async sessions are bound to the event loop which created them, so sessions are kept per running loop
+    and dropped together with the loop.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def get(self, profile: str, api_url: str, api_settings: dict, timeout=None):
+        loop_sessions = self._sessions.setdefault(asyncio.get_running_loop(), {})
+
+        key = (profile, api_url)
+
+        session = loop_sessions.get(key)
+
+        if session is None:
+            # There is no await between lookup and insert, so the loop can not interleave here
+            session = self.create_session(api_settings, timeout=timeout)
+            loop_sessions[key] = session
+
+        return session
+
+    def create_session(self, api_settings: dict, timeout=None):
+        import httpx
+
+        max_connections = api_settings.get("POOL_MAXSIZE", self.DEFAULT_POOL_MAXSIZE)
+
+        if api_settings.get("KEEP_ALIVE", self.DEFAULT_KEEP_ALIVE):
+            max_keepalive_connections = max_connections
+        else:
+            max_keepalive_connections = 0
+
+        if isinstance(timeout, (tuple, list)):
+            connect_timeout, read_timeout = timeout
+            timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+        return httpx.AsyncClient(limits=httpx.Limits(max_connections=max_connections,
+                                                     max_keepalive_connections=max_keepalive_connections),
+                                 timeout=timeout)
+
+    def clear(self):
+        """
+        Drops the sessions of every loop. Async sessions can only be closed in their own loop with aclear, so the
+        dropped ones are closed when they are garbage collected.
+        """
+        with self._lock:
+            self._sessions = weakref.WeakKeyDictionary()
+
+    async def aclear(self):
+        loop_sessions = self._sessions.pop(asyncio.get_running_loop(), {})
+
+        for session in loop_sessions.values():
+            await session.aclose()
+
+
+sessions = SessionRegistry()
+async_sessions = AsyncSessionRegistry()
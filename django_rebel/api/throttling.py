@@ -0,0 +1,215 @@
+import asyncio
+import contextlib
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket.
+
+    A `rate` of None means there is no local limit, the bucket then only keeps the pauses which are
+    requested by the provider. After a rate limit error the rate is halved, and every successful call
+    gives a little of it back, so the throughput settles just under the limit of the provider.
+    """
+
+    RECOVERY_FACTOR = 0.05
+    MIN_RATE_FACTOR = 0.1
+
+    def __init__(self, rate: float = None, burst: int = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or (max(1, int(rate)) if rate else None)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.paused_until = 0
+
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns how many seconds the caller has to wait before using it
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            wait = max(0, self.paused_until - now)
+
+            if self.rate:
+                self._refill(now)
+                self.tokens -= 1
+
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+
+            return wait
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def decrease(self):
+        with self._lock:
+            if self.rate:
+                self._refill(time.monotonic())
+                self.rate = max(self.max_rate * self.MIN_RATE_FACTOR, self.rate / 2)
+
+    def increase(self):
+        with self._lock:
+            if self.rate and self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.RECOVERY_FACTOR)
+
+
+class Throttle:
+    DEFAULT_MAX_RETRIES = 3
+    DEFAULT_BACKOFF_BASE = 0.5
+    DEFAULT_BACKOFF_MAX = 30
+
+    RATE_LIMIT_STATUS = 429
+
+    # These status codes mean that the request is not processed, so any method can be retried
+    RETRY_STATUSES = (429, 503)
+
+    # The request may be processed on these status codes, only idempotent methods are retried
+    IDEMPOTENT_RETRY_STATUSES = (500, 502, 504)
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, rate_limit_settings: dict):
+        self.bucket = TokenBucket(rate=rate_limit_settings.get("RATE"), burst=rate_limit_settings.get("BURST"))
+
+        self.max_concurrent = rate_limit_settings.get("MAX_CONCURRENT")
+        self.max_retries = rate_limit_settings.get("MAX_RETRIES", self.DEFAULT_MAX_RETRIES)
+        self.backoff_base = rate_limit_settings.get("BACKOFF_BASE", self.DEFAULT_BACKOFF_BASE)
+        self.backoff_max = rate_limit_settings.get("BACKOFF_MAX", self.DEFAULT_BACKOFF_MAX)
+
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrent) if self.max_concurrent else None
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+    def slot(self):
+        return self._semaphore or contextlib.nullcontext()
+
+    def async_slot(self):
+        if not self.max_concurrent:
+            return contextlib.nullcontext()
+
+        loop = asyncio.get_running_loop()
+
+        if loop not in self._async_semaphores:
+            self._async_semaphores[loop] = asyncio.Semaphore(self.max_concurrent)
+
+        return self._async_semaphores[loop]
+
+    def get_retry_delay(self, method: str, response, attempt: int):
+        """
+        Records the rate limit headers of the response,
+        and returns how long to wait before retrying it or None if it should not be retried.
+        """
+        rate_limit_delay = self._get_rate_limit_delay(response)
+
+        if rate_limit_delay is not None:
+            self.bucket.pause(rate_limit_delay)
+
+        if response.status_code == self.RATE_LIMIT_STATUS:
+            self.bucket.decrease()
+        elif response.status_code < 400:
+            self.bucket.increase()
+
+        if not self.is_retryable(method, response.status_code) or attempt >= self.max_retries:
+            return None
+
+        retry_after = self._get_retry_after(response)
+
+        if retry_after is None:
+            retry_after = rate_limit_delay
+
+        if retry_after is not None:
+            # Jitter keeps the waiting clients from coming back at the same moment
+            return retry_after + random.uniform(0, self.backoff_base)
+
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def is_retryable(self, method: str, status_code: int):
+        if status_code in self.RETRY_STATUSES:
+            return True
+
+        return status_code in self.IDEMPOTENT_RETRY_STATUSES and method.upper() in self.IDEMPOTENT_METHODS
+
+    def _get_retry_after(self, response):
+        value = response.headers.get("Retry-After")
+
+        if value is None:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _get_rate_limit_delay(self, response):
+        """
+        Returns the time until the rate limit window resets when the window is exhausted
+        """
+        if response.headers.get("X-RateLimit-Remaining") != "0":
+            return None
+
+        try:
+            reset = float(response.headers.get("X-RateLimit-Reset"))
+        except (TypeError, ValueError):
+            return None
+
+        # The reset value can be an epoch in milliseconds, an epoch in seconds or seconds from now
+        if reset > 1e12:
+            reset = reset / 1000 - time.time()
+        elif reset > 1e9:
+            reset = reset - time.time()
+
+        return min(self.backoff_max, max(0.0, reset))
+
+
+class ThrottleRegistry:
+    """
+    Process wide registry of throttles, there is one throttle per profile and sending domain
+    """
+
+    def __init__(self):
+        self._throttles = {}
+        self._lock = threading.Lock()
+
+    def get(self, profile: str, domain: str, rate_limit_settings: dict) -> Throttle:
+        key = (profile, domain)
+
+        throttle = self._throttles.get(key)
+
+        if throttle is not None:
+            return throttle
+
+        with self._lock:
+            throttle = self._throttles.get(key)
+
+            if throttle is None:
+                throttle = Throttle(rate_limit_settings)
+                self._throttles[key] = throttle
+
+        return throttle
+
+    def clear(self):
+        with self._lock:
+            self._throttles = {}
+
+
+throttles = ThrottleRegistry()
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class RebelConfig(AppConfig):
     name = 'django_rebel'
     verbose_name = "Rebel"
+
+    def ready(self):
+        from django_rebel import signals  # noqa
+        from django_rebel.registry import get_registry_settings, warm_registries
+
+        if get_registry_settings()["WARM_ON_READY"]:
+            warm_registries()
@@ -0,0 +1,169 @@
+import io
+import mmap
+import os
+import uuid
+
+from django.core.files.base import ContentFile
+from django.utils.module_loading import import_string
+
+from django_rebel.settings import get_settings
+
+
+class BaseBlobStore:
+    """
+    Keeps encoded mail bodies out of the database, rows only keep the pointer which is returned by put
+    """
+
+    def __init__(self, **options):
+        self.options = options
+
+    def put(self, data: bytes) -> str:
+        raise NotImplementedError()
+
+    def open(self, pointer: str):
+        """
+        Returns a readable binary file object of the blob
+        """
+        raise NotImplementedError()
+
+    def read(self, pointer: str) -> bytes:
+        with self.open(pointer) as f:
+            return f.read()
+
+    def delete(self, pointer: str):
+        raise NotImplementedError()
+
+
+class MappedBlob(io.RawIOBase):
+    """
+    Read only view of a blob file, pages are loaded by the kernel while the blob is read
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._view = memoryview(self._mmap)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self._view) - self._position)
+
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+            self._mmap.close()
+
+        super().close()
+
+
+class FileSystemBlobStore(BaseBlobStore):
+    """
+    Keeps every blob as a file in a local directory, files are spread over two levels of subdirectories.
+
+    Blobs are written to a temporary file and renamed once they are synced, so a pointer never refers to a partial
+    blob, and writers do not wait for each other. Deleted blobs are unlinked, so their space is freed at once.
+    """
+
+    def __init__(self, location: str, **options):
+        super().__init__(**options)
+
+        self.location = location
+
+        os.makedirs(self.location, exist_ok=True)
+
+    def get_path(self, pointer: str):
+        return os.path.join(self.location, pointer)
+
+    def put(self, data: bytes) -> str:
+        name = uuid.uuid4().hex
+        pointer = "%s/%s/%s" % (name[:2], name[2:4], name)
+        path = self.get_path(pointer)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(path + ".tmp", path)
+
+        return pointer
+
+    def open(self, pointer: str):
+        path = self.get_path(pointer)
+
+        # Empty files can not be mapped
+        if os.path.getsize(path) == 0:
+            return io.BytesIO()
+
+        return MappedBlob(path)
+
+    def delete(self, pointer: str):
+        try:
+            os.remove(self.get_path(pointer))
+        except FileNotFoundError:
+            pass
+
+
+class DjangoStorageBlobStore(BaseBlobStore):
+    """
+    Keeps every blob as a file of a Django storage, e.g. an S3 bucket of django-storages
+    """
+
+    def __init__(self, storage: str = None, prefix: str = "rebel", **options):
+        super().__init__(**options)
+
+        if storage is None:
+            from django.core.files.storage import default_storage
+
+            self.storage = default_storage
+        else:
+            self.storage = import_string(storage)()
+
+        self.prefix = prefix
+
+    def put(self, data: bytes) -> str:
+        name = uuid.uuid4().hex
+
+        return self.storage.save("%s/%s/%s" % (self.prefix, name[:2], name), ContentFile(data))
+
+    def open(self, pointer: str):
+        return self.storage.open(pointer, "rb")
+
+    def delete(self, pointer: str):
+        self.storage.delete(pointer)
+
+
+_blob_stores = {}
+
+
+def get_blob_store():
+    """
+    Returns the blob store of the BLOB_STORE setting, or None if bodies are kept in the database
+    """
+    blob_store_settings = get_settings().get("BLOB_STORE")
+
+    if not blob_store_settings:
+        return None
+
+    key = repr(sorted(blob_store_settings.items()))
+
+    if key not in _blob_stores:
+        backend = import_string(blob_store_settings["BACKEND"])
+        options = {name.lower(): value for name, value in blob_store_settings.get("OPTIONS", {}).items()}
+
+        _blob_stores[key] = backend(**options)
+
+    return _blob_stores[key]
@@ -0,0 +1,265 @@
+import codecs
+import io
+import zlib
+
+from django import forms
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from django_rebel.settings import get_settings
+
+
+class COMPRESSION_CODECS:
+    PLAIN = "plain"
+    ZLIB = "zlib"
+    ZSTD = "zstd"
+
+
+# First byte of every stored value tells how the rest is encoded
+CODEC_HEADERS = {
+    COMPRESSION_CODECS.PLAIN: 0,
+    COMPRESSION_CODECS.ZLIB: 1,
+    COMPRESSION_CODECS.ZSTD: 2,
+}
+
+CODECS_BY_HEADER = {header: codec for codec, header in CODEC_HEADERS.items()}
+
+DEFAULT_COMPRESSION_SETTINGS = {
+    # None keeps new values uncompressed
+    "CODEC": None,
+    "LEVEL": None,
+    # Values smaller than this many bytes are not worth compressing
+    "MIN_SIZE": 512,
+}
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def get_compression_settings():
+    compression_settings = dict(DEFAULT_COMPRESSION_SETTINGS)
+    compression_settings.update(get_settings().get("CONTENT_COMPRESSION", {}))
+
+    return compression_settings
+
+
+def _get_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImproperlyConfigured("zstd compression requires zstandard, install django-rebel[zstd]")
+
+    return zstandard
+
+
+class CompressedData(bytes):
+    """
+    Encoded value of a compressed field as it is read from the database
+    """
+
+    @property
+    def codec(self):
+        return CODECS_BY_HEADER[self[0]]
+
+
+def compress(text: str, codec: str = None, level: int = None, min_size: int = None) -> bytes:
+    compression_settings = get_compression_settings()
+
+    codec = codec or compression_settings["CODEC"] or COMPRESSION_CODECS.PLAIN
+    level = level if level is not None else compression_settings["LEVEL"]
+    min_size = min_size if min_size is not None else compression_settings["MIN_SIZE"]
+
+    data = text.encode("utf-8")
+
+    if len(data) < min_size:
+        codec = COMPRESSION_CODECS.PLAIN
+
+    if codec == COMPRESSION_CODECS.ZLIB:
+        data = zlib.compress(data, level if level is not None else zlib.Z_DEFAULT_COMPRESSION)
+    elif codec == COMPRESSION_CODECS.ZSTD:
+        data = _get_zstandard().ZstdCompressor(level=level if level is not None else 3).compress(data)
+    elif codec != COMPRESSION_CODECS.PLAIN:
+        raise ImproperlyConfigured("Unknown compression codec: %s" % codec)
+
+    return CompressedData(bytes([CODEC_HEADERS[codec]]) + data)
+
+
+def decompress(data: bytes) -> str:
+    return "".join(iter_decompress(data, chunk_size=None))
+
+
+def iter_decompress(data: bytes, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yields the text of an encoded value piece by piece, so large bodies are never held decompressed as a whole
+    """
+    data = memoryview(data)
+    codec = CODECS_BY_HEADER[data[0]]
+    payload = data[1:]
+
+    if codec == COMPRESSION_CODECS.ZLIB:
+        decompressor = zlib.decompressobj()
+    elif codec == COMPRESSION_CODECS.ZSTD:
+        decompressor = _get_zstandard().ZstdDecompressor().decompressobj()
+    else:
+        decompressor = None
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    chunk_size = chunk_size or len(payload) or 1
+
+    for start in range(0, len(payload), chunk_size):
+        chunk = payload[start:start + chunk_size]
+
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+
+        text = decoder.decode(chunk)
+
+        if text:
+            yield text
+
+    text = decoder.decode(decompressor.flush() if decompressor is not None else b"", final=True)
+
+    if text:
+        yield text
+
+
+class DecompressingReader(io.RawIOBase):
+    """
+    Binary file object which decompresses an encoded file while it is read
+    """
+
+    def __init__(self, raw, chunk_size: int = STREAM_CHUNK_SIZE):
+        super().__init__()
+
+        self.raw = raw
+        self.chunk_size = chunk_size
+
+        header = raw.read(1)
+        codec = CODECS_BY_HEADER[header[0]] if header else COMPRESSION_CODECS.PLAIN
+
+        if codec == COMPRESSION_CODECS.ZLIB:
+            self.decompressor = zlib.decompressobj()
+        elif codec == COMPRESSION_CODECS.ZSTD:
+            self.decompressor = _get_zstandard().ZstdDecompressor().decompressobj()
+        else:
+            self.decompressor = None
+
+        self._buffer = b""
+        self._offset = 0
+        self._eof = not header
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._offset >= len(self._buffer) and not self._eof:
+            chunk = self.raw.read(self.chunk_size)
+
+            if not chunk:
+                self._eof = True
+                self._buffer = self.decompressor.flush() if self.decompressor is not None else b""
+            elif self.decompressor is not None:
+                self._buffer = self.decompressor.decompress(chunk)
+            else:
+                self._buffer = bytes(chunk)
+
+            self._offset = 0
+
+        size = min(len(buffer), len(self._buffer) - self._offset)
+
+        buffer[:size] = self._buffer[self._offset:self._offset + size]
+        self._offset += size
+
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+
+        super().close()
+
+
+class CompressedTextAttribute(DeferredAttribute):
+    """
+    Decompresses the value on the first access and keeps the text on the instance
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        value = super().__get__(instance, cls)
+
+        if isinstance(value, CompressedData):
+            value = decompress(value)
+            instance.__dict__[self.field.attname] = value
+
+        return value
+
+    def __set__(self, instance, value):
+        # Being a data descriptor, __get__ runs even when the raw value is on the instance
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.Field):
+    """
+    Text field which is stored as bytea with a codec header.
+
+    Values are compressed with the CONTENT_COMPRESSION settings on save and decompressed lazily,
+    so the rows which are loaded but never displayed cost nothing.
+    """
+
+    descriptor_class = CompressedTextAttribute
+
+    def get_internal_type(self):
+        return "BinaryField"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+
+        return CompressedData(value)
+
+    def to_python(self, value):
+        if isinstance(value, CompressedData):
+            return decompress(value)
+
+        return value
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, CompressedData):
+            # Encoded values are written as they are
+            return value
+
+        return compress(str(value))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+
+        if value is not None:
+            return connection.Database.Binary(value)
+
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def iter_text(self, instance, chunk_size: int = STREAM_CHUNK_SIZE):
+        """
+        Yields the value of the instance in pieces without decompressing it as a whole
+        """
+        value = instance.__dict__.get(self.attname)
+
+        if value is None and self.attname not in instance.__dict__:
+            value = getattr(instance, self.attname)
+
+        if value is None:
+            return
+
+        if isinstance(value, CompressedData):
+            yield from iter_decompress(value, chunk_size)
+        else:
+            yield value
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{"widget": forms.Textarea, **kwargs})
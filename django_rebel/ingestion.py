@@ -0,0 +1,680 @@
+import datetime
+import json
+from collections import Counter
+
+from django.db import transaction, connection, IntegrityError
+from django.db.models import Case, When, Value
+from django.utils import timezone
+
+from django_rebel.api.constants import EVENT_TYPES
+from django_rebel.models import Mail, Event, EventQueueItem
+from django_rebel.retention import get_event_cap_limit
+from django_rebel.settings import get_settings
+from django_rebel.stats import add_daily_stats, get_stat_status_metric
+from django_rebel.utils import LRUCache
+
+
+class INGESTION_MODES:
+    # Webhook writes the event in the request
+    DIRECT = "direct"
+    # Webhook only stores the payload, the queue consumer writes events in batches
+    QUEUE = "queue"
+
+
+DEFAULT_INGESTION_SETTINGS = {
+    "MODE": INGESTION_MODES.DIRECT,
+    "BATCH_SIZE": 1000,
+    "MAIL_ID_CACHE_SIZE": 10000,
+    # Queued payloads which fail this many times are kept in the queue as dead letters and skipped
+    "MAX_ATTEMPTS": 5,
+}
+
+
+def get_ingestion_settings():
+    ingestion_settings = dict(DEFAULT_INGESTION_SETTINGS)
+    ingestion_settings.update(get_settings().get("EVENT_INGESTION", {}))
+
+    return ingestion_settings
+
+
+_mail_id_caches = {}
+
+
+def get_mail_id_cache():
+    """
+    Returns the in process cache of the recent mail ids, delivered, opened and clicked events of a message
+    arrive in bursts. It is built on the first use, so the settings are not read when the module is imported.
+    """
+    maxsize = get_ingestion_settings()["MAIL_ID_CACHE_SIZE"]
+
+    if maxsize not in _mail_id_caches:
+        _mail_id_caches.setdefault(maxsize, LRUCache(maxsize=maxsize))
+
+    return _mail_id_caches[maxsize]
+
+
+def get_status_field(event_type: str):
+    field_name = "has_%s" % event_type.lower()
+
+    if field_name in Mail.STATUS_FIELDS:
+        return field_name
+
+    return None
+
+
+def fits_field(value, model, field_name: str, required=True):
+    """
+    Checks whether the value is a string which fits the column, None is accepted for the optional values
+    """
+    if value is None:
+        return not required
+
+    return isinstance(value, str) and len(value) <= model._meta.get_field(field_name).max_length
+
+
+def parse_event_data(event_data: dict):
+    """
+    Returns (message_id, recipient, event_type) of a Mailgun event-data, or None if the mail can not be tracked
+    or the event does not fit the columns, so a single bad event never fails the statement of a batch.
+
+    Events without a timestamp are refused too, a retried event would get another created_at and it would not be
+    skipped by the (provider_id, created_at) key of the partitioned event table.
+    """
+    try:
+        message_id = event_data["message"]["headers"]["message-id"]
+        recipient = event_data["recipient"]
+        event_type = event_data["event"]
+        storage = event_data.get("storage")
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+    if not (fits_field(message_id, Mail, "message_id") and fits_field(recipient, Mail, "email_to") and
+            fits_field(event_type, Event, "name") and fits_field(event_data.get("id"), Event, "provider_id", False)):
+        return None
+
+    if get_event_time(event_data) is None:
+        return None
+
+    if storage is not None and not (isinstance(storage, dict) and
+                                    fits_field(storage.get("url"), Mail, "storage_url", False)):
+        return None
+
+    return message_id, recipient, event_type
+
+
+def get_event_time(event_data: dict):
+    """
+    Time of the event at Mailgun. Events are stored with this time, so a retried event always lands
+    on the same partition and the same unique key.
+    """
+    try:
+        return datetime.datetime.fromtimestamp(float(event_data["timestamp"]), tz=datetime.timezone.utc)
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def get_event_extra_data(event_data: dict):
+    extra_data = {}
+
+    if event_data["event"] == EVENT_TYPES.CLICKED:
+        extra_data["url"] = event_data.get("url")
+
+    return extra_data or None
+
+
+def resolve_mail_id(message_id: str, recipient: str):
+    key = (message_id, recipient)
+    mail_id_cache = get_mail_id_cache()
+
+    mail_id = mail_id_cache.get(key)
+
+    if mail_id is not None:
+        return mail_id
+
+    mail_id = Mail.objects.filter(message_id=message_id, email_to=recipient).values_list("id", flat=True).first()
+
+    if mail_id is not None:
+        mail_id_cache.set(key, mail_id)
+
+    return mail_id
+
+
+def is_prunable(created_at, limit):
+    if limit is None:
+        return False
+
+    # Database returns naive local times when USE_TZ is disabled
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+
+    return created_at < limit
+
+
+# Event types which are counted on the mail with (counter, first time) fields
+COUNTED_EVENTS = {
+    EVENT_TYPES.OPENED: ("open_count", "first_opened_at"),
+    EVENT_TYPES.CLICKED: ("click_count", "first_clicked_at"),
+}
+
+
+def record_event(mail_id: int, event_data: dict):
+    """
+    Inserts the event and updates the status flag, counters and storage url of the mail in a single statement.
+
+    The update only touches the changed columns, so concurrent events of the same mail do not overwrite
+    each other. An event which is already recorded is skipped by its provider id together with its update.
+    The daily stats are counted when the event sets a status flag of the rollup for the first time.
+
+    Events which are older than the event cap grace may have been pruned, so they are not recognized when they
+    are replayed. They do not raise the counters, the counters are rebuilt from the stored events instead.
+    """
+    created_at = get_event_time(event_data)
+    is_old = is_prunable(created_at, get_event_cap_limit())
+
+    field_name = get_status_field(event_data["event"])
+    metric = get_stat_status_metric(field_name)
+    storage_url = (event_data.get("storage") or {}).get("url")
+    extra_data = get_event_extra_data(event_data)
+
+    assignments = [
+        "storage_url = COALESCE(storage_url, %(storage_url)s)",
+        "last_event_at = GREATEST(last_event_at, new_event.created_at)",
+    ]
+
+    if field_name:
+        # Field name is validated against Mail.STATUS_FIELDS
+        assignments.append("%s = true" % field_name)
+
+    if event_data["event"] in COUNTED_EVENTS:
+        count_field, first_time_field = COUNTED_EVENTS[event_data["event"]]
+
+        if not is_old:
+            assignments.append("{count} = {count} + 1".format(count=count_field))
+        assignments.append("{first} = LEAST({first}, new_event.created_at)".format(first=first_time_field))
+
+    if metric:
+        # Flag is read from the locked row, so only one of the concurrent events sees it unset
+        old_mail = """,
+        old_mail AS (
+            SELECT id, {field_name} AS was_set FROM {mail_table} WHERE id = %(mail_id)s FOR UPDATE
+        )""".format(field_name=field_name, mail_table=Mail._meta.db_table)
+        returning = "RETURNING old_mail.was_set"
+        sources = "new_event JOIN old_mail ON old_mail.id = new_event.mail_id"
+    else:
+        old_mail = ""
+        returning = ""
+        sources = "new_event"
+
+    sql = """
+        WITH new_event AS (
+            INSERT INTO {event_table} (mail_id, name, provider_id, extra_data, created_at, updated_at)
+            VALUES (%(mail_id)s, %(name)s, %(provider_id)s, %(extra_data)s::jsonb,
+                    %(created_at)s, now())
+            ON CONFLICT DO NOTHING
+            RETURNING mail_id, created_at
+        ){old_mail}
+        UPDATE {mail_table} SET {assignments}
+        FROM {sources}
+        WHERE {mail_table}.id = new_event.mail_id
+        {returning}
+    """.format(event_table=Event._meta.db_table,
+               mail_table=Mail._meta.db_table,
+               old_mail=old_mail,
+               assignments=", ".join(assignments),
+               sources=sources,
+               returning=returning)
+
+    params = {
+        "mail_id": mail_id,
+        "name": event_data["event"],
+        "provider_id": event_data.get("id"),
+        "created_at": created_at,
+        "extra_data": json.dumps(extra_data) if extra_data is not None else None,
+        "storage_url": storage_url,
+    }
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+        row = cursor.fetchone() if metric else None
+
+    if is_old and event_data["event"] in COUNTED_EVENTS:
+        rebuild_counters([mail_id])
+
+    if row is not None and not row[0]:
+        add_daily_stats({mail_id: {metric}})
+
+
+def rebuild_counters(mail_ids: list):
+    """
+    Recalculates the counters and times of the mails from their events.
+
+    Counters are only raised and times only widened, events which are pruned by the event cap are still counted
+    by the kept values. LEAST and GREATEST skip the nulls.
+    """
+    sql = """
+        UPDATE {mail_table} SET
+            open_count = GREATEST(mail.open_count, COALESCE(counters.open_count, 0)),
+            click_count = GREATEST(mail.click_count, COALESCE(counters.click_count, 0)),
+            first_opened_at = LEAST(mail.first_opened_at, counters.first_opened_at),
+            first_clicked_at = LEAST(mail.first_clicked_at, counters.first_clicked_at),
+            last_event_at = GREATEST(mail.last_event_at, counters.last_event_at)
+        FROM {mail_table} AS mail
+        LEFT JOIN (
+            SELECT mail_id,
+                   count(*) FILTER (WHERE name = %(opened)s) AS open_count,
+                   count(*) FILTER (WHERE name = %(clicked)s) AS click_count,
+                   min(created_at) FILTER (WHERE name = %(opened)s) AS first_opened_at,
+                   min(created_at) FILTER (WHERE name = %(clicked)s) AS first_clicked_at,
+                   max(created_at) AS last_event_at
+            FROM {event_table}
+            WHERE mail_id = ANY(%(mail_ids)s)
+            GROUP BY mail_id
+        ) AS counters ON counters.mail_id = mail.id
+        WHERE {mail_table}.id = mail.id AND mail.id = ANY(%(mail_ids)s)
+    """.format(mail_table=Mail._meta.db_table, event_table=Event._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"mail_ids": mail_ids, "opened": EVENT_TYPES.OPENED, "clicked": EVENT_TYPES.CLICKED})
+
+        return cursor.rowcount
+
+
+def ingest_event(event_data: dict):
+    """
+    Writes a webhook event, returns False if the mail of the event is not found
+    """
+    parsed = parse_event_data(event_data)
+
+    if parsed is None:
+        return False
+
+    message_id, recipient, _ = parsed
+
+    mail_id = resolve_mail_id(message_id, recipient)
+
+    if mail_id is None:
+        return False
+
+    try:
+        with transaction.atomic():
+            record_event(mail_id, event_data)
+    except IntegrityError:
+        # Cached mail may be deleted in the meantime
+        get_mail_id_cache().delete((message_id, recipient))
+
+        mail_id = resolve_mail_id(message_id, recipient)
+
+        if mail_id is None:
+            return False
+
+        record_event(mail_id, event_data)
+
+    return True
+
+
+class EventIngestor:
+    """
+    Writes batches of Mailgun event-data with set-based queries.
+
+    Mails are resolved with one lookup per batch, events are inserted with one bulk insert and
+    the mails are updated with one statement.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+
+    def resolve_mail_ids(self, keys: set) -> dict:
+        """
+        Returns (message_id, email_to) -> mail id mapping of the given keys
+        """
+        if not keys:
+            return {}
+
+        message_ids = set(message_id for message_id, _ in keys)
+        recipients = set(recipient for _, recipient in keys)
+
+        rows = Mail.objects.filter(message_id__in=message_ids, email_to__in=recipients) \
+            .values_list("message_id", "email_to", "id")
+
+        return {(message_id, email_to): mail_id for message_id, email_to, mail_id in rows
+                if (message_id, email_to) in keys}
+
+    def ingest(self, items: list):
+        parsed_items = []
+
+        for event_data in items:
+            parsed = parse_event_data(event_data)
+
+            if parsed is None:
+                self.stats["invalid"] += 1
+                continue
+
+            parsed_items.append((parsed, event_data))
+
+        mail_ids = self.resolve_mail_ids(set((message_id, recipient) for (message_id, recipient, _), _ in parsed_items))
+
+        events = []
+        storage_urls = {}
+
+        for (message_id, recipient, event_type), event_data in parsed_items:
+            mail_id = mail_ids.get((message_id, recipient))
+
+            if mail_id is None:
+                self.stats["missing_mail"] += 1
+                continue
+
+            events.append(Event(mail_id=mail_id, name=event_type, provider_id=event_data.get("id"),
+                                extra_data=get_event_extra_data(event_data), created_at=get_event_time(event_data)))
+
+            storage_url = (event_data.get("storage") or {}).get("url")
+
+            if storage_url:
+                storage_urls.setdefault(mail_id, storage_url)
+
+        events = self.exclude_existing_events(events)
+
+        with transaction.atomic():
+            inserted_events = self.insert_events(events)
+
+            self.update_mails(inserted_events)
+            self.update_storage_urls(storage_urls)
+
+        self.stats["ingested"] += len(inserted_events)
+        self.stats["duplicate"] += len(events) - len(inserted_events)
+
+        return inserted_events
+
+    def insert_events(self, events: list):
+        """
+        Inserts the events with one statement, returns (mail_id, name, created_at) of the inserted ones.
+
+        Events which are already recorded are skipped by the unique provider id.
+        """
+        if not events:
+            return []
+
+        rows = []
+        params = []
+
+        for event in events:
+            rows.append("(%s, %s, %s, %s::jsonb, %s, now())")
+            params.extend([event.mail_id, event.name, event.provider_id,
+                           json.dumps(event.extra_data) if event.extra_data is not None else None,
+                           event.created_at])
+
+        sql = """
+            INSERT INTO {event_table} (mail_id, name, provider_id, extra_data, created_at, updated_at)
+            VALUES {rows}
+            ON CONFLICT DO NOTHING
+            RETURNING mail_id, name, created_at
+        """.format(event_table=Event._meta.db_table, rows=", ".join(rows))
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+            return cursor.fetchall()
+
+    def exclude_existing_events(self, events: list):
+        """
+        Drops the events which are repeated in the batch
+        """
+        provider_ids = set()
+        new_events = []
+
+        for event in events:
+            if event.provider_id:
+                if event.provider_id in provider_ids:
+                    self.stats["duplicate"] += 1
+                    continue
+
+                provider_ids.add(event.provider_id)
+
+            new_events.append(event)
+
+        return new_events
+
+    def update_mails(self, events: list):
+        """
+        Sets the status flags, counters and times of the mails of (mail_id, name, created_at) events
+        with one update, and counts the flags which are set for the first time in the daily stats
+        """
+        if not events:
+            return
+
+        changes = {}
+        # Mails of the events which may have been pruned, their counters are rebuilt from the stored events
+        rebuilt_mail_ids = set()
+        limit = get_event_cap_limit()
+
+        for mail_id, name, created_at in events:
+            change = changes.setdefault(mail_id, {
+                "status_fields": set(),
+                "open_count": 0,
+                "click_count": 0,
+                "first_opened_at": None,
+                "first_clicked_at": None,
+                "last_event_at": created_at,
+            })
+
+            field_name = get_status_field(name)
+
+            if field_name:
+                change["status_fields"].add(field_name)
+
+            if name in COUNTED_EVENTS:
+                count_field, first_time_field = COUNTED_EVENTS[name]
+
+                if is_prunable(created_at, limit):
+                    rebuilt_mail_ids.add(mail_id)
+                else:
+                    change[count_field] += 1
+
+                if change[first_time_field] is None or created_at < change[first_time_field]:
+                    change[first_time_field] = created_at
+
+            change["last_event_at"] = max(change["last_event_at"], created_at)
+
+        status_fields = Mail.STATUS_FIELDS
+
+        # Rows are locked before the update, so the flags which are set by this batch are known
+        stat_fields = [field_name for field_name in status_fields if get_stat_status_metric(field_name)]
+        current_flags = {
+            row[0]: dict(zip(stat_fields, row[1:]))
+            for row in Mail.objects.select_for_update().filter(id__in=changes.keys()).order_by("id")
+            .values_list("id", *stat_fields)
+        }
+
+        rows = []
+        params = []
+
+        # Rows are locked in the same order by every writer
+        for mail_id in sorted(changes.keys()):
+            change = changes[mail_id]
+
+            rows.append("(%s)" % ", ".join(
+                ["%s::integer"] + ["%s::boolean"] * len(status_fields) +
+                ["%s::integer", "%s::integer", "%s::timestamptz", "%s::timestamptz", "%s::timestamptz"]
+            ))
+            params.append(mail_id)
+            params.extend(field_name in change["status_fields"] for field_name in status_fields)
+            params.extend([change["open_count"], change["click_count"], change["first_opened_at"],
+                           change["first_clicked_at"], change["last_event_at"]])
+
+        sql = """
+            UPDATE {mail_table} SET {status_assignments},
+                open_count = {mail_table}.open_count + changes.open_count,
+                click_count = {mail_table}.click_count + changes.click_count,
+                first_opened_at = LEAST({mail_table}.first_opened_at, changes.first_opened_at),
+                first_clicked_at = LEAST({mail_table}.first_clicked_at, changes.first_clicked_at),
+                last_event_at = GREATEST({mail_table}.last_event_at, changes.last_event_at)
+            FROM (VALUES {rows}) AS changes (id, {status_fields}, open_count, click_count,
+                                              first_opened_at, first_clicked_at, last_event_at)
+            WHERE {mail_table}.id = changes.id
+        """.format(mail_table=Mail._meta.db_table,
+                   status_assignments=", ".join("{field} = {mail_table}.{field} OR changes.{field}".format(
+                       field=field_name, mail_table=Mail._meta.db_table) for field_name in status_fields),
+                   rows=", ".join(rows),
+                   status_fields=", ".join(status_fields))
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+        if rebuilt_mail_ids:
+            rebuild_counters(sorted(rebuilt_mail_ids))
+
+        add_daily_stats({
+            mail_id: {get_stat_status_metric(field_name) for field_name in changes[mail_id]["status_fields"]
+                      if field_name in flags and not flags[field_name]}
+            for mail_id, flags in current_flags.items()
+        })
+
+    def update_storage_urls(self, storage_urls: dict):
+        """
+        Records storage urls of the mails with one update, contents are downloaded by the storage fetcher
+        """
+        if not storage_urls:
+            return
+
+        Mail.objects.filter(id__in=storage_urls.keys(), storage_url__isnull=True).update(
+            storage_url=Case(*[When(id=mail_id, then=Value(url)) for mail_id, url in storage_urls.items()])
+        )
+
+
+def iter_ndjson(lines):
+    """
+    Parses NDJSON lines lazily and yields event-data objects, both raw event-data and webhook payloads are accepted
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+
+        line = line.strip()
+
+        if not line:
+            continue
+
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+            continue
+
+        if isinstance(data, dict) and "event-data" in data:
+            data = data["event-data"]
+
+        yield data
+
+
+def import_ndjson(lines, batch_size: int = None):
+    """
+    Ingests a NDJSON stream of events in batches, returns the stats of the import
+    """
+    batch_size = batch_size or get_ingestion_settings()["BATCH_SIZE"]
+
+    ingestor = EventIngestor()
+
+    batch = []
+
+    for event_data in iter_ndjson(lines):
+        if not isinstance(event_data, dict):
+            ingestor.stats["invalid"] += 1
+            continue
+
+        batch.append(event_data)
+
+        if len(batch) >= batch_size:
+            ingestor.ingest(batch)
+            batch = []
+
+    if batch:
+        ingestor.ingest(batch)
+
+    return ingestor.stats
+
+
+class EventQueueConsumer:
+    """
+    Ingests queued webhook payloads in batches.
+
+    Rows are locked with SKIP LOCKED, so several consumers can run together without waiting for each other.
+    A batch which fails is ingested again item by item, the failing items are kept with their error and retried
+    by the next batches until they run out of attempts.
+    """
+
+    def __init__(self, batch_size: int = None, max_attempts: int = None):
+        ingestion_settings = get_ingestion_settings()
+
+        self.batch_size = batch_size or ingestion_settings["BATCH_SIZE"]
+        self.max_attempts = max_attempts or ingestion_settings["MAX_ATTEMPTS"]
+        self.ingestor = EventIngestor()
+
+    def get_queue_items(self):
+        return EventQueueItem.objects.filter(attempts__lt=self.max_attempts)
+
+    def consume_batch(self):
+        with transaction.atomic():
+            queue_items = list(
+                self.get_queue_items().select_for_update(skip_locked=True).order_by("id")[:self.batch_size]
+            )
+
+            if not queue_items:
+                return 0
+
+            stats = Counter(self.ingestor.stats)
+
+            try:
+                with transaction.atomic():
+                    self.ingestor.ingest([queue_item.payload for queue_item in queue_items])
+
+                failed_items = []
+            except Exception:
+                # Stats of the rolled back batch are counted again by the items
+                self.ingestor.stats = stats
+
+                failed_items = self.ingest_one_by_one(queue_items)
+
+            failed_ids = set(queue_item.id for queue_item in failed_items)
+
+            EventQueueItem.objects.filter(
+                id__in=[queue_item.id for queue_item in queue_items if queue_item.id not in failed_ids]
+            ).delete()
+
+            for queue_item in failed_items:
+                queue_item.save(update_fields=["attempts", "last_error"])
+
+        return len(queue_items)
+
+    def ingest_one_by_one(self, queue_items: list):
+        """
+        Ingests every item in its own savepoint, returns the items which failed
+        """
+        failed_items = []
+
+        for queue_item in queue_items:
+            try:
+                with transaction.atomic():
+                    self.ingestor.ingest([queue_item.payload])
+            except Exception as e:
+                # Any error of a payload only keeps that payload back
+                queue_item.attempts += 1
+                queue_item.last_error = str(e)
+                failed_items.append(queue_item)
+
+                self.ingestor.stats["failed"] += 1
+
+        return failed_items
+
+    def consume(self):
+        """
+        Consumes until the queue is empty
+        """
+        consumed = 0
+
+        while True:
+            count = self.consume_batch()
+
+            if count == 0:
+                return consumed
+
+            consumed += count
@@ -1,13 +1,14 @@
 import math
 from typing import List
 
-from django.contrib.contenttypes.models import ContentType
+from asgiref.sync import sync_to_async
 from django.contrib.staticfiles.finders import find
 from django.db import models
 from django.template import loader
 from django.utils import timezone
 
 from django_rebel.models import Mail, MailOwner
+from django_rebel.registry import label_registry, content_type_registry
 from django_rebel.services import PreparedMail
 from django_rebel.utils import cached_property
 
@@ -31,6 +32,9 @@ class DjangoMailTemplate:
 
     fail_silently = False
 
+    # Saves the rendered content with the mails, STORE_CONTENT setting by default
+    store_content = None
+
     def __init__(self, owner):
         if self.get_subject_template_path() is None or \
                 self.get_plain_email_template_path() is None or \
@@ -176,7 +180,44 @@ class DjangoMailTemplate:
 
         return mail
 
+    async def asend(self, force=False, fail_silently=False, template_variables=None):
+        self.template_variables.update(template_variables or {})
+
+        # If there is no one to send,
+        # Then return False
+        if await sync_to_async(self.is_owner_available)(force=force) is False:
+            return False
+
+        await sync_to_async(self.before_send)(self.owner)
+
+        mails, status = await self.aperform_send(fail_silently)
+
+        await sync_to_async(self.finally_send)(mails, status)
+
+        if status is False:
+            return False
+
+        mail = mails[0]
+
+        await sync_to_async(self.after_send)(mail)
+
+        return mail
+
     def perform_send(self, fail_silently=False):
+        mail_sender = self.get_prepared_mail()
+
+        mails = mail_sender.send(fail_silently=fail_silently)
+
+        return mails
+
+    async def aperform_send(self, fail_silently=False):
+        mail_sender = await sync_to_async(self.get_prepared_mail)()
+
+        mails = await mail_sender.asend(fail_silently=fail_silently)
+
+        return mails
+
+    def get_prepared_mail(self):
         mail_sender = PreparedMail(profile=self.get_email_profile(),
                                    from_address=self.get_from_address(),
                                    label=self.get_email_label(),
@@ -184,13 +225,12 @@ class DjangoMailTemplate:
                                    subject=self.get_subject_content(),
                                    html=self.get_html_email_content(),
                                    text=self.get_plain_email_content(),
-                                   inlines=self.get_inline_files())
+                                   inlines=self.get_inline_files(),
+                                   store_content=self.store_content)
 
         self.prepared_mail_receiver(mail_sender)
 
-        mails = mail_sender.send(fail_silently=fail_silently)
-
-        return mails
+        return mail_sender
 
     def after_send(self, mails):
         """
@@ -208,12 +248,14 @@ class DjangoMailTemplate:
         """
 
     def get_sent_mails(self):
-        owner_type = ContentType.objects.get(app_label=self.owner._meta.app_label,
-                                             model=self.owner._meta.model_name)
+        label_id = label_registry.get_id(self.get_email_label())
+
+        if label_id is None:
+            return Mail.objects.none()
 
-        owner_query = models.Q(owner_type=owner_type, owner_id=self.owner.id)
+        owner_query = models.Q(owner_type_id=content_type_registry.get_id(self.owner), owner_id=self.owner.id)
 
-        return Mail.objects.filter(owner_query).filter(label__slug=self.get_email_label())
+        return Mail.objects.filter(owner_query).filter(label_id=label_id)
 
 
 class BatchTemplateMailSender(DjangoMailTemplate):
@@ -227,18 +269,22 @@ class BatchTemplateMailSender(DjangoMailTemplate):
         self.owners: List[models.Model] = owners
 
     def get_sent_mails(self):
+        label_id = label_registry.get_id(self.get_email_label())
+
+        if label_id is None or not self.owners:
+            return Mail.objects.none()
+
         owner_query = None
 
         for owner in self.owners:
-            owner_type = ContentType.objects.get(app_label=owner._meta.app_label,
-                                                 model=owner._meta.model_name)
+            owner_type_id = content_type_registry.get_id(owner)
 
             if owner_query is None:
-                owner_query = models.Q(owner_type=owner_type, owner_id=owner.id)
+                owner_query = models.Q(owner_type_id=owner_type_id, owner_id=owner.id)
             else:
-                owner_query = owner_query | models.Q(owner_type=owner_type, owner_id=owner.id)
+                owner_query = owner_query | models.Q(owner_type_id=owner_type_id, owner_id=owner.id)
 
-        return Mail.objects.filter(owner_query).filter(label__slug=self.get_email_label())
+        return Mail.objects.filter(owner_query).filter(label_id=label_id)
 
     def get_available_owners_by_frequency(self):
         # This function is filtering owner by sent mails
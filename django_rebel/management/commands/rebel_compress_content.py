@@ -0,0 +1,147 @@
+import time
+from collections import defaultdict
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Case, When, Value
+
+from django_rebel.fields import COMPRESSION_CODECS, compress, decompress, get_compression_settings
+from django_rebel.models import MailBody, MailContent
+from django_rebel.storage import get_legacy_content_columns, has_legacy_content_bodies
+
+BODY_FIELDS = ("body_text", "body_html", "body_plain")
+
+
+class Command(BaseCommand):
+    help = "Moves the legacy text bodies of the contents into their bytea columns, then re-encodes stored mail " \
+           "bodies and contents with the configured compression codec in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--codec", choices=[COMPRESSION_CODECS.PLAIN, COMPRESSION_CODECS.ZLIB,
+                                                COMPRESSION_CODECS.ZSTD],
+                            help="CONTENT_COMPRESSION codec by default, 'plain' decompresses every body")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to wait between chunks")
+        parser.add_argument("--drop-legacy", action="store_true",
+                            help="Drop the legacy text columns of the contents once every body is moved")
+
+    def handle(self, *args, **options):
+        codec = options["codec"] or get_compression_settings()["CODEC"] or COMPRESSION_CODECS.PLAIN
+        # Small bodies are always kept plain, so decompressing must not skip them
+        min_size = 0 if codec == COMPRESSION_CODECS.PLAIN else None
+
+        self.move_legacy_bodies(options)
+
+        for model in (MailBody, MailContent):
+            self.convert(model, codec, min_size, options)
+
+        if options["drop_legacy"]:
+            self.drop_legacy_columns()
+
+    def drop_legacy_columns(self):
+        field_names = get_legacy_content_columns()
+
+        if not field_names:
+            return
+
+        if has_legacy_content_bodies():
+            raise CommandError("Contents still have legacy text bodies, they are not dropped")
+
+        # Dropping a column does not rewrite the table
+        with connection.cursor() as cursor:
+            # Tables with pending deferred foreign key checks can not be altered
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute("ALTER TABLE {table} {drops}".format(
+                table=MailContent._meta.db_table,
+                drops=", ".join("DROP COLUMN {field}_legacy".format(field=field_name) for field_name in field_names),
+            ))
+
+        MailContent.legacy_columns_dropped = True
+
+        self.stdout.write("MailContent: dropped legacy columns")
+
+    def move_legacy_bodies(self, options: dict):
+        field_names = get_legacy_content_columns()
+
+        if not field_names:
+            return
+
+        # Bodies are moved behind the plain codec header, so they are converted with the others below
+        sql = """
+            UPDATE {table} SET {assignments}
+            WHERE id IN (
+                SELECT id FROM {table} WHERE id > %s AND ({has_legacy}) ORDER BY id LIMIT %s
+            )
+            RETURNING id
+        """.format(
+            table=MailContent._meta.db_table,
+            assignments=", ".join(
+                "{field} = COALESCE('\\x00'::bytea || convert_to({field}_legacy, 'UTF8'), {field}), "
+                "{field}_legacy = NULL".format(field=field_name) for field_name in field_names
+            ),
+            has_legacy=" OR ".join("{field}_legacy IS NOT NULL".format(field=field_name)
+                                   for field_name in field_names),
+        )
+
+        last_id = 0
+        moved = 0
+
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [last_id, options["chunk_size"]])
+
+                content_ids = [content_id for content_id, in cursor.fetchall()]
+
+            if not content_ids:
+                break
+
+            moved += len(content_ids)
+            last_id = max(content_ids)
+
+            self.stdout.write("MailContent: moved %d legacy bodies, last id %d" % (moved, last_id))
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+    def convert(self, model, codec: str, min_size: int, options: dict):
+        last_id = 0
+        converted = 0
+
+        while True:
+            # Values are not decompressed by the field when they are not loaded into instances
+            rows = list(model.objects.filter(id__gt=last_id).order_by("id")
+                        .values_list("id", *BODY_FIELDS)[:options["chunk_size"]])
+
+            if not rows:
+                break
+
+            encoded_values = defaultdict(dict)
+
+            for row_id, *values in rows:
+                for field_name, value in zip(BODY_FIELDS, values):
+                    if value is None or value.codec == codec:
+                        continue
+
+                    encoded = compress(decompress(value), codec=codec, min_size=min_size)
+
+                    # Bodies under the minimum size stay plain
+                    if encoded != value:
+                        encoded_values[field_name][row_id] = encoded
+
+            self.update(model, encoded_values)
+
+            converted += len(set(row_id for values in encoded_values.values() for row_id in values))
+            last_id = rows[-1][0]
+
+            self.stdout.write("%s: converted %d rows, last id %d" % (model.__name__, converted, last_id))
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+    def update(self, model, encoded_values: dict):
+        for field_name, values in encoded_values.items():
+            field = model._meta.get_field(field_name)
+
+            model.objects.filter(id__in=values.keys()).update(**{field_name: Case(
+                *[When(id=row_id, then=Value(encoded, output_field=field)) for row_id, encoded in values.items()]
+            )})
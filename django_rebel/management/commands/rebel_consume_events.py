@@ -0,0 +1,30 @@
+import time
+
+from django.core.management import BaseCommand
+
+from django_rebel.ingestion import EventQueueConsumer
+
+
+class Command(BaseCommand):
+    help = "Ingests the webhook payloads which are queued by the event view"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--forever", action="store_true", help="Keep waiting for new payloads")
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        consumer = EventQueueConsumer(batch_size=options["batch_size"])
+
+        while True:
+            consumed = consumer.consume()
+
+            if consumed:
+                self.stdout.write("Consumed %d payloads" % consumed)
+
+            if not options["forever"]:
+                break
+
+            time.sleep(options["sleep"])
+
+        self.stdout.write(", ".join("%s=%d" % item for item in sorted(consumer.ingestor.stats.items())))
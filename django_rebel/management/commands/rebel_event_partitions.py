@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand, CommandError
+
+from django_rebel.partitioning import EventPartitionManager
+
+
+class Command(BaseCommand):
+    help = "Converts the event table to a partitioned table, creates upcoming partitions and drops expired ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true",
+                            help="Convert the event table to a partitioned table, existing rows are kept")
+        parser.add_argument("--batch-size", type=int, default=10000,
+                            help="Number of events whose created_at is backfilled at once by --convert")
+        parser.add_argument("--interval", choices=["month", "week"])
+        parser.add_argument("--ahead", type=int, help="Number of partitions to create ahead")
+        parser.add_argument("--retention-days", type=int, help="Drop partitions which end before this many days ago")
+
+    def handle(self, *args, **options):
+        manager = EventPartitionManager(interval=options["interval"], partitions_ahead=options["ahead"],
+                                        retention_days=options["retention_days"])
+
+        if options["convert"]:
+            if manager.convert(batch_size=options["batch_size"]):
+                self.stdout.write("Event table is converted to a partitioned table")
+        elif not manager.is_partitioned():
+            raise CommandError("Event table is not partitioned, run with --convert first")
+
+        for name in manager.create_partitions():
+            self.stdout.write("Created %s" % name)
+
+            if name in manager.moved_events:
+                self.stdout.write("Moved %d events from the default partition to %s" % (
+                    manager.moved_events[name], name))
+
+        for name in manager.drop_expired_partitions():
+            self.stdout.write("Dropped %s" % name)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management import BaseCommand
+
+from django_rebel.storage import StorageFetcher
+
+
+class Command(BaseCommand):
+    help = "Downloads stored messages of the mails from Mailgun storage before they expire"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int)
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--forever", action="store_true", help="Keep waiting for new storage urls")
+        parser.add_argument("--sleep", type=float, default=10.0, help="Seconds to wait between runs")
+
+    def handle(self, *args, **options):
+        while True:
+            fetcher = StorageFetcher(workers=options["workers"], batch_size=options["batch_size"])
+
+            stats = fetcher.run()
+
+            self.stdout.write(", ".join("%s=%d" % item for item in sorted(stats.items())))
+
+            if not options["forever"]:
+                break
+
+            time.sleep(options["sleep"])
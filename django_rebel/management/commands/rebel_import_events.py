@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management import BaseCommand
+
+from django_rebel.ingestion import import_ndjson
+
+
+class Command(BaseCommand):
+    help = "Imports Mailgun events from a NDJSON file, one event-data object per line"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="NDJSON file, '-' for stdin")
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            stats = import_ndjson(sys.stdin, batch_size=options["batch_size"])
+        else:
+            with open(options["path"], "rb") as f:
+                stats = import_ndjson(f, batch_size=options["batch_size"])
+
+        self.stdout.write(", ".join("%s=%d" % item for item in sorted(stats.items())))
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from django_rebel.models import MailBody, MailContent
+from django_rebel.search import index_bodies
+from django_rebel.storage import move_inline_contents, has_legacy_content_bodies
+
+
+class Command(BaseCommand):
+    help = "Writes the full text search vectors of the bodies which are not indexed yet in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to wait between chunks")
+        parser.add_argument("--move-inline", action="store_true",
+                            help="Move the contents which keep their bodies inline into the shared bodies first, "
+                                 "so they are indexed too")
+
+    def handle(self, *args, **options):
+        if options["move_inline"]:
+            # Contents of the legacy columns would be moved without their bodies
+            if has_legacy_content_bodies():
+                raise CommandError("Contents have legacy text bodies, run rebel_compress_content first")
+
+            self.move_inline_contents(options)
+        elif MailContent.objects.filter(body__isnull=True).exists():
+            self.stdout.write("Contents which keep their bodies inline are not indexed, run with --move-inline "
+                              "to move them into the shared bodies")
+
+        self.index_bodies(options)
+
+    def sleep(self, options):
+        if options["sleep"]:
+            time.sleep(options["sleep"])
+
+    def move_inline_contents(self, options):
+        last_id = 0
+        moved = 0
+
+        while True:
+            # Only the contents which are saved before the shared bodies have no body
+            content_ids = list(MailContent.objects.filter(id__gt=last_id, body__isnull=True).order_by("id")
+                               .values_list("id", flat=True)[:options["chunk_size"]])
+
+            if not content_ids:
+                break
+
+            moved += move_inline_contents(content_ids)
+            last_id = content_ids[-1]
+
+            self.stdout.write("Moved %d inline contents, last id %d" % (moved, last_id))
+
+            self.sleep(options)
+
+    def index_bodies(self, options):
+        last_id = 0
+        indexed = 0
+
+        while True:
+            bodies = list(MailBody.objects.filter(id__gt=last_id, search_vector__isnull=True).order_by("id")
+                          .defer("search_vector")[:options["chunk_size"]])
+
+            if not bodies:
+                break
+
+            # Bodies of the blob store are read through their pointers
+            index_bodies({
+                body.id: dict({"subject": body.subject},
+                              **{field_name: body.get_body(field_name) for field_name in MailBody.BODY_FIELDS})
+                for body in bodies
+            })
+
+            indexed += len(bodies)
+            last_id = bodies[-1].id
+
+            self.stdout.write("Indexed %d bodies, last id %d" % (indexed, last_id))
+
+            self.sleep(options)
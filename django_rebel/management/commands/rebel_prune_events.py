@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from django_rebel.retention import EventCapPruner
+
+
+class Command(BaseCommand):
+    help = "Deletes opened and clicked events of the mails beyond the EVENT_CAP limit, counters are kept"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-events", type=int)
+        parser.add_argument("--grace", type=int, help="Seconds to keep every event")
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        pruner = EventCapPruner(max_events=options["max_events"], grace=options["grace"],
+                                chunk_size=options["chunk_size"])
+
+        stats = pruner.run()
+
+        self.stdout.write(", ".join("%s=%d" % item for item in sorted(stats.items())))
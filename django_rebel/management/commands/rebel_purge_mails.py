@@ -0,0 +1,59 @@
+from django.core.management import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+
+from django_rebel.retention import MailPurger
+
+
+class Command(BaseCommand):
+    help = "Deletes old mails with their events and contents in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Delete the mails which are older than this many days")
+        parser.add_argument("--before", help="Delete the mails which are created before this date or datetime")
+        parser.add_argument("--label", help="Slug of the mail label")
+        parser.add_argument("--profile")
+        parser.add_argument("--chunk-size", type=int)
+        parser.add_argument("--sleep", type=float, help="Seconds to wait between chunks")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the mails")
+
+    def get_before(self, options):
+        if options["days"] is not None:
+            return timezone.now() - timezone.timedelta(days=options["days"])
+
+        if options["before"]:
+            before = parse_datetime(options["before"])
+
+            if before is None:
+                date = parse_date(options["before"])
+
+                if date is None:
+                    raise CommandError("Invalid date: %s" % options["before"])
+
+                before = timezone.datetime(date.year, date.month, date.day)
+
+            if timezone.is_naive(before) and timezone.is_aware(timezone.now()):
+                before = timezone.make_aware(before)
+
+            return before
+
+        raise CommandError("One of --days or --before is required")
+
+    def handle(self, *args, **options):
+        purger = MailPurger(self.get_before(options), label=options["label"], profile=options["profile"],
+                            chunk_size=options["chunk_size"], sleep=options["sleep"],
+                            progress=self.write_stats)
+
+        if options["dry_run"]:
+            self.stdout.write("mails=%d" % purger.count())
+            return
+
+        stats = purger.run()
+
+        self.stdout.write("Purged: %s" % self.format_stats(stats))
+
+    def format_stats(self, stats):
+        return ", ".join("%s=%d" % item for item in sorted(stats.items()))
+
+    def write_stats(self, stats):
+        self.stdout.write(self.format_stats(stats))
@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+
+from django_rebel.ingestion import rebuild_counters
+from django_rebel.models import Mail
+
+
+class Command(BaseCommand):
+    help = "Recalculates engagement counters of the mails from their events, counters are never lowered"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        last_id = 0
+        updated = 0
+
+        while True:
+            mail_ids = list(Mail.objects.filter(id__gt=last_id).order_by("id")
+                            .values_list("id", flat=True)[:options["chunk_size"]])
+
+            if not mail_ids:
+                break
+
+            updated += rebuild_counters(mail_ids)
+            last_id = mail_ids[-1]
+
+            self.stdout.write("Updated %d mails, last id %d" % (updated, last_id))
@@ -0,0 +1,44 @@
+import datetime
+
+from django.core.management import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from django_rebel.stats import rebuild_daily_stats, get_mail_days
+
+
+class Command(BaseCommand):
+    help = "Recalculates the daily stats rollup from the mails day by day, run it once to backfill the rollup"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="First day to rebuild, the day of the oldest mail by default")
+        parser.add_argument("--until", help="Last day to rebuild, the day of the newest mail by default")
+        parser.add_argument("--force", action="store_true",
+                            help="Rebuild the days whose mails are purged too, their purged mails are not counted")
+
+    def parse_day(self, value):
+        day = parse_date(value)
+
+        if day is None:
+            raise CommandError("Invalid date: %s" % value)
+
+        return day
+
+    def handle(self, *args, **options):
+        mail_days = get_mail_days()
+
+        if mail_days is None and not (options["since"] and options["until"]):
+            self.stdout.write("There is no mail")
+            return
+
+        day = self.parse_day(options["since"]) if options["since"] else mail_days[0]
+        until = self.parse_day(options["until"]) if options["until"] else mail_days[1]
+
+        while day <= until:
+            rows = rebuild_daily_stats(day, force=options["force"])
+
+            if rows is None:
+                self.stdout.write("%s: skipped, mails of the day are purged" % day.isoformat())
+            else:
+                self.stdout.write("%s: %d rows" % (day.isoformat(), rows))
+
+            day += datetime.timedelta(days=1)
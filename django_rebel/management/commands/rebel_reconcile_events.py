@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from django_rebel.reconciliation import EventReconciler
+from django_rebel.settings import get_settings
+
+
+class Command(BaseCommand):
+    help = "Writes the events which are missed by the webhooks from the Mailgun events api"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", action="append", dest="profiles",
+                            help="Email profile to reconcile, all profiles by default")
+        parser.add_argument("--begin", type=float, help="Start of the window as unix timestamp")
+        parser.add_argument("--end", type=float, help="End of the window as unix timestamp")
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        profiles = options["profiles"] or list(get_settings()["EMAIL_PROFILES"].keys())
+
+        for profile in profiles:
+            reconciler = EventReconciler(profile, batch_size=options["batch_size"])
+
+            stats = reconciler.run(begin=options["begin"], end=options["end"])
+
+            self.stdout.write("%s: %s" % (profile, ", ".join("%s=%d" % item for item in sorted(stats.items()))))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management import BaseCommand
+
+from django_rebel.stats import rollup_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Sums the daily stat deltas of the sending and the event ingestion into the daily stats rollup"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--forever", action="store_true", help="Keep waiting for new deltas")
+        parser.add_argument("--sleep", type=float, default=10.0, help="Seconds to wait when there is no delta")
+
+    def handle(self, *args, **options):
+        while True:
+            rows = 0
+
+            while True:
+                written = rollup_daily_stats(batch_size=options["batch_size"])
+
+                if not written:
+                    break
+
+                rows += written
+
+            if rows:
+                self.stdout.write("Wrote %d rows" % rows)
+
+            if not options["forever"]:
+                break
+
+            time.sleep(options["sleep"])
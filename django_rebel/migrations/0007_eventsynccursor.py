@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0006_alter_event_extra_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSyncCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('profile', models.CharField(max_length=32, unique=True)),
+                ('timestamp', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
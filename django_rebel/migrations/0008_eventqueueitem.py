@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0007_eventsynccursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventQueueItem',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
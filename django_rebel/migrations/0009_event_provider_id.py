@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Unique index is built concurrently, so the event table is not locked for writes
+    atomic = False
+
+    dependencies = [
+        ('django_rebel', '0008_eventqueueitem'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AddField(
+                    model_name='event',
+                    name='provider_id',
+                    field=models.CharField(blank=True, max_length=64, null=True),
+                ),
+                migrations.RunSQL(
+                    sql="CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS django_rebel_event_provider_id_key "
+                        "ON django_rebel_event (provider_id)",
+                    reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS django_rebel_event_provider_id_key",
+                ),
+                migrations.RunSQL(
+                    sql="ALTER TABLE django_rebel_event ADD CONSTRAINT django_rebel_event_provider_id_key "
+                        "UNIQUE USING INDEX django_rebel_event_provider_id_key",
+                    reverse_sql="ALTER TABLE django_rebel_event DROP CONSTRAINT django_rebel_event_provider_id_key",
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='event',
+                    name='provider_id',
+                    field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+                ),
+            ],
+        ),
+    ]
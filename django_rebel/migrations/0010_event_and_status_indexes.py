@@ -0,0 +1,64 @@
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Index
+
+
+def drop_mail_index(apps, schema_editor):
+    Event = apps.get_model('django_rebel', 'Event')
+
+    # Same lookup as AlterField, the index is dropped without locking the table for writes
+    for index_name in schema_editor._constraint_names(Event, ['mail_id'], index=True, type_=Index.suffix):
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % schema_editor.quote_name(index_name))
+
+
+def create_mail_index(apps, schema_editor):
+    Event = apps.get_model('django_rebel', 'Event')
+
+    schema_editor.execute(schema_editor._create_index_sql(Event, fields=[Event._meta.get_field('mail')],
+                                                          concurrently=True))
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, so the tables are not locked for writes
+    atomic = False
+
+    dependencies = [
+        ('django_rebel', '0009_event_provider_id'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['mail', 'name'], name='rebel_event_mail_name_idx'),
+        ),
+        # Index of the foreign key is covered by the index above
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='event',
+                    name='mail',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                            related_name='events', to='django_rebel.mail'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_mail_index, create_mail_index),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='mail',
+            index=models.Index(condition=models.Q(has_delivered=False), fields=['created_at', 'id'],
+                               name='rebel_mail_not_delivered_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mail',
+            index=models.Index(condition=models.Q(has_opened=True), fields=['created_at', 'id'],
+                               name='rebel_mail_opened_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mail',
+            index=models.Index(condition=models.Q(has_clicked=True), fields=['created_at', 'id'],
+                               name='rebel_mail_clicked_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+from django.db import migrations
+
+import django_rebel.fields
+
+BODY_FIELDS = ("body_text", "body_html", "body_plain")
+
+# Text columns are renamed and empty bytea columns take their names, both only change the catalog, so the table is
+# not rewritten. Bodies are read from the legacy columns until rebel_compress_content moves them in chunks, and
+# rebel_compress_content --drop-legacy drops the columns once they are empty.
+FORWARD_SQL = [
+    "ALTER TABLE django_rebel_mailcontent RENAME COLUMN {field} TO {field}_legacy".format(field=field)
+    for field in BODY_FIELDS
+] + [
+    "ALTER TABLE django_rebel_mailcontent %s" % ", ".join(
+        "ADD COLUMN {field} bytea NULL".format(field=field) for field in BODY_FIELDS
+    ),
+]
+
+# Moved bodies are copied back, which is only possible while they are kept plain
+REVERSE_SQL = [
+    "ALTER TABLE django_rebel_mailcontent %s" % ", ".join(
+        "ADD COLUMN IF NOT EXISTS {field}_legacy text NULL".format(field=field) for field in BODY_FIELDS
+    ),
+    "UPDATE django_rebel_mailcontent SET %s WHERE %s" % (
+        ", ".join("{field}_legacy = COALESCE({field}_legacy, convert_from(substring({field} from 2), 'UTF8'))"
+                  .format(field=field) for field in BODY_FIELDS),
+        " OR ".join("{field} IS NOT NULL".format(field=field) for field in BODY_FIELDS),
+    ),
+    "ALTER TABLE django_rebel_mailcontent %s" % ", ".join(
+        "DROP COLUMN {field}".format(field=field) for field in BODY_FIELDS
+    ),
+] + [
+    "ALTER TABLE django_rebel_mailcontent RENAME COLUMN {field}_legacy TO {field}".format(field=field)
+    for field in BODY_FIELDS
+]
+
+
+def drop_empty_legacy_columns(apps, schema_editor):
+    # New installs have no bodies to move, the table is locked by the renames already
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM django_rebel_mailcontent)")
+
+        if not cursor.fetchone()[0]:
+            cursor.execute("ALTER TABLE django_rebel_mailcontent %s" % ", ".join(
+                "DROP COLUMN {field}_legacy".format(field=field) for field in BODY_FIELDS
+            ))
+
+
+def check_plain_bodies(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM django_rebel_mailcontent WHERE %s)" % " OR ".join(
+            "get_byte({field}, 0) <> 0".format(field=field) for field in BODY_FIELDS
+        ))
+
+        if cursor.fetchone()[0]:
+            raise RuntimeError("Compressed bodies can not be converted back to text, "
+                               "run rebel_compress_content --codec plain first")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0010_event_and_status_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+                migrations.RunPython(drop_empty_legacy_columns, migrations.RunPython.noop),
+                migrations.RunPython(migrations.RunPython.noop, check_plain_bodies),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='mailcontent',
+                    name=field,
+                    field=django_rebel.fields.CompressedTextField(blank=True, null=True),
+                )
+                for field in BODY_FIELDS
+            ],
+        ),
+    ]
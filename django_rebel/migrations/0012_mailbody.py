@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_rebel.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0011_mailcontent_compressed_bodies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailBody',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('subject', models.CharField(blank=True, max_length=512, null=True)),
+                ('body_text', django_rebel.fields.CompressedTextField(blank=True, null=True)),
+                ('body_html', django_rebel.fields.CompressedTextField(blank=True, null=True)),
+                ('body_plain', django_rebel.fields.CompressedTextField(blank=True, null=True)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='mailcontent',
+            name='body',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='contents', to='django_rebel.mailbody'),
+        ),
+    ]
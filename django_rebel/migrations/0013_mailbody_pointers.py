@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0012_mailbody'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailbody',
+            name='body_html_pointer',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='mailbody',
+            name='body_plain_pointer',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='mailbody',
+            name='body_text_pointer',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0013_mailbody_pointers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mail',
+            name='click_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mail',
+            name='first_clicked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mail',
+            name='first_opened_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mail',
+            name='last_event_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mail',
+            name='open_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
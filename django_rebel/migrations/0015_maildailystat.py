@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0014_mail_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailDailyStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('profile', models.CharField(max_length=32)),
+                ('tag', models.CharField(blank=True, default='', max_length=64)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('delivered', models.PositiveIntegerField(default=0)),
+                ('opened', models.PositiveIntegerField(default=0)),
+                ('clicked', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('complained', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('label', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='django_rebel.maillabel')),
+            ],
+        ),
+        # Rows without a label are unique too, so the rollup is upserted with one statement
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX rebel_daily_stat_key ON django_rebel_maildailystat "
+            "(day, (COALESCE(label_id, 0)), profile, tag)",
+            "DROP INDEX rebel_daily_stat_key",
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index is built concurrently, so the table is not locked for writes
+    atomic = False
+
+    dependencies = [
+        ('django_rebel', '0015_maildailystat'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='mail',
+            index=models.Index(fields=['created_at', 'id'], name='rebel_mail_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:07
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Index
+
+
+def drop_tags_index(apps, schema_editor):
+    Mail = apps.get_model('django_rebel', 'Mail')
+
+    # Same lookup as AlterField, the index is dropped without locking the table for writes
+    for index_name in schema_editor._constraint_names(Mail, ['tags'], index=True, type_=Index.suffix):
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % schema_editor.quote_name(index_name))
+
+
+def create_tags_index(apps, schema_editor):
+    Mail = apps.get_model('django_rebel', 'Mail')
+
+    schema_editor.execute(schema_editor._create_index_sql(Mail, fields=[Mail._meta.get_field('tags')],
+                                                          concurrently=True))
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, so the tables are not locked for writes
+    atomic = False
+
+    dependencies = [
+        ('django_rebel', '0016_mail_created_at_id_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='mail',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='rebel_mail_tags_idx'),
+        ),
+        # B-tree of the tags is replaced by the GIN index
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='mail',
+                    name='tags',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=64), blank=True, null=True, size=None),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_tags_index, create_tags_index),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mailbody',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='mailbody',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='rebel_body_search_idx'),
+        ),
+    ]
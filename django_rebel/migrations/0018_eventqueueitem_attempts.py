@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0017_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventqueueitem',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='eventqueueitem',
+            name='last_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rebel', '0018_eventqueueitem_attempts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailDailyStatDelta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('profile', models.CharField(max_length=32)),
+                ('tag', models.CharField(blank=True, default='', max_length=64)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('delivered', models.PositiveIntegerField(default=0)),
+                ('opened', models.PositiveIntegerField(default=0)),
+                ('clicked', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('complained', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('label', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='django_rebel.maillabel')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index is built concurrently, so the table is not locked for writes
+    atomic = False
+
+    dependencies = [
+        ('django_rebel', '0019_maildailystatdelta'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='maildailystatdelta',
+            index=models.Index(fields=['day'], name='rebel_stat_delta_day_idx'),
+        ),
+    ]
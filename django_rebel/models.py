@@ -1,12 +1,15 @@
-import requests
-from django.conf import settings
+from django.contrib.admin.utils import quote
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
-from django.db import models
-from django.urls import reverse
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models
+from django.db.models.functions import Coalesce
+from django.urls import reverse, get_urlconf
 
 from django_rebel.api.constants import EVENT_TYPES
+from django_rebel.fields import CompressedTextField, DecompressingReader
 
 
 class TimeBasedModel(models.Model):
@@ -28,6 +31,15 @@ class MailLabel(TimeBasedModel):
 class MailQuerySet(models.QuerySet):
     use_in_migrations = True
 
+    def with_tags(self, *tags):
+        """
+        Mails which have every tag, the lookup is served by the GIN index of the tags
+        """
+        return self.filter(tags__contains=list(tags))
+
+    def with_any_tags(self, *tags):
+        return self.filter(tags__overlap=list(tags))
+
     def with_event_status(self):
         return self.annotate(
             calculated_has_opened=models.Exists(
@@ -62,8 +74,7 @@ class Mail(TimeBasedModel):
     label = models.ForeignKey(MailLabel, null=True, blank=True, on_delete=models.CASCADE)
 
     tags = ArrayField(
-        models.CharField(max_length=64), null=True, blank=True,
-        db_index=True
+        models.CharField(max_length=64), null=True, blank=True
     )
 
     has_accepted = models.BooleanField(default=False)
@@ -76,26 +87,63 @@ class Mail(TimeBasedModel):
     has_complained = models.BooleanField(default=False)
     has_stored = models.BooleanField(default=False)
 
+    # Engagement counters, kept up to date by the event ingestion
+    open_count = models.PositiveIntegerField(default=0)
+    click_count = models.PositiveIntegerField(default=0)
+    first_opened_at = models.DateTimeField(null=True, blank=True)
+    first_clicked_at = models.DateTimeField(null=True, blank=True)
+    last_event_at = models.DateTimeField(null=True, blank=True)
+
+    STATUS_FIELDS = ("has_accepted", "has_rejected", "has_delivered", "has_failed", "has_opened", "has_clicked",
+                     "has_unsubscribed", "has_complained", "has_stored")
+
     objects = MailManager()
 
     class Meta:
         unique_together = ("email_to", "message_id")
+        indexes = [
+            # Keyset pagination of the admin scans this index
+            models.Index(fields=["created_at", "id"], name="rebel_mail_created_at_id_idx"),
+            # Containment and overlap of the tags, a B-tree only serves equality of the whole array
+            GinIndex(fields=["tags"], name="rebel_mail_tags_idx"),
+            # Partial indexes of the status filters of the admin and reports, ordered for time ranges
+            models.Index(fields=["created_at", "id"], condition=models.Q(has_delivered=False),
+                         name="rebel_mail_not_delivered_idx"),
+            models.Index(fields=["created_at", "id"], condition=models.Q(has_opened=True),
+                         name="rebel_mail_opened_idx"),
+            models.Index(fields=["created_at", "id"], condition=models.Q(has_clicked=True),
+                         name="rebel_mail_clicked_idx"),
+        ]
 
     def get_storage(self):
-        profile_settings = settings.REBEL["EMAIL_PROFILES"][self.profile]
+        from django_rebel.api.mailgun import Mailgun
+
+        client = Mailgun(self.profile).client()
+
+        req = client.prepare_url_request(self.storage_url)
+
+        response = client.send(req)
 
-        auth = ("api", profile_settings["API"]["API_KEY"])
+        return response.json()
 
-        req = requests.get(self.storage_url, auth=auth)
+    async def aget_storage(self):
+        from django_rebel.api.mailgun import AsyncMailgun
 
-        return req.json()
+        client = AsyncMailgun(self.profile).client()
+
+        req = client.prepare_url_request(self.storage_url)
+
+        response = await client.send(req)
+
+        return response.json()
 
     def __str__(self):
         return str(self.id)
 
 
 class Event(TimeBasedModel):
-    mail = models.ForeignKey(Mail, related_name="events", on_delete=models.CASCADE)
+    # Mail lookups use the (mail, name) index
+    mail = models.ForeignKey(Mail, related_name="events", on_delete=models.CASCADE, db_index=False)
 
     EVENT_NAMES = (
         (EVENT_TYPES.ACCEPTED, EVENT_TYPES.ACCEPTED),
@@ -110,35 +158,320 @@ class Event(TimeBasedModel):
 
     name = models.CharField(max_length=32, choices=EVENT_NAMES)
 
+    # Id of the event at Mailgun, retried webhooks and reconciled events are written once by this
+    provider_id = models.CharField(max_length=64, null=True, blank=True, unique=True)
+
     extra_data = models.JSONField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["mail", "name"], name="rebel_event_mail_name_idx"),
+        ]
+
     def __str__(self):
         return "%s Event: %s" % (self.mail.__str__(), self.name)
 
 
+class MailBody(TimeBasedModel):
+    """
+    Body which is shared by the contents of every recipient of the same message
+    """
+    # sha256 of the subject and the bodies
+    digest = models.CharField(max_length=64, unique=True)
+
+    subject = models.CharField(max_length=512, null=True, blank=True)
+    body_text = CompressedTextField(null=True, blank=True)
+    body_html = CompressedTextField(null=True, blank=True)
+    body_plain = CompressedTextField(null=True, blank=True)
+
+    # Bodies which are kept in the blob store only have their pointers here
+    body_text_pointer = models.CharField(max_length=255, null=True, blank=True)
+    body_html_pointer = models.CharField(max_length=255, null=True, blank=True)
+    body_plain_pointer = models.CharField(max_length=255, null=True, blank=True)
+
+    # Number of the contents which use the body, the body is deleted when it drops to zero
+    ref_count = models.PositiveIntegerField(default=0)
+
+    # Weighted subject and text of the body, only kept when the full text search is enabled
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    BODY_FIELDS = ("body_text", "body_html", "body_plain")
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="rebel_body_search_idx"),
+        ]
+
+    def __str__(self):
+        return self.digest
+
+    def get_pointer(self, field_name: str):
+        return getattr(self, "%s_pointer" % field_name)
+
+    def open_body(self, field_name: str):
+        """
+        Returns a binary file object of the utf-8 body which is read from the blob store, or None
+        """
+        from django_rebel.blobstore import get_blob_store
+
+        pointer = self.get_pointer(field_name)
+
+        if pointer is None:
+            return None
+
+        return DecompressingReader(get_blob_store().open(pointer))
+
+    def get_body(self, field_name: str):
+        if self.get_pointer(field_name) is None:
+            return getattr(self, field_name)
+
+        with self.open_body(field_name) as f:
+            return f.read().decode("utf-8")
+
+    def get_body_text(self):
+        return self.get_body("body_text")
+
+    def get_body_html(self):
+        return self.get_body("body_html")
+
+    def get_body_plain(self):
+        return self.get_body("body_plain")
+
+
 class MailContent(TimeBasedModel):
     mail = models.OneToOneField(Mail, related_name="content", on_delete=models.CASCADE)
 
     subject = models.CharField(max_length=512, null=True, blank=True)
-    body_text = models.TextField(null=True, blank=True)
-    body_html = models.TextField(null=True, blank=True)
-    body_plain = models.TextField(null=True, blank=True)
+
+    body = models.ForeignKey(MailBody, related_name="contents", null=True, blank=True, on_delete=models.PROTECT)
+
+    # Bodies of the contents which are saved before the shared bodies
+    body_text = CompressedTextField(null=True, blank=True)
+    body_html = CompressedTextField(null=True, blank=True)
+    body_plain = CompressedTextField(null=True, blank=True)
+
+    # Set once the legacy text columns of migration 0011 are found dropped, so they are not looked up anymore
+    legacy_columns_dropped = False
 
     def __str__(self):
         return self.subject
 
+    def get_body_source(self):
+        """
+        Returns the object which keeps the bodies of the content
+        """
+        if self.body_id is not None:
+            return self.body
+
+        return self
+
+    def get_legacy_body(self, field_name: str):
+        """
+        Text body which is kept in the legacy column of migration 0011 until rebel_compress_content moves it
+        """
+        if MailContent.legacy_columns_dropped or self.body_id is not None:
+            return None
+
+        value = self.__dict__[field_name] if field_name in self.__dict__ else getattr(self, field_name)
+
+        if value is not None:
+            return None
+
+        if not hasattr(self, "_legacy_bodies"):
+            legacy_names = ["%s_legacy" % name for name in MailBody.BODY_FIELDS]
+
+            # Row is read as json, so the query does not fail once the legacy columns are dropped
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT row ?| %s, row ->> %s, row ->> %s, row ->> %s
+                    FROM (SELECT to_jsonb(content) AS row FROM {table} content WHERE id = %s) AS content
+                """.format(table=MailContent._meta.db_table), [legacy_names, *legacy_names, self.id])
+
+                row = cursor.fetchone()
+
+            if row is not None and not row[0]:
+                MailContent.legacy_columns_dropped = True
+
+            self._legacy_bodies = dict(zip(MailBody.BODY_FIELDS, row[1:])) if row is not None else {}
+
+        return self._legacy_bodies.get(field_name)
+
+    def get_body(self, field_name: str):
+        if self.body_id is not None:
+            return self.body.get_body(field_name)
+
+        value = getattr(self, field_name)
+
+        if value is None:
+            return self.get_legacy_body(field_name)
+
+        return value
+
+    def get_body_text(self):
+        return self.get_body("body_text")
+
+    def get_body_html(self):
+        return self.get_body("body_html")
+
+    def get_body_plain(self):
+        return self.get_body("body_plain")
+
     def get_content_url(self):
         return reverse("rebel:content", kwargs={"mail_id": self.mail_id})
 
 
+class EventQueueItem(models.Model):
+    """
+    Raw webhook payload which waits to be ingested in a batch
+    """
+    id = models.BigAutoField(primary_key=True)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Failed ingestions of the payload, it is not consumed anymore once it runs out of attempts
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class EventSyncCursor(TimeBasedModel):
+    """
+    High-water mark of the events which are reconciled from the events api of a profile
+    """
+    profile = models.CharField(max_length=32, unique=True)
+    timestamp = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return self.profile
+
+
+class MailDailyStatQuerySet(models.QuerySet):
+    METRICS = ("sent", "delivered", "opened", "clicked", "failed", "complained")
+
+    def for_report(self, since=None, until=None, label=None, profile=None, tag=None):
+        """
+        Filters the rows of the days between since and until, both included.
+
+        Rows of a tag only count the mails with the tag, so every mail is counted once when no tag is given.
+        """
+        queryset = self.filter(tag=tag or "")
+
+        if since is not None:
+            queryset = queryset.filter(day__gte=since)
+
+        if until is not None:
+            queryset = queryset.filter(day__lte=until)
+
+        if isinstance(label, MailLabel):
+            queryset = queryset.filter(label=label)
+        elif label is not None:
+            queryset = queryset.filter(label__slug=label)
+
+        if profile is not None:
+            queryset = queryset.filter(profile=profile)
+
+        return queryset
+
+    def report(self, group_by=("day",), **filters):
+        """
+        Sums the metrics of the report filters grouped by the given fields
+        """
+        return self.for_report(**filters).values(*group_by).annotate(
+            **{metric: models.Sum(metric) for metric in self.METRICS}
+        ).order_by(*group_by)
+
+    def totals(self, **filters):
+        """
+        Sums the metrics of the report filters in one row
+        """
+        return self.for_report(**filters).aggregate(
+            **{metric: Coalesce(models.Sum(metric), 0) for metric in self.METRICS}
+        )
+
+
+class MailDailyStat(models.Model):
+    """
+    Daily rollup of the mails by their send day, label, profile and tag.
+
+    Mails are counted when they are saved and when their status flags are set by the event ingestion.
+    Every mail is counted in the row with an empty tag, and in the row of each of its tags.
+    """
+    day = models.DateField()
+    label = models.ForeignKey(MailLabel, null=True, blank=True, on_delete=models.CASCADE, related_name="+")
+    profile = models.CharField(max_length=32)
+    tag = models.CharField(max_length=64, blank=True, default="")
+
+    sent = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    opened = models.PositiveIntegerField(default=0)
+    clicked = models.PositiveIntegerField(default=0)
+    # Bounces
+    failed = models.PositiveIntegerField(default=0)
+    complained = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MailDailyStatQuerySet.as_manager()
+
+    # Rows are unique by (day, label, profile, tag) with an index which is created by the migration,
+    # it treats no label as a value and serves the day ranges of the reports too
+
+    def __str__(self):
+        return "%s %s" % (self.day, self.profile)
+
+
+class MailDailyStatDelta(models.Model):
+    """
+    Change of a daily stat row which is appended by the sending and the event ingestion.
+
+    Deltas are only inserted, so concurrent transactions never wait for the same stat row. They are summed
+    into MailDailyStat and deleted by the periodic rollup.
+    """
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField()
+    label = models.ForeignKey(MailLabel, null=True, blank=True, on_delete=models.CASCADE, related_name="+")
+    profile = models.CharField(max_length=32)
+    tag = models.CharField(max_length=64, blank=True, default="")
+
+    sent = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    opened = models.PositiveIntegerField(default=0)
+    clicked = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    complained = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Deltas of a day are dropped by its rebuild
+            models.Index(fields=["day"], name="rebel_stat_delta_day_idx"),
+        ]
+
+    def __str__(self):
+        return "%s %s" % (self.day, self.profile)
+
+
+# Admin change url of every owner model is reversed once, urls of the rows are built from it
+_admin_url_patterns = {}
+
+ADMIN_URL_PLACEHOLDER = "__rebel_pk__"
+
+
 class MailOwner(models.Model):
     def get_email(self):
         raise NotImplementedError()
 
     def get_admin_view_link(self):
-        url = reverse('admin:%s_%s_change' % (self._meta.app_label, self._meta.model_name), args=[self.id])
+        key = (self._meta.label, get_urlconf())
+
+        if key not in _admin_url_patterns:
+            _admin_url_patterns[key] = reverse('admin:%s_%s_change' % (self._meta.app_label, self._meta.model_name),
+                                               args=[ADMIN_URL_PLACEHOLDER])
 
-        return url
+        return _admin_url_patterns[key].replace(ADMIN_URL_PLACEHOLDER, str(quote(self.pk)))
 
     class Meta:
         abstract = True
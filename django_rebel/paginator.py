@@ -1,16 +1,45 @@
+import base64
+import datetime
+import hashlib
+import json
+from collections.abc import Sequence
 from math import ceil
 
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.exceptions import ValidationError, EmptyResultSet
+from django.core.paginator import Paginator, InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 # Modified version of a GIST I found in a SO thread
-from django.db import connection
+from django.db import connections, transaction, DatabaseError
+from django.db.models import BooleanField, F, Func, Value, QuerySet
+
+from django_rebel.settings import get_settings
+
+DEFAULT_COUNT_SETTINGS = {
+    # Lists are counted with the row estimate of the planner
+    "ESTIMATE": True,
+    # Lists which are estimated to have less rows than this are counted exactly
+    "EXACT_THRESHOLD": 10000,
+    # Seconds to keep the count of the same filters, 0 disables the cache
+    "CACHE_TTL": 60,
+}
+
+
+def get_count_settings():
+    count_settings = dict(DEFAULT_COUNT_SETTINGS)
+    count_settings.update(get_settings().get("LIST_COUNT", {}))
+
+    return count_settings
 
 
 class LargeListPaginator(Paginator):
     """
     Warning: Postgresql only hack
-    Overrides the count method of QuerySet objects to get an estimate instead of actual count when not filtered.
+    Overrides the count method of QuerySet objects to get an estimate instead of actual count.
+    Unfiltered lists are estimated with the table statistics and filtered ones with the planner,
+    only the lists which are estimated to be small are counted exactly.
     However, this estimate can be stale and hence not fit for situations where the count of objects actually matter.
     """
 
@@ -19,21 +48,78 @@ class LargeListPaginator(Paginator):
 
         self.max_num_pages = max_num_pages
 
+    def get_count_cache_key(self):
+        queryset = self.object_list
+        # Ordering does not change the count, so every ordering of the same filters shares it
+        sql, params = queryset.order_by().query.get_compiler(using=queryset.db).as_sql()
+
+        signature = "%s:%s:%r" % (queryset.db, sql, params)
+
+        return "rebel:count:%s" % hashlib.sha1(signature.encode("utf-8")).hexdigest()
+
+    def estimate_count(self):
+        """
+        Returns the estimated row count of the list, or None if it can not be estimated
+        """
+        queryset = self.object_list
+        query = queryset.query
+
+        try:
+            # Savepoint keeps the transaction usable if the estimate fails
+            with transaction.atomic(using=queryset.db), connections[queryset.db].cursor() as cursor:
+                if not query.where:
+                    cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                                   [query.model._meta.db_table])
+                    estimate = cursor.fetchone()[0]
+                else:
+                    sql, params = queryset.order_by().query.get_compiler(using=queryset.db).as_sql()
+
+                    cursor.execute("EXPLAIN (FORMAT JSON) %s" % sql, params)
+                    plan = cursor.fetchone()[0]
+
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+
+                    estimate = plan[0]["Plan"]["Plan Rows"]
+        except (DatabaseError, EmptyResultSet):
+            return None
+
+        # Tables which are never analyzed have no statistics
+        if estimate < 0:
+            return None
+
+        return int(estimate)
+
     def _get_count(self):
         if getattr(self, '_count', None) is not None:
             return self._count
 
-        query = self.object_list.query
-        if not query.where:
-            try:
-                cursor = connection.cursor()
-                cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s",
-                               [query.model._meta.db_table])
-                self._count = int(cursor.fetchone()[0])
-            except:
-                self._count = self.object_list.count()
-        else:
-            self._count = self.object_list.count()
+        if not isinstance(self.object_list, QuerySet):
+            self._count = len(self.object_list)
+
+            return self._count
+
+        count_settings = get_count_settings()
+
+        try:
+            cache_key = self.get_count_cache_key() if count_settings["CACHE_TTL"] else None
+        except EmptyResultSet:
+            self._count = 0
+
+            return self._count
+
+        count = cache.get(cache_key) if cache_key else None
+
+        if count is None:
+            count = self.estimate_count() if count_settings["ESTIMATE"] else None
+
+            if count is None or count < count_settings["EXACT_THRESHOLD"]:
+                count = self.object_list.count()
+
+            if cache_key:
+                cache.set(cache_key, count, count_settings["CACHE_TTL"])
+
+        self._count = count
 
         return self._count
 
@@ -46,6 +132,171 @@ class LargeListPaginator(Paginator):
         hits = max(1, self.count - self.orphans)
         normal_value = ceil(hits / self.per_page)
 
+        if self.max_num_pages is None:
+            return normal_value
+
         return min(self.max_num_pages, normal_value)
 
-    num_pages = property(_get_num_pages)
\ No newline at end of file
+    num_pages = property(_get_num_pages)
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # Microseconds are kept, they tell the rows of the same millisecond apart
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+
+        return super().default(o)
+
+
+class KeysetPage(Sequence):
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return "<Keyset page of %d objects>" % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator(LargeListPaginator):
+    """
+    Pages by the values of the ordering fields instead of OFFSET, so every page is an index range scan
+    no matter how deep it is. Pages are reached with the next and previous cursors of a page, page numbers
+    are not supported.
+
+    Ordering fields must be unique together and share the same direction, rows with a null ordering value
+    are left out.
+    """
+
+    NEXT = "next"
+    PREVIOUS = "previous"
+
+    ordering = ("-created_at", "-id")
+
+    def __init__(self, max_num_pages=None, *args, ordering=None, **kwargs):
+        super().__init__(max_num_pages, *args, **kwargs)
+
+        self.ordering = tuple(ordering or self.ordering)
+        self.descending = self.ordering[0].startswith("-")
+        self.field_names = [name.lstrip("-") for name in self.ordering]
+
+        if any(name.startswith("-") != self.descending for name in self.ordering):
+            raise ValueError("Keyset ordering fields must share the same direction")
+
+    def _check_object_list_is_ordered(self):
+        # Pages are always ordered by the keyset
+        pass
+
+    def get_fields(self):
+        opts = self.object_list.model._meta
+
+        return [opts.pk if name == "pk" else opts.get_field(name) for name in self.field_names]
+
+    def get_values(self, obj):
+        return [getattr(obj, field.attname) for field in self.get_fields()]
+
+    def encode_cursor(self, obj, direction: str):
+        data = json.dumps([direction, self.get_values(obj)], cls=CursorEncoder, separators=(",", ":"))
+
+        return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor: str):
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direction, values = json.loads(data.decode("utf-8"))
+
+            if direction not in (self.NEXT, self.PREVIOUS) or len(values) != len(self.field_names):
+                raise ValueError()
+
+            values = [field.to_python(value) for field, value in zip(self.get_fields(), values)]
+        except (TypeError, ValueError, ValidationError):
+            raise InvalidCursor("Invalid cursor")
+
+        return direction, values
+
+    def get_keyset_filter(self, values: list, direction: str):
+        """
+        Row value comparison of the ordering fields, which postgres runs as one range scan of their index
+        """
+        forward = direction == self.NEXT
+
+        return KeysetComparison(
+            RowValue(*[F(name) for name in self.field_names]),
+            RowValue(*[Value(value, output_field=field) for value, field in zip(values, self.get_fields())]),
+            operator="<" if forward == self.descending else ">",
+        )
+
+    def get_cursor_page(self, cursor: str = None):
+        """
+        Returns the page after or before the cursor, or the first page if there is no cursor
+        """
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        else:
+            direction, values = self.NEXT, None
+
+        queryset = self.object_list.filter(**{"%s__isnull" % field.name: False
+                                              for field in self.get_fields() if field.null})
+
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values, direction))
+
+        if direction == self.NEXT:
+            ordering = self.ordering
+        else:
+            ordering = [name[1:] if name.startswith("-") else "-" + name for name in self.ordering]
+
+        object_list = list(queryset.order_by(*ordering)[:self.per_page + 1])
+
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if direction == self.NEXT:
+            has_next, has_previous = has_more, values is not None
+        else:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+
+        return KeysetPage(
+            object_list,
+            self,
+            next_cursor=self.encode_cursor(object_list[-1], self.NEXT) if has_next and object_list else None,
+            previous_cursor=self.encode_cursor(object_list[0], self.PREVIOUS) if has_previous and object_list
+            else None,
+        )
+
+
+class RowValue(Func):
+    function = ""
+    template = "(%(expressions)s)"
+
+
+class KeysetComparison(Func):
+    template = "%(expressions)s"
+    output_field = BooleanField()
+
+    def __init__(self, left, right, operator: str):
+        super().__init__(left, right)
+
+        self.arg_joiner = " %s " % operator
@@ -0,0 +1,362 @@
+import datetime
+import re
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from django_rebel.models import Event, Mail
+from django_rebel.settings import get_settings
+
+
+class PARTITION_INTERVALS:
+    MONTH = "month"
+    WEEK = "week"
+
+
+DEFAULT_PARTITIONING_SETTINGS = {
+    "INTERVAL": PARTITION_INTERVALS.MONTH,
+    # Partitions are created this many intervals ahead
+    "PARTITIONS_AHEAD": 3,
+    # Partitions which end before this many days ago are dropped, None keeps every partition
+    "RETENTION_DAYS": None,
+}
+
+BOUND_PATTERN = re.compile(r"FROM \((?P<lower>[^)]+)\) TO \((?P<upper>[^)]+)\)")
+
+
+def get_partitioning_settings():
+    partitioning_settings = dict(DEFAULT_PARTITIONING_SETTINGS)
+    partitioning_settings.update(get_settings().get("EVENT_PARTITIONING", {}))
+
+    return partitioning_settings
+
+
+def _parse_bound(value: str):
+    value = value.strip()
+
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+
+    return parse_datetime(value.strip("'"))
+
+
+class Partition:
+    def __init__(self, name: str, lower: datetime.datetime = None, upper: datetime.datetime = None,
+                 is_default=False):
+        self.name = name
+        self.lower = lower
+        self.upper = upper
+        self.is_default = is_default
+
+    def overlaps(self, lower: datetime.datetime, upper: datetime.datetime):
+        if self.is_default:
+            return False
+
+        return (self.lower is None or self.lower < upper) and (self.upper is None or lower < self.upper)
+
+    def __repr__(self):
+        return "<Partition %s: %s - %s>" % (self.name, self.lower, self.upper)
+
+
+class EventPartitionManager:
+    """
+    Keeps the event table range partitioned by created_at.
+
+    Old partitions are detached and dropped, so retention costs the same no matter how many events there are.
+    Events out of every range are kept in the default partition.
+    """
+
+    def __init__(self, interval: str = None, partitions_ahead: int = None, retention_days: int = None):
+        partitioning_settings = get_partitioning_settings()
+
+        self.interval = interval or partitioning_settings["INTERVAL"]
+        self.partitions_ahead = partitions_ahead if partitions_ahead is not None else \
+            partitioning_settings["PARTITIONS_AHEAD"]
+        self.retention_days = retention_days if retention_days is not None else \
+            partitioning_settings["RETENTION_DAYS"]
+
+        self.table = Event._meta.db_table
+        self.moved_events = {}
+
+    def now(self):
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def get_period_start(self, value: datetime.datetime):
+        value = value.astimezone(datetime.timezone.utc)
+
+        if self.interval == PARTITION_INTERVALS.WEEK:
+            day = value - datetime.timedelta(days=value.weekday())
+
+            return datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+
+        return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+    def get_next_period_start(self, start: datetime.datetime):
+        if self.interval == PARTITION_INTERVALS.WEEK:
+            return start + datetime.timedelta(days=7)
+
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+
+        return start.replace(month=start.month + 1)
+
+    def get_partition_name(self, start: datetime.datetime):
+        if self.interval == PARTITION_INTERVALS.WEEK:
+            return "%s_p%s" % (self.table, start.strftime("%Y%m%d"))
+
+        return "%s_p%s" % (self.table, start.strftime("%Y%m"))
+
+    def is_partitioned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [self.table])
+
+            return cursor.fetchone() is not None
+
+    def get_partitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+                FROM pg_inherits
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = %s::regclass
+                ORDER BY child.relname
+            """, [self.table])
+
+            rows = cursor.fetchall()
+
+        partitions = []
+
+        for name, bound in rows:
+            if bound == "DEFAULT":
+                partitions.append(Partition(name, is_default=True))
+                continue
+
+            match = BOUND_PATTERN.search(bound)
+
+            partitions.append(Partition(name, _parse_bound(match.group("lower")), _parse_bound(match.group("upper"))))
+
+        return partitions
+
+    def backfill_created_at(self, batch_size: int):
+        """
+        Sets created_at of the events which have none in short batches, so writers are not held back
+        """
+        last_id = 0
+
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE {table} SET created_at = COALESCE(updated_at, now())
+                    WHERE id IN (SELECT id FROM {table} WHERE id > %s AND created_at IS NULL ORDER BY id LIMIT %s)
+                    RETURNING id
+                """.format(table=self.table), [last_id, batch_size])
+
+                ids = [row[0] for row in cursor.fetchall()]
+
+            if len(ids) < batch_size:
+                return
+
+            last_id = max(ids)
+
+    def build_unique_index(self, name: str, columns: str):
+        concurrently = "" if connection.in_atomic_block else "CONCURRENTLY"
+
+        with connection.cursor() as cursor:
+            # Concurrent build which failed leaves an invalid index behind
+            cursor.execute("SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid", [name])
+
+            if cursor.fetchone() is not None:
+                cursor.execute("DROP INDEX {concurrently} {name}".format(concurrently=concurrently, name=name))
+
+            cursor.execute("CREATE UNIQUE INDEX {concurrently} IF NOT EXISTS {name} ON {table} ({columns})".format(
+                concurrently=concurrently, name=name, table=self.table, columns=columns))
+
+    def convert(self, batch_size: int = 10000):
+        """
+        Turns the plain event table into a partitioned one.
+
+        Existing rows are kept in a legacy partition, so they are not copied, and the legacy partition is dropped
+        by retention like the others. Rows are backfilled, checked and indexed while events are still written,
+        the table is only locked to swap it with the partitioned one.
+        """
+        if self.is_partitioned():
+            return False
+
+        table = self.table
+        legacy_table = "%s_legacy" % table
+        # New events are checked against the bound too, so the legacy partition also takes the next interval.
+        # Events are not refused when the conversion runs past the end of the current one.
+        bound = self.get_next_period_start(self.get_next_period_start(self.get_period_start(self.now())))
+
+        with connection.cursor() as cursor:
+            # Tables with pending deferred foreign key checks can not be altered
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        self.backfill_created_at(batch_size)
+
+        # Unique keys of a partitioned table must contain the partition key. Retried events keep their
+        # Mailgun timestamp as created_at, so (provider_id, created_at) still identifies an event.
+        # Matching indexes of the legacy table are used by the attach instead of building them under its lock.
+        self.build_unique_index("%s_part_pkey" % legacy_table, "id, created_at")
+        self.build_unique_index("%s_provider_id_part_key" % legacy_table, "provider_id, created_at")
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute("ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {legacy}_bound_check".format(
+                table=table, legacy=legacy_table))
+            cursor.execute("ALTER TABLE {table} ADD CONSTRAINT {legacy}_bound_check "
+                           "CHECK (created_at IS NOT NULL AND created_at < %s) NOT VALID"
+                           .format(table=table, legacy=legacy_table), [bound])
+
+        # Validation scans the table without blocking the writers. A valid check lets postgres set the column
+        # not null and attach the legacy table without scanning it again.
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE {table} VALIDATE CONSTRAINT {legacy}_bound_check".format(
+                table=table, legacy=legacy_table))
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+            sequence = cursor.fetchone()[0]
+
+            cursor.execute("ALTER TABLE {table} RENAME TO {legacy}".format(table=table, legacy=legacy_table))
+            cursor.execute("CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) "
+                           "PARTITION BY RANGE (created_at)".format(table=table, legacy=legacy_table))
+
+            # Sequence has to outlive the legacy partition
+            cursor.execute("ALTER SEQUENCE {sequence} OWNED BY {table}.id".format(sequence=sequence, table=table))
+
+            cursor.execute("ALTER TABLE {table} ADD CONSTRAINT {table}_part_pkey "
+                           "PRIMARY KEY (id, created_at)".format(table=table))
+            cursor.execute("ALTER TABLE {table} ADD CONSTRAINT {table}_provider_id_part_key "
+                           "UNIQUE (provider_id, created_at)".format(table=table))
+            cursor.execute("ALTER TABLE {table} ADD CONSTRAINT {table}_mail_id_part_fk FOREIGN KEY (mail_id) "
+                           "REFERENCES {mail_table} (id) DEFERRABLE INITIALLY DEFERRED"
+                           .format(table=table, mail_table=Mail._meta.db_table))
+            cursor.execute("CREATE INDEX {table}_mail_name_part_idx ON {table} (mail_id, name)".format(table=table))
+            cursor.execute("CREATE INDEX {table}_created_at_part_idx ON {table} (created_at)".format(table=table))
+
+            cursor.execute("ALTER TABLE {legacy} ALTER COLUMN created_at SET NOT NULL".format(legacy=legacy_table))
+
+            # Prebuilt indexes become the constraints of the partition, attach only picks them up
+            cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+                           [legacy_table])
+            cursor.execute("ALTER TABLE {legacy} DROP CONSTRAINT {pkey}".format(legacy=legacy_table,
+                                                                               pkey=cursor.fetchone()[0]))
+            cursor.execute("ALTER TABLE {legacy} ADD CONSTRAINT {legacy}_part_pkey "
+                           "PRIMARY KEY USING INDEX {legacy}_part_pkey".format(legacy=legacy_table))
+            cursor.execute("ALTER TABLE {legacy} ADD CONSTRAINT {legacy}_provider_id_part_key "
+                           "UNIQUE USING INDEX {legacy}_provider_id_part_key".format(legacy=legacy_table))
+            cursor.execute("ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO (%s)"
+                           .format(table=table, legacy=legacy_table), [bound])
+
+            cursor.execute("CREATE TABLE {table}_default PARTITION OF {table} DEFAULT".format(table=table))
+
+        self.create_partitions()
+
+        return True
+
+    def get_default_partition(self, partitions: list):
+        return next((partition for partition in partitions if partition.is_default), None)
+
+    def create_partition(self, name: str, start: datetime.datetime, end: datetime.datetime, default_partition=None):
+        """
+        Creates the partition of the range, returns the number of events which are moved to it from the default
+        partition
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            if default_partition is not None:
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= %s AND created_at < %s)"
+                               .format(default=default_partition.name), [start, end])
+
+                if not cursor.fetchone()[0]:
+                    default_partition = None
+
+            if default_partition is None:
+                cursor.execute("CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)"
+                               .format(name=name, table=self.table), [start, end])
+
+                return 0
+
+            # Events of the range which landed in the default partition, e.g. when the partition was created late,
+            # would fail the creation of the partition. They are moved while the default partition is detached,
+            # it only keeps the stray events, so it is small to move from and to attach again.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute("ALTER TABLE {table} DETACH PARTITION {default}".format(table=self.table,
+                                                                                 default=default_partition.name))
+            cursor.execute("CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)"
+                           .format(name=name, table=self.table), [start, end])
+            cursor.execute("""
+                WITH moved AS (
+                    DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """.format(default=default_partition.name, name=name), [start, end])
+
+            moved = cursor.rowcount
+
+            cursor.execute("ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT".format(
+                table=self.table, default=default_partition.name))
+
+        return moved
+
+    def create_partitions(self):
+        """
+        Creates the partitions of the current interval and the next ones, returns names of the created partitions.
+
+        Numbers of the events which are moved to the created partitions from the default partition are kept in
+        moved_events.
+        """
+        partitions = self.get_partitions()
+        default_partition = self.get_default_partition(partitions)
+        created = []
+
+        self.moved_events = {}
+
+        start = self.get_period_start(self.now())
+
+        for _ in range(self.partitions_ahead + 1):
+            end = self.get_next_period_start(start)
+
+            if not any(partition.overlaps(start, end) for partition in partitions):
+                name = self.get_partition_name(start)
+
+                moved = self.create_partition(name, start, end, default_partition)
+
+                if moved:
+                    self.moved_events[name] = moved
+
+                partitions.append(Partition(name, start, end))
+                created.append(name)
+
+            start = end
+
+        return created
+
+    def drop_expired_partitions(self):
+        """
+        Detaches and drops the partitions which end before the retention limit, returns their names
+        """
+        if not self.retention_days:
+            return []
+
+        limit = self.now() - datetime.timedelta(days=self.retention_days)
+        dropped = []
+
+        for partition in self.get_partitions():
+            if partition.is_default or partition.upper is None or partition.upper > limit:
+                continue
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                cursor.execute("ALTER TABLE {table} DETACH PARTITION {name}".format(table=self.table,
+                                                                                  name=partition.name))
+                cursor.execute("DROP TABLE {name}".format(name=partition.name))
+
+            dropped.append(partition.name)
+
+        with connection.cursor() as cursor:
+            # Default partition only keeps the stray events, it is small enough to delete from
+            cursor.execute("DELETE FROM {table}_default WHERE created_at < %s".format(table=self.table), [limit])
+
+        return dropped
@@ -0,0 +1,86 @@
+import time
+
+from django_rebel.api.constants import MAX_EVENTS_PAGE_SIZE
+from django_rebel.ingestion import EventIngestor
+from django_rebel.models import EventSyncCursor
+from django_rebel.settings import get_settings
+
+
+class EventReconciler:
+    """
+    Pulls the events api of a profile and writes the events which are missed by the webhooks.
+
+    Every run continues from the high-water mark of the previous run. Mailgun events become visible with a delay,
+    so the window starts a little before the mark and the duplicates are skipped by the ingestor.
+    """
+
+    DEFAULT_OVERLAP = 30 * 60
+    DEFAULT_LOOKBACK = 24 * 60 * 60
+    DEFAULT_BATCH_SIZE = 1000
+
+    def __init__(self, profile: str, overlap: int = None, batch_size: int = None):
+        reconciliation_settings = get_settings().get("RECONCILIATION", {})
+
+        self.profile = profile
+        self.overlap = overlap if overlap is not None else \
+            reconciliation_settings.get("OVERLAP", self.DEFAULT_OVERLAP)
+        self.lookback = reconciliation_settings.get("LOOKBACK", self.DEFAULT_LOOKBACK)
+        self.batch_size = batch_size or reconciliation_settings.get("BATCH_SIZE", self.DEFAULT_BATCH_SIZE)
+
+        self.ingestor = EventIngestor()
+
+    def mailgun(self):
+        from django_rebel.api.mailgun import Mailgun
+
+        return Mailgun(self.profile)
+
+    def get_begin(self, cursor: EventSyncCursor):
+        if cursor.timestamp is None:
+            return time.time() - self.lookback
+
+        return cursor.timestamp - self.overlap
+
+    def run(self, begin: float = None, end: float = None):
+        cursor, _ = EventSyncCursor.objects.get_or_create(profile=self.profile)
+
+        if begin is None:
+            begin = self.get_begin(cursor)
+
+        if end is None:
+            end = time.time()
+
+        items = self.mailgun().event.iterate(begin=begin, end=end, ascending=True, limit=MAX_EVENTS_PAGE_SIZE)
+
+        batch = []
+        high_water_mark = cursor.timestamp or 0
+
+        for item in items:
+            batch.append(item)
+
+            if len(batch) >= self.batch_size:
+                high_water_mark = self._ingest(cursor, batch, high_water_mark)
+                batch = []
+
+        if batch:
+            high_water_mark = self._ingest(cursor, batch, high_water_mark)
+
+        # Window is read completely, so quiet profiles do not read the same window again on every run.
+        # Events which become visible later are still in the overlap of the next run.
+        if end - self.overlap > high_water_mark:
+            self._move_cursor(cursor, end - self.overlap)
+
+        return self.ingestor.stats
+
+    def _ingest(self, cursor: EventSyncCursor, batch: list, high_water_mark: float):
+        self.ingestor.ingest(batch)
+
+        high_water_mark = max([high_water_mark] + [item.get("timestamp", 0) for item in batch])
+
+        # The mark is moved only after the batch is written, so an interrupted run continues from here
+        self._move_cursor(cursor, high_water_mark)
+
+        return high_water_mark
+
+    def _move_cursor(self, cursor: EventSyncCursor, timestamp: float):
+        cursor.timestamp = timestamp
+        cursor.save(update_fields=["timestamp", "updated_at"])
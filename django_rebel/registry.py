@@ -0,0 +1,226 @@
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction, DatabaseError
+
+from django_rebel.models import MailLabel
+from django_rebel.settings import get_settings
+
+DEFAULT_REGISTRY_SETTINGS = {
+    # Registries are loaded on the first use. Loading them when the app is ready queries the database in every
+    # process, management commands included.
+    "WARM_ON_READY": False,
+    # Rows are only kept in process when their changes reach the other processes, which needs a cache backend
+    # that is shared by them. None keeps the rows unless the default cache is local to the process.
+    "SHARED_CACHE": None,
+}
+
+
+def get_registry_settings():
+    registry_settings = dict(DEFAULT_REGISTRY_SETTINGS)
+    registry_settings.update(get_settings().get("REGISTRY", {}))
+
+    return registry_settings
+
+
+class Registry:
+    """
+    Process local mapping of rarely changing rows.
+
+    Changes are announced with a version key in the cache, so the registries of the other processes are
+    dropped too. Lookups only read the version from the cache, the database is not queried. Rows are only kept
+    after their transaction is committed, so a rolled back row is never kept.
+
+    Keys which are not kept are always looked up in the database, even when every row is loaded. A per process
+    cache does not announce the rows which are created by the other processes, and it does not drop the rows
+    which are deleted by them, so nothing is kept with it unless SHARED_CACHE is set.
+    """
+
+    version_key = None
+
+    def __init__(self):
+        self._entries = {}
+        self._complete = False
+        self._state = None
+        self._lock = threading.Lock()
+
+    def is_kept(self):
+        shared_cache = get_registry_settings()["SHARED_CACHE"]
+
+        if shared_cache is None:
+            return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+        return shared_cache
+
+    def get_state(self):
+        # Registry of another database, e.g. the one which is loaded before the test database is created
+        return connection.settings_dict["NAME"], cache.get(self.version_key)
+
+    def get_entries(self):
+        if not self.is_kept():
+            return {}
+
+        state = self.get_state()
+
+        with self._lock:
+            if state != self._state:
+                self._entries = {}
+                self._complete = False
+                self._state = state
+
+            return self._entries
+
+    def fetch(self, keys=None) -> dict:
+        raise NotImplementedError()
+
+    def store(self, entries: dict, complete=False):
+        if not self.is_kept():
+            return
+
+        state = self._state
+
+        def store():
+            with self._lock:
+                if state == self._state:
+                    self._entries.update(entries)
+                    self._complete = self._complete or complete
+
+        transaction.on_commit(store)
+
+    def load(self):
+        """
+        Loads every row, returns the entries
+        """
+        self.get_entries()
+
+        entries = self.fetch()
+
+        self.store(entries, complete=True)
+
+        return entries
+
+    def warm(self):
+        try:
+            self.load()
+        except DatabaseError:
+            # Tables are not migrated yet
+            pass
+
+    def get(self, key):
+        entries = self.get_entries()
+
+        if key in entries:
+            return entries[key]
+
+        entries = self.fetch([key])
+
+        self.store(entries)
+
+        return entries.get(key)
+
+    def all(self) -> dict:
+        entries = self.get_entries()
+
+        if self._complete and self.is_kept():
+            return dict(entries)
+
+        return self.load()
+
+    def invalidate(self):
+        """
+        Drops the registry of every process
+        """
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, None)
+
+        state = self.get_state()
+
+        with self._lock:
+            self._entries = {}
+            self._complete = False
+            self._state = state
+
+
+class LabelRegistry(Registry):
+    """
+    Slug -> (id, name) mapping of the mail labels
+    """
+    version_key = "rebel:registry:labels"
+
+    def fetch(self, keys=None):
+        labels = MailLabel.objects.order_by("-id")
+
+        if keys is not None:
+            labels = labels.filter(slug__in=keys)
+
+        # First label of a slug wins, like get_or_create
+        return {slug: (label_id, name) for slug, label_id, name in labels.values_list("slug", "id", "name")}
+
+    def get_id(self, slug: str):
+        label = self.get(slug)
+
+        return label[0] if label is not None else None
+
+    def get_or_create_id(self, slug: str, name: str = None):
+        label_id = self.get_id(slug)
+
+        if label_id is None:
+            label, _ = MailLabel.objects.get_or_create(slug=slug, defaults={"name": name or slug})
+            label_id = label.id
+
+            self.store({slug: (label.id, label.name)})
+
+        return label_id
+
+    def get_choices(self):
+        """
+        Returns (slug, name) of every label ordered by name
+        """
+        return sorted(((slug, name) for slug, (_, name) in self.all().items()), key=lambda choice: choice[1])
+
+
+class ContentTypeRegistry(Registry):
+    """
+    (app_label, model_name) -> content type id mapping
+    """
+    version_key = "rebel:registry:content_types"
+
+    def fetch(self, keys=None):
+        content_types = ContentType.objects.all()
+
+        if keys is not None:
+            content_types = content_types.filter(app_label__in=[app_label for app_label, _ in keys],
+                                                 model__in=[model for _, model in keys])
+
+        return {(app_label, model): content_type_id
+                for app_label, model, content_type_id in content_types.values_list("app_label", "model", "id")}
+
+    def get_id(self, model):
+        """
+        Returns the content type id of a model class or instance, proxy models have their own content type
+        """
+        opts = model._meta
+        key = (opts.app_label, opts.model_name)
+
+        content_type_id = self.get(key)
+
+        if content_type_id is None:
+            content_type_id = ContentType.objects.get_for_model(model, for_concrete_model=False).id
+
+            self.store({key: content_type_id})
+
+        return content_type_id
+
+
+label_registry = LabelRegistry()
+content_type_registry = ContentTypeRegistry()
+
+
+def warm_registries():
+    label_registry.warm()
+    content_type_registry.warm()
@@ -0,0 +1,206 @@
+import datetime
+import time
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from django_rebel.api.constants import EVENT_TYPES
+from django_rebel.models import Mail, MailContent, Event
+from django_rebel.settings import get_settings
+from django_rebel.storage import release_bodies
+
+DEFAULT_PURGE_SETTINGS = {
+    "CHUNK_SIZE": 5000,
+    # Seconds to wait between chunks, so replicas and autovacuum can keep up
+    "SLEEP": 0.1,
+}
+
+
+DEFAULT_EVENT_CAP_SETTINGS = {
+    # Opened and clicked events which are kept for every mail beyond the counters, None keeps every event
+    "MAX_EVENTS": None,
+    # Events are kept at least this many seconds, so retried and reconciled events are still skipped
+    "GRACE": 2 * 24 * 60 * 60,
+    "CHUNK_SIZE": 1000,
+}
+
+
+def get_event_cap_settings():
+    event_cap_settings = dict(DEFAULT_EVENT_CAP_SETTINGS)
+    event_cap_settings.update(get_settings().get("EVENT_CAP", {}))
+
+    return event_cap_settings
+
+
+def get_event_cap_limit():
+    """
+    Returns the time before which events may have been pruned, None if they are never pruned
+    """
+    event_cap_settings = get_event_cap_settings()
+
+    if event_cap_settings["MAX_EVENTS"] is None:
+        return None
+
+    return datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(seconds=event_cap_settings["GRACE"])
+
+
+def get_purge_settings():
+    purge_settings = dict(DEFAULT_PURGE_SETTINGS)
+    purge_settings.update(get_settings().get("PURGE", {}))
+
+    return purge_settings
+
+
+class MailPurger:
+    """
+    Deletes old mails with their events, contents and the bodies which are not shared anymore.
+
+    Mails are walked in (created_at, id) order and every chunk is deleted with one statement per table,
+    children first. Related rows are never loaded into Python and every chunk is a short transaction.
+    """
+
+    def __init__(self, before, label: str = None, profile: str = None, chunk_size: int = None,
+                 sleep: float = None, progress=None):
+        purge_settings = get_purge_settings()
+
+        self.before = before
+        self.label = label
+        self.profile = profile
+        self.chunk_size = chunk_size or purge_settings["CHUNK_SIZE"]
+        self.sleep = sleep if sleep is not None else purge_settings["SLEEP"]
+        self.progress = progress
+
+        self.stats = Counter()
+
+    def get_queryset(self):
+        mails = Mail.objects.filter(created_at__lt=self.before)
+
+        if self.label is not None:
+            mails = mails.filter(label__slug=self.label)
+
+        if self.profile is not None:
+            mails = mails.filter(profile=self.profile)
+
+        return mails
+
+    def get_chunk(self, last_key=None):
+        """
+        Returns (created_at, id) of the next chunk of mails after the last key
+        """
+        mails = self.get_queryset()
+
+        if last_key is not None:
+            created_at, mail_id = last_key
+
+            mails = mails.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=mail_id))
+
+        return list(mails.order_by("created_at", "id").values_list("created_at", "id")[:self.chunk_size])
+
+    def delete_chunk(self, mail_ids: list):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {table} WHERE mail_id = ANY(%s)".format(table=Event._meta.db_table),
+                           [mail_ids])
+            self.stats["events"] += cursor.rowcount
+
+            cursor.execute("DELETE FROM {table} WHERE mail_id = ANY(%s) RETURNING body_id"
+                           .format(table=MailContent._meta.db_table), [mail_ids])
+            body_ids = [body_id for body_id, in cursor.fetchall()]
+            self.stats["contents"] += len(body_ids)
+
+            cursor.execute("DELETE FROM {table} WHERE id = ANY(%s)".format(table=Mail._meta.db_table), [mail_ids])
+            self.stats["mails"] += cursor.rowcount
+
+            # Shared bodies are deleted with their last content
+            release_bodies(Counter(body_id for body_id in body_ids if body_id is not None))
+
+    def count(self):
+        return self.get_queryset().count()
+
+    def run(self):
+        last_key = None
+
+        while True:
+            chunk = self.get_chunk(last_key)
+
+            if not chunk:
+                return self.stats
+
+            self.delete_chunk([mail_id for _, mail_id in chunk])
+
+            self.stats["chunks"] += 1
+            last_key = chunk[-1]
+
+            if self.progress is not None:
+                self.progress(self.stats)
+
+            if len(chunk) < self.chunk_size:
+                return self.stats
+
+            if self.sleep:
+                time.sleep(self.sleep)
+
+
+class EventCapPruner:
+    """
+    Deletes opened and clicked events of a mail beyond the first MAX_EVENTS of each type.
+
+    Counters of the mail keep counting them. Events are deleted only after the grace period, because an event
+    which is deleted can not be recognized when it is delivered again.
+    """
+
+    CAPPED_EVENTS = (EVENT_TYPES.OPENED, EVENT_TYPES.CLICKED)
+
+    def __init__(self, max_events: int = None, grace: int = None, chunk_size: int = None):
+        event_cap_settings = get_event_cap_settings()
+
+        self.max_events = max_events if max_events is not None else event_cap_settings["MAX_EVENTS"]
+        self.grace = grace if grace is not None else event_cap_settings["GRACE"]
+        self.chunk_size = chunk_size or event_cap_settings["CHUNK_SIZE"]
+
+        self.stats = Counter()
+
+    def get_mail_ids(self, last_id: int):
+        return list(Mail.objects.filter(Q(open_count__gt=self.max_events) | Q(click_count__gt=self.max_events),
+                                        id__gt=last_id).order_by("id").values_list("id", flat=True)[:self.chunk_size])
+
+    def prune_chunk(self, mail_ids: list):
+        sql = """
+            DELETE FROM {event_table} WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, created_at,
+                           row_number() OVER (PARTITION BY mail_id, name ORDER BY created_at, id) AS position
+                    FROM {event_table}
+                    WHERE mail_id = ANY(%(mail_ids)s) AND name = ANY(%(names)s)
+                ) AS ranked_events
+                WHERE position > %(max_events)s AND created_at < %(limit)s
+            )
+        """.format(event_table=Event._meta.db_table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {
+                "mail_ids": mail_ids,
+                "names": list(self.CAPPED_EVENTS),
+                "max_events": self.max_events,
+                "limit": timezone.now() - timezone.timedelta(seconds=self.grace),
+            })
+
+            self.stats["events"] += cursor.rowcount
+
+    def run(self):
+        if self.max_events is None:
+            return self.stats
+
+        last_id = 0
+
+        while True:
+            mail_ids = self.get_mail_ids(last_id)
+
+            if not mail_ids:
+                return self.stats
+
+            self.prune_chunk(mail_ids)
+
+            self.stats["mails"] += len(mail_ids)
+            last_id = mail_ids[-1]
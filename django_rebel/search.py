@@ -0,0 +1,103 @@
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.utils.html import strip_tags
+
+from django_rebel.models import Mail, MailBody
+from django_rebel.settings import get_settings
+
+DEFAULT_SEARCH_SETTINGS = {
+    # Bodies are indexed for the full text search when they are stored
+    "FULL_TEXT": False,
+    # Text search configuration, "simple" does not stem, so every language is matched the same way
+    "CONFIG": "simple",
+    # Characters of the body text which are indexed, tsvector values are limited to 1MB
+    "MAX_LENGTH": 100000,
+    # "exact" matches whole addresses, "substring" parts of the addresses with the trigram indexes,
+    # "content" the subjects and bodies with the full text index, and whole addresses
+    "ADMIN_MODE": "exact",
+}
+
+ADMIN_SEARCH_FIELDS = {
+    "exact": ("email_from__exact", "email_to__exact"),
+    "substring": ("email_from__icontains", "email_to__icontains"),
+    "content": ("email_from__exact", "email_to__exact"),
+}
+
+# Subject is ranked above the body
+VECTOR_SQL = "setweight(to_tsvector(%s::regconfig, COALESCE(%s, '')), 'A') || " \
+             "setweight(to_tsvector(%s::regconfig, %s), 'B')"
+
+
+def get_search_settings():
+    search_settings = dict(DEFAULT_SEARCH_SETTINGS)
+    search_settings.update(get_settings().get("SEARCH", {}))
+
+    return search_settings
+
+
+def get_search_text(body: dict) -> str:
+    """
+    Returns the text of the body which is indexed, html is only used when there is no text body
+    """
+    max_length = get_search_settings()["MAX_LENGTH"]
+
+    text = body.get("body_text") or body.get("body_plain")
+
+    if not text:
+        # Html is cut before its tags are stripped, so large bodies are not parsed as a whole
+        html = (body.get("body_html") or "")[:max_length]
+
+        # Tag which is cut in the middle would be indexed as text
+        if html.rfind("<") > html.rfind(">"):
+            html = html[:html.rfind("<")]
+
+        text = strip_tags(html)
+
+    return text[:max_length]
+
+
+def get_vector_params(body: dict) -> list:
+    config = get_search_settings()["CONFIG"]
+
+    return [config, body.get("subject"), config, get_search_text(body)]
+
+
+def index_bodies(bodies: dict):
+    """
+    Writes the search vectors of body id -> body mapping
+    """
+    if not bodies:
+        return
+
+    body_ids = sorted(bodies.keys())
+
+    sql = """
+        UPDATE {body_table} SET search_vector = {vector}
+        FROM (VALUES {rows}) AS bodies (id, subject, text)
+        WHERE {body_table}.id = bodies.id
+    """.format(
+        body_table=MailBody._meta.db_table,
+        vector=VECTOR_SQL % ("%s", "bodies.subject", "%s", "bodies.text"),
+        rows=", ".join(["(%s::integer, %s::text, %s::text)"] * len(body_ids)),
+    )
+
+    config = get_search_settings()["CONFIG"]
+    params = [config, config]
+
+    for body_id in body_ids:
+        params.extend([body_id, bodies[body_id].get("subject"), get_search_text(bodies[body_id])])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def search_mails(query: str, queryset=None):
+    """
+    Mails whose subject or body matches the web search syntax query, e.g. `invoice -draft "due date"`
+    """
+    if queryset is None:
+        queryset = Mail.objects.all()
+
+    search_query = SearchQuery(query, config=get_search_settings()["CONFIG"], search_type="websearch")
+
+    return queryset.filter(content__body__search_vector=search_query)
@@ -1,16 +1,24 @@
 import logging
+from collections import defaultdict, deque
 
+from asgiref.sync import sync_to_async
 from premailer import Premailer
 from requests.exceptions import ConnectionError
 
+from django_rebel.api.constants import MAX_BATCH_RECIPIENTS
 from django_rebel.exceptions import RebelAPIError, RebelConnectionError
-from django_rebel.models import MailOwner, Mail, MailLabel
+from django_rebel.models import MailOwner, Mail
+from django_rebel.registry import label_registry, content_type_registry
+from django_rebel.settings import get_settings
+from django_rebel.stats import add_daily_stats
+from django_rebel.storage import get_body_digest, save_contents, storing_bodies
 
 
 class PreparedMail:
     def __init__(self, subject: str, profile: str = "DEFAULT", from_address: str = None, to_mode: str = "to",
                  batch_mode: bool = True, label: str = None, tags: list = None, text=None, html=None,
-                 variables: dict = None, inlines: list = None, attachments: list = None):
+                 variables: dict = None, inlines: list = None, attachments: list = None, chunk_size: int = None,
+                 store_content: bool = None):
         self.profile = profile
 
         # Sender Options
@@ -18,6 +26,9 @@ class PreparedMail:
         self.batch_mode = batch_mode
         self.label = label
         self.tags = tags
+        self.chunk_size = chunk_size
+        self.store_content = store_content if store_content is not None else \
+            get_settings().get("STORE_CONTENT", False)
         self.from_address = from_address or self.mailgun().profile_settings['EMAIL']
 
         self.receivers = []
@@ -46,6 +57,11 @@ class PreparedMail:
 
         return Mailgun(self.profile)
 
+    def amailgun(self):
+        from django_rebel.api.mailgun import AsyncMailgun
+
+        return AsyncMailgun(self.profile)
+
     def add_receiver(self, owner: MailOwner = None, email_to: str = None):
         assert owner is not None or email_to is not None, "owner or email_to is required"
 
@@ -62,7 +78,17 @@ class PreparedMail:
     def receiver_emails(self):
         return [receiver['email_to'] for receiver in self.receivers]
 
-    def send(self, fail_silently=True, **kwargs):
+    def get_chunk_size(self):
+        if self.chunk_size is not None:
+            return self.chunk_size
+
+        return self.mailgun().settings.get("BATCH", {}).get("CHUNK_SIZE", MAX_BATCH_RECIPIENTS)
+
+    def is_chunked(self):
+        # Receivers can be split into several calls only when they do not see each other
+        return self.batch_mode and len(self.receivers) > self.get_chunk_size()
+
+    def get_send_kwargs(self, **kwargs):
         if self.batch_mode:
             # This is little tricky method for forcing to send mail as batch
             if self.variables is None:
@@ -83,6 +109,18 @@ class PreparedMail:
             }
         )
 
+        return kwargs
+
+    def send(self, fail_silently=True, **kwargs):
+        kwargs = self.get_send_kwargs(**kwargs)
+
+        if self.is_chunked():
+            response = self.mailgun().message.send_chunked(chunk_size=self.get_chunk_size(), **kwargs)
+
+            sent_mails = self._save_chunked_mails(response.message_ids())
+
+            return self._get_chunked_result(sent_mails, response.errors, fail_silently)
+
         try:
             sent_mail_response = self.mailgun().message.send(**kwargs)
         except RebelAPIError as e:
@@ -97,26 +135,107 @@ class PreparedMail:
 
             return sent_mails, True
 
-    def _save_mails(self, message_id):
-        mails = []
+    async def asend(self, fail_silently=True, **kwargs):
+        kwargs = self.get_send_kwargs(**kwargs)
+
+        if self.is_chunked():
+            response = await self.amailgun().message.send_chunked(chunk_size=self.get_chunk_size(), **kwargs)
+
+            sent_mails = await sync_to_async(self._save_chunked_mails)(response.message_ids())
+
+            return self._get_chunked_result(sent_mails, response.errors, fail_silently)
+
+        try:
+            sent_mail_response = await self.amailgun().message.send(**kwargs)
+        except RebelAPIError as e:
+            if fail_silently:
+                return [], False
 
-        if self.label:
-            label, _ = MailLabel.objects.get_or_create(slug=self.label, defaults={"name": self.label})
+            raise e
+        except ConnectionError:
+            raise RebelConnectionError()
         else:
-            label = None
+            sent_mails = await sync_to_async(self._save_mails)(sent_mail_response.message_id())
+
+            return sent_mails, True
+
+    def _get_chunked_result(self, sent_mails: list, errors: list, fail_silently: bool):
+        if not errors:
+            return sent_mails, True
+
+        # Mails of the successful chunks are already saved at this point
+        for error in errors:
+            if isinstance(error, ConnectionError):
+                raise RebelConnectionError()
+
+        if fail_silently:
+            return sent_mails, False
+
+        raise errors[0]
+
+    def _save_mails(self, message_id):
+        return self._create_mails([(message_id, receiver) for receiver in self.receivers])
+
+    def _save_chunked_mails(self, message_ids: dict):
+        """
+        Saves mails of a chunked send, message_ids is the message-id -> sent emails mapping of the chunks
+        """
+        receivers_by_email = defaultdict(deque)
 
         for receiver in self.receivers:
+            receivers_by_email[receiver["email_to"]].append(receiver)
+
+        sent_receivers = []
+
+        for message_id, emails in message_ids.items():
+            for email in emails:
+                if receivers_by_email[email]:
+                    sent_receivers.append((message_id, receivers_by_email[email].popleft()))
+
+        return self._create_mails(sent_receivers)
+
+    def _create_mails(self, sent_receivers: list):
+        mails = []
+
+        # Labels and content types are resolved in process, sending does not look them up
+        label_id = label_registry.get_or_create_id(self.label) if self.label else None
+
+        for message_id, receiver in sent_receivers:
             mail = Mail(email_from=self.from_address,
                         email_to=receiver["email_to"],
                         message_id=message_id,
                         profile=self.profile,
-                        label=label,
+                        label_id=label_id,
                         tags=self.tags)
 
-            mail.owner_object = receiver["owner"]
+            owner = receiver["owner"]
+
+            if owner is not None:
+                mail.owner_type_id = content_type_registry.get_id(owner)
+                mail.owner_id = owner.pk
+                Mail.owner_object.set_cached_value(mail, owner)
 
             mails.append(mail)
 
-        created_mails = Mail.objects.bulk_create(mails)
+        # Every recipient shares the same body, which is the content before recipient variables
+        body = self.get_content_body() if self.store_content else None
+        bodies = {get_body_digest(body): body} if body is not None else {}
+
+        # Blobs of the body are written before the mails are inserted and deleted if they are rolled back
+        with storing_bodies(bodies) as blobs:
+            created_mails = Mail.objects.bulk_create(mails)
+
+            add_daily_stats({mail.id: {"sent"} for mail in created_mails})
+
+            if body is not None:
+                save_contents([(mail.id, body) for mail in created_mails], blobs)
 
         return created_mails
+
+    def get_content_body(self):
+        return {
+            "subject": self.subject,
+            "body_text": self.text,
+            "body_html": self.html,
+            "body_plain": None,
+        }
@@ -0,0 +1,25 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from django_rebel.models import MailContent, MailLabel
+from django_rebel.registry import label_registry, content_type_registry
+from django_rebel.storage import release_bodies
+
+
+@receiver(post_delete, sender=MailContent)
+def release_content_body(sender, instance: MailContent, **kwargs):
+    if instance.body_id is not None:
+        release_bodies({instance.body_id: 1})
+
+
+@receiver(post_save, sender=MailLabel)
+@receiver(post_delete, sender=MailLabel)
+def invalidate_label_registry(sender, **kwargs):
+    label_registry.invalidate()
+
+
+@receiver(post_save, sender=ContentType)
+@receiver(post_delete, sender=ContentType)
+def invalidate_content_type_registry(sender, **kwargs):
+    content_type_registry.invalidate()
@@ -0,0 +1,196 @@
+import datetime
+
+from django.db import connection, transaction
+
+from django_rebel.models import Mail, MailDailyStat, MailDailyStatDelta
+
+# Rollup metric -> status flag of the mail, a mail is counted once when its flag is set
+STAT_STATUS_FIELDS = {
+    "delivered": "has_delivered",
+    "opened": "has_opened",
+    "clicked": "has_clicked",
+    # Bounces
+    "failed": "has_failed",
+    "complained": "has_complained",
+}
+
+STAT_METRICS = ("sent",) + tuple(STAT_STATUS_FIELDS.keys())
+
+STAT_METRICS_BY_STATUS_FIELD = {field_name: metric for metric, field_name in STAT_STATUS_FIELDS.items()}
+
+# Every mail is counted in the row of its label and profile with an empty tag, and once more in the row of every tag
+STAT_ROWS_SQL = """
+    SELECT (mail.created_at AT TIME ZONE 'UTC')::date AS day, mail.label_id, mail.profile, tags.tag,
+           {counts}
+    FROM {source}
+    CROSS JOIN LATERAL (SELECT DISTINCT unnest(ARRAY['']::varchar[] || COALESCE(mail.tags, '{{}}')) AS tag) AS tags
+    WHERE {where}
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+"""
+
+UPSERT_SQL = """
+    {with_sql}
+    INSERT INTO {stat_table} (day, label_id, profile, tag, {metrics}, updated_at)
+    SELECT stat_rows.*, now() FROM ({rows}) AS stat_rows
+    ON CONFLICT (day, (COALESCE(label_id, 0)), profile, tag) DO UPDATE SET {assignments}, updated_at = now()
+"""
+
+# Range on created_at keeps the index usable
+DAY_WHERE_SQL = "mail.created_at >= (%(day)s::date)::timestamp AT TIME ZONE 'UTC' " \
+                "AND mail.created_at < (%(day)s::date + 1)::timestamp AT TIME ZONE 'UTC'"
+
+
+# Rollup and rebuild of the stat rows are serialized, so a rebuilt day never loses or repeats a delta
+LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('django_rebel.daily_stats'))"
+
+
+def get_stat_status_metric(field_name: str):
+    return STAT_METRICS_BY_STATUS_FIELD.get(field_name)
+
+
+def _lock():
+    with connection.cursor() as cursor:
+        cursor.execute(LOCK_SQL)
+
+
+def _upsert(rows_sql: str, params, replace=False, with_sql=""):
+    stat_table = MailDailyStat._meta.db_table
+
+    if replace:
+        assignments = ["{metric} = EXCLUDED.{metric}".format(metric=metric) for metric in STAT_METRICS]
+    else:
+        assignments = ["{metric} = {stat_table}.{metric} + EXCLUDED.{metric}".format(metric=metric,
+                                                                                    stat_table=stat_table)
+                       for metric in STAT_METRICS]
+
+    sql = UPSERT_SQL.format(stat_table=stat_table, metrics=", ".join(STAT_METRICS), rows=rows_sql,
+                            assignments=", ".join(assignments), with_sql=with_sql)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+        return cursor.rowcount
+
+
+def add_daily_stats(changes: dict):
+    """
+    Appends mail id -> metrics changes as deltas of the rollup, e.g. {1: {"sent"}, 2: {"opened", "clicked"}}.
+
+    Callers only pass the changes which happened in their transaction, e.g. the flags which were set
+    by it, so the rollup is never counted twice. Deltas are only inserted, so the transactions of the sending
+    and the event ingestion do not wait for each other on the stat rows.
+    """
+    changes = {mail_id: metrics for mail_id, metrics in changes.items() if metrics}
+
+    if not changes:
+        return
+
+    mail_ids = sorted(changes.keys())
+
+    rows = ["(%s)" % ", ".join(["%s::integer"] + ["%s::boolean"] * len(STAT_METRICS))] * len(mail_ids)
+    params = [value for mail_id in mail_ids
+              for value in [mail_id] + [metric in changes[mail_id] for metric in STAT_METRICS]]
+
+    rows_sql = STAT_ROWS_SQL.format(
+        counts=", ".join("count(*) FILTER (WHERE changes.{metric})".format(metric=metric) for metric in STAT_METRICS),
+        source="(VALUES {rows}) AS changes (id, {metrics}) JOIN {mail_table} AS mail ON mail.id = changes.id".format(
+            rows=", ".join(rows), metrics=", ".join(STAT_METRICS), mail_table=Mail._meta.db_table),
+        where="mail.created_at IS NOT NULL",
+    )
+
+    sql = """
+        INSERT INTO {delta_table} (day, label_id, profile, tag, {metrics}, created_at)
+        SELECT delta_rows.*, now() FROM ({rows}) AS delta_rows
+    """.format(delta_table=MailDailyStatDelta._meta.db_table, metrics=", ".join(STAT_METRICS), rows=rows_sql)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def rollup_daily_stats(batch_size: int = 10000):
+    """
+    Sums the oldest deltas into the rollup and deletes them, returns the number of stat rows written
+    """
+    rows_sql = """
+        SELECT day, label_id, profile, tag, {sums} FROM moved GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+    """.format(sums=", ".join("sum({metric})".format(metric=metric) for metric in STAT_METRICS))
+
+    with_sql = """
+        WITH moved AS (
+            DELETE FROM {delta_table}
+            WHERE id IN (SELECT id FROM {delta_table} ORDER BY id LIMIT %(limit)s)
+            RETURNING day, label_id, profile, tag, {metrics}
+        )
+    """.format(delta_table=MailDailyStatDelta._meta.db_table, metrics=", ".join(STAT_METRICS))
+
+    with transaction.atomic():
+        _lock()
+
+        return _upsert(rows_sql, {"limit": batch_size}, with_sql=with_sql)
+
+
+def is_purged(day: datetime.date) -> bool:
+    """
+    Returns whether the rollup of the day counts more mails than there are, e.g. when they are purged
+    """
+    # Rows without a tag count every mail once
+    sql = """
+        SELECT COALESCE((SELECT sum(sent) FROM {stat_table} WHERE day = %(day)s AND tag = ''), 0) +
+               COALESCE((SELECT sum(sent) FROM {delta_table} WHERE day = %(day)s AND tag = ''), 0) >
+               (SELECT count(*) FROM {mail_table} AS mail WHERE {where})
+    """.format(stat_table=MailDailyStat._meta.db_table, delta_table=MailDailyStatDelta._meta.db_table,
+               mail_table=Mail._meta.db_table, where=DAY_WHERE_SQL)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"day": day})
+
+        return cursor.fetchone()[0]
+
+
+def rebuild_daily_stats(day: datetime.date, force=False):
+    """
+    Recalculates the rollup of a day from the mails, returns the number of rows written, or None if the day
+    is skipped.
+
+    Pending deltas of the day are dropped by the same statement which reads the mails, so the changes
+    which are committed before it are counted once by the mails and the later ones by their deltas.
+    Days whose mails are purged are skipped unless forced, their stats would be lost.
+    """
+    counts = ["count(*)"] + ["count(*) FILTER (WHERE mail.{field})".format(field=STAT_STATUS_FIELDS[metric])
+                             for metric in STAT_METRICS[1:]]
+
+    rows_sql = STAT_ROWS_SQL.format(
+        counts=", ".join(counts),
+        source="{mail_table} AS mail".format(mail_table=Mail._meta.db_table),
+        where=DAY_WHERE_SQL,
+    )
+
+    with_sql = "WITH dropped AS (DELETE FROM {delta_table} WHERE day = %(day)s)".format(
+        delta_table=MailDailyStatDelta._meta.db_table)
+
+    with transaction.atomic():
+        _lock()
+
+        if not force and is_purged(day):
+            return None
+
+        MailDailyStat.objects.filter(day=day).delete()
+
+        return _upsert(rows_sql, {"day": day}, replace=True, with_sql=with_sql)
+
+
+def get_mail_days():
+    """
+    Returns the first and the last day of the mails, or None if there is no mail
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT (min(created_at) AT TIME ZONE 'UTC')::date, (max(created_at) AT TIME ZONE 'UTC')::date "
+                       "FROM {mail_table}".format(mail_table=Mail._meta.db_table))
+
+        first_day, last_day = cursor.fetchone()
+
+    if first_day is None:
+        return None
+
+    return first_day, last_day
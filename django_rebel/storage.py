@@ -0,0 +1,494 @@
+import hashlib
+import logging
+import time
+from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from django.db import connection, transaction
+from django.utils import timezone
+
+from django_rebel.blobstore import get_blob_store
+from django_rebel.fields import compress
+from django_rebel.models import Mail, MailBody, MailContent
+from django_rebel.search import VECTOR_SQL, get_search_settings, get_vector_params
+from django_rebel.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORAGE_SETTINGS = {
+    # Mailgun keeps stored messages for 3 days
+    "RETENTION": 3 * 24 * 60 * 60,
+    "WORKERS": 8,
+    "BATCH_SIZE": 500,
+    "MAX_RETRIES": 3,
+}
+
+
+def get_storage_settings():
+    storage_settings = dict(DEFAULT_STORAGE_SETTINGS)
+    storage_settings.update(get_settings().get("STORAGE", {}))
+
+    return storage_settings
+
+
+BODY_FIELDS = ("subject", "body_text", "body_html", "body_plain")
+
+
+def get_body_from_storage(storage_data: dict) -> dict:
+    return {
+        "subject": storage_data.get("subject"),
+        "body_text": storage_data.get("stripped-text"),
+        "body_html": storage_data.get("stripped-html"),
+        "body_plain": storage_data.get("body-plain"),
+    }
+
+
+def get_body_digest(body: dict) -> str:
+    digest = hashlib.sha256()
+
+    for field_name in BODY_FIELDS:
+        value = body.get(field_name)
+
+        if value is None:
+            digest.update(b"-")
+            continue
+
+        # Length prefix keeps the boundaries of the values apart
+        data = value.encode("utf-8")
+        digest.update(b"%d:" % len(data))
+        digest.update(data)
+
+    return digest.hexdigest()
+
+
+def put_body_blobs(body: dict, blob_store) -> list:
+    """
+    Writes the body columns to the blob store, returns their pointers
+    """
+    return [None if body.get(field_name) is None else blob_store.put(compress(body.get(field_name)))
+            for field_name in MailBody.BODY_FIELDS]
+
+
+def put_blobs(bodies: dict) -> dict:
+    """
+    Writes the blobs of the digest -> body mapping which are not stored yet, returns digest -> pointers mapping
+    """
+    blob_store = get_blob_store()
+
+    if blob_store is None:
+        return {}
+
+    stored_digests = set(MailBody.objects.filter(digest__in=bodies.keys()).values_list("digest", flat=True))
+
+    return {digest: put_body_blobs(body, blob_store) for digest, body in bodies.items()
+            if digest not in stored_digests}
+
+
+def delete_blobs(blobs: dict):
+    blob_store = get_blob_store()
+
+    for pointers in blobs.values():
+        for pointer in pointers:
+            if pointer is not None:
+                blob_store.delete(pointer)
+
+
+@contextmanager
+def storing_bodies(bodies: dict):
+    """
+    Writes the blobs of the digest -> body mapping before the transaction which stores the bodies, so the
+    transaction does not wait for the blob store, and yields them for store_bodies.
+
+    Blobs are deleted when the transaction is rolled back, so the block should be the outermost transaction which
+    stores the bodies. Blobs of an outer transaction which is rolled back later are left behind.
+    """
+    blobs = put_blobs(bodies) if bodies else {}
+
+    try:
+        with transaction.atomic():
+            yield blobs
+    except BaseException:
+        delete_blobs(blobs)
+        raise
+
+
+def encode_body(body: dict, pointers: list = None) -> list:
+    """
+    Returns the database values of the body columns and their pointers, columns which have a pointer are kept
+    in the blob store
+    """
+    pointers = pointers or [None] * len(MailBody.BODY_FIELDS)
+    values = [body.get("subject")]
+
+    for field_name, pointer in zip(MailBody.BODY_FIELDS, pointers):
+        field = MailBody._meta.get_field(field_name)
+
+        values.append(None if pointer is not None else field.get_db_prep_save(body.get(field_name), connection))
+
+    return values + pointers
+
+
+def store_bodies(bodies: dict, blobs: dict = None) -> dict:
+    """
+    Inserts the bodies of digest -> body mapping which are not stored yet, returns digest -> body id mapping.
+
+    Blobs of digest -> pointers mapping of storing_bodies are used for the new bodies, the others are deleted once
+    the transaction is committed. Stored bodies are locked until the end of the transaction, so they are not
+    released in the meantime.
+    """
+    if not bodies:
+        return {}
+
+    blobs = {} if blobs is None else blobs
+    inserted_digests = set()
+
+    # Rows are locked in the same order by every writer
+    body_ids = dict(MailBody.objects.select_for_update().filter(digest__in=bodies.keys())
+                    .order_by("digest").values_list("digest", "id"))
+
+    new_digests = sorted(digest for digest in bodies.keys() if digest not in body_ids)
+
+    if new_digests:
+        blob_store = get_blob_store()
+        # Vectors are built from the plain bodies, so blobs and compressed bodies are not read again
+        full_text = get_search_settings()["FULL_TEXT"]
+
+        rows = []
+        params = []
+
+        for digest in new_digests:
+            if blob_store is not None and digest not in blobs:
+                # Body is released since its blobs were checked
+                blobs[digest] = put_body_blobs(bodies[digest], blob_store)
+
+            rows.append("(%s, %s, %s, %s, %s, %s, %s, %s, {vector}, 0, now(), now())".format(
+                vector=VECTOR_SQL if full_text else "NULL"))
+            params.append(digest)
+            params.extend(encode_body(bodies[digest], blobs.get(digest)))
+
+            if full_text:
+                params.extend(get_vector_params(bodies[digest]))
+
+        # Body which is inserted by a concurrent writer is updated, so its id is returned too.
+        # xmax of the inserted rows is 0.
+        sql = """
+            INSERT INTO {body_table} (digest, subject, body_text, body_html, body_plain,
+                                      body_text_pointer, body_html_pointer, body_plain_pointer,
+                                      search_vector, ref_count, created_at, updated_at)
+            VALUES {rows}
+            ON CONFLICT (digest) DO UPDATE SET updated_at = EXCLUDED.updated_at
+            RETURNING digest, id, xmax = 0
+        """.format(body_table=MailBody._meta.db_table, rows=", ".join(rows))
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+            for digest, body_id, inserted in cursor.fetchall():
+                body_ids[digest] = body_id
+
+                if inserted:
+                    inserted_digests.add(digest)
+
+    unused_blobs = {digest: pointers for digest, pointers in blobs.items() if digest not in inserted_digests}
+
+    if unused_blobs:
+        transaction.on_commit(lambda: delete_blobs(unused_blobs))
+
+    return body_ids
+
+
+def change_ref_counts(ref_counts: dict):
+    """
+    Adds body id -> delta mapping to the reference counts of the bodies
+    """
+    ref_counts = {body_id: delta for body_id, delta in ref_counts.items() if delta}
+
+    if not ref_counts:
+        return
+
+    body_ids = sorted(ref_counts.keys())
+
+    sql = """
+        UPDATE {body_table} SET ref_count = {body_table}.ref_count + changes.delta
+        FROM (VALUES {rows}) AS changes (id, delta)
+        WHERE {body_table}.id = changes.id
+    """.format(body_table=MailBody._meta.db_table, rows=", ".join(["(%s::integer, %s::integer)"] * len(body_ids)))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for body_id in body_ids for value in (body_id, ref_counts[body_id])])
+
+
+def release_bodies(ref_counts: dict):
+    """
+    Drops body id -> count references and deletes the bodies which are not used anymore
+    """
+    change_ref_counts({body_id: -count for body_id, count in ref_counts.items()})
+
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            DELETE FROM {body_table} WHERE id = ANY(%s) AND ref_count = 0
+            RETURNING body_text_pointer, body_html_pointer, body_plain_pointer
+        """.format(body_table=MailBody._meta.db_table), [list(ref_counts.keys())])
+
+        pointers = [pointer for row in cursor.fetchall() for pointer in row if pointer is not None]
+
+    if pointers:
+        blob_store = get_blob_store()
+
+        # Blobs are kept if the transaction is rolled back
+        transaction.on_commit(lambda: [blob_store.delete(pointer) for pointer in pointers])
+
+
+def save_contents(contents: list, blobs: dict = None) -> int:
+    """
+    Saves (mail_id, body) contents, identical bodies are stored once. Returns the number of saved contents,
+    mails which already have a content are skipped.
+
+    Callers which save the contents in their own transaction open it with storing_bodies and pass its blobs.
+    """
+    if not contents:
+        return 0
+
+    bodies = {get_body_digest(body): body for _, body in contents}
+
+    if blobs is None:
+        with storing_bodies(bodies) as blobs:
+            return _save_contents(contents, bodies, blobs)
+
+    with transaction.atomic():
+        return _save_contents(contents, bodies, blobs)
+
+
+def _save_contents(contents: list, bodies: dict, blobs: dict) -> int:
+    body_ids = store_bodies(bodies, blobs)
+
+    rows = []
+    params = []
+
+    for mail_id, body in contents:
+        rows.append("(%s, %s, %s, now(), now())")
+        params.extend([mail_id, body.get("subject"), body_ids[get_body_digest(body)]])
+
+    sql = """
+        INSERT INTO {content_table} (mail_id, subject, body_id, created_at, updated_at)
+        VALUES {rows}
+        ON CONFLICT (mail_id) DO NOTHING
+        RETURNING body_id
+    """.format(content_table=MailContent._meta.db_table, rows=", ".join(rows))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+        saved_body_ids = [body_id for body_id, in cursor.fetchall()]
+
+    # Only the contents which are inserted hold a reference
+    change_ref_counts(Counter(saved_body_ids))
+
+    return len(saved_body_ids)
+
+
+def get_legacy_content_columns() -> list:
+    """
+    Body fields of the contents which still have their legacy text column, the columns are dropped by
+    rebel_compress_content --drop-legacy once every body is moved
+    """
+    table = MailContent._meta.db_table
+
+    with connection.cursor() as cursor:
+        columns = set(column.name for column in connection.introspection.get_table_description(cursor, table))
+
+    return [field_name for field_name in MailBody.BODY_FIELDS if "%s_legacy" % field_name in columns]
+
+
+def has_legacy_content_bodies() -> bool:
+    field_names = get_legacy_content_columns()
+
+    if not field_names:
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM {table} WHERE {has_legacy})".format(
+            table=MailContent._meta.db_table,
+            has_legacy=" OR ".join("{field}_legacy IS NOT NULL".format(field=field_name)
+                                   for field_name in field_names),
+        ))
+
+        return cursor.fetchone()[0]
+
+
+def get_content_bodies(contents) -> dict:
+    return {content.id: dict({"subject": content.subject},
+                             **{field_name: content.get_body(field_name) for field_name in MailBody.BODY_FIELDS})
+            for content in contents}
+
+
+def move_inline_contents(content_ids: list) -> int:
+    """
+    Moves the bodies of the contents which keep them inline into the shared bodies, returns the number of moved
+    contents
+    """
+    # Bodies are read before the transaction too, so their blobs are written out of it
+    bodies = get_content_bodies(MailContent.objects.filter(id__in=content_ids, body__isnull=True))
+
+    if not bodies:
+        return 0
+
+    with storing_bodies({get_body_digest(body): body for body in bodies.values()}) as blobs:
+        contents = list(MailContent.objects.select_for_update().filter(id__in=content_ids, body__isnull=True)
+                        .order_by("id"))
+
+        if not contents:
+            # Contents are moved by another run since they were read
+            delete_blobs(blobs)
+
+            return 0
+
+        bodies = get_content_bodies(contents)
+
+        body_ids = store_bodies({get_body_digest(body): body for body in bodies.values()}, blobs)
+        content_body_ids = {content_id: body_ids[get_body_digest(body)] for content_id, body in bodies.items()}
+
+        sql = """
+            UPDATE {content_table} SET body_id = moved.body_id, body_text = NULL, body_html = NULL,
+                                       body_plain = NULL, updated_at = now()
+            FROM (VALUES {rows}) AS moved (id, body_id)
+            WHERE {content_table}.id = moved.id
+        """.format(content_table=MailContent._meta.db_table,
+                   rows=", ".join(["(%s::integer, %s::integer)"] * len(content_body_ids)))
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for item in sorted(content_body_ids.items()) for value in item])
+
+        change_ref_counts(Counter(content_body_ids.values()))
+
+    return len(contents)
+
+
+class StorageFetcher:
+    """
+    Downloads stored messages of the mails which have a storage url but no content yet.
+
+    The oldest mails are fetched first, so they are saved before Mailgun drops them. Mails which share
+    a storage url are fetched once.
+    """
+
+    # Messages which are expired or deleted at Mailgun, requesting them again would fail the same way
+    GONE_STATUS_CODES = (404, 410)
+
+    def __init__(self, workers: int = None, batch_size: int = None):
+        storage_settings = get_storage_settings()
+
+        self.workers = workers or storage_settings["WORKERS"]
+        self.batch_size = batch_size or storage_settings["BATCH_SIZE"]
+        self.retention = storage_settings["RETENTION"]
+        self.max_retries = storage_settings["MAX_RETRIES"]
+
+        self.stats = Counter()
+
+    def get_pending_mails(self):
+        retention_limit = timezone.now() - timezone.timedelta(seconds=self.retention)
+
+        return Mail.objects.filter(storage_url__isnull=False, content__isnull=True,
+                                   created_at__gte=retention_limit).order_by("created_at", "id")
+
+    def fetch(self, profile: str, storage_url: str):
+        from django_rebel.api.mailgun import Mailgun
+
+        client = Mailgun(profile).client()
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                # Rate limits and server errors are already retried by the client
+                response = client.send(client.prepare_url_request(storage_url))
+            except requests.RequestException:
+                if attempt == self.max_retries:
+                    raise
+
+                time.sleep(2 ** attempt)
+                continue
+
+            response.raise_for_status()
+
+            return response.json()
+
+    def _fetch_safely(self, key):
+        """
+        Returns (key, storage data, whether the message is gone from the storage)
+        """
+        profile, storage_url = key
+
+        try:
+            return key, self.fetch(profile, storage_url), False
+        except requests.HTTPError as e:
+            logger.warning("Storage of %s could not be fetched: %s", storage_url, e)
+
+            return key, None, e.response is not None and e.response.status_code in self.GONE_STATUS_CODES
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("Storage of %s could not be fetched: %s", storage_url, e)
+
+            return key, None, False
+
+    def forget_storage_urls(self, storage_urls: dict):
+        """
+        Clears storage url -> mail ids of the messages which are gone, so they are not requested again
+        """
+        for storage_url, mail_ids in storage_urls.items():
+            Mail.objects.filter(id__in=mail_ids, storage_url=storage_url).update(storage_url=None)
+
+    def fetch_batch(self, exclude_ids=None):
+        """
+        Fetches a batch of pending mails, returns ids of the mails which could not be fetched
+        """
+        pending_mails = self.get_pending_mails()
+
+        if exclude_ids:
+            pending_mails = pending_mails.exclude(id__in=exclude_ids)
+
+        mails = list(pending_mails.values_list("id", "profile", "storage_url")[:self.batch_size])
+
+        mail_ids_by_key = defaultdict(list)
+
+        for mail_id, profile, storage_url in mails:
+            mail_ids_by_key[(profile, storage_url)].append(mail_id)
+
+        contents = []
+        failed_ids = []
+        gone_urls = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for key, storage_data, is_gone in executor.map(self._fetch_safely, mail_ids_by_key.keys()):
+                if is_gone:
+                    gone_urls[key[1]] = mail_ids_by_key[key]
+                    continue
+
+                if storage_data is None:
+                    failed_ids.extend(mail_ids_by_key[key])
+                    continue
+
+                body = get_body_from_storage(storage_data)
+
+                contents.extend((mail_id, body) for mail_id in mail_ids_by_key[key])
+
+        self.stats["fetched"] += save_contents(contents)
+        self.stats["failed"] += len(failed_ids)
+
+        self.forget_storage_urls(gone_urls)
+        self.stats["gone"] += sum(len(mail_ids) for mail_ids in gone_urls.values())
+
+        return len(mails), failed_ids
+
+    def run(self):
+        """
+        Fetches every pending mail, the mails which fail are retried on the next run unless their messages are gone
+        """
+        failed_ids = []
+
+        while True:
+            count, batch_failed_ids = self.fetch_batch(exclude_ids=failed_ids)
+
+            if count == 0:
+                return self.stats
+
+            failed_ids.extend(batch_failed_ids)
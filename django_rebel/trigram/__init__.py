@@ -0,0 +1 @@
+default_app_config = 'django_rebel.trigram.apps.RebelTrigramConfig'
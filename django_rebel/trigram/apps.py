@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class RebelTrigramConfig(AppConfig):
+    """
+    Trigram indexes of the mail addresses for the substring search, requires the pg_trgm extension
+    """
+    name = 'django_rebel.trigram'
+    label = 'rebel_trigram'
+    verbose_name = "Rebel Trigram Search"
@@ -0,0 +1,28 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Expressions match the icontains lookups of Django, UPPER(column::text) LIKE UPPER(%s)
+INDEXES = (
+    ("rebel_mail_email_to_trgm_idx", "email_to"),
+    ("rebel_mail_email_from_trgm_idx", "email_from"),
+)
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, so the mail table is not locked for writes
+    atomic = False
+
+    dependencies = [
+        ('django_rebel', '0017_search_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ] + [
+        migrations.RunSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON django_rebel_mail "
+            "USING gin ((UPPER({column}::text)) gin_trgm_ops)".format(name=name, column=column),
+            "DROP INDEX CONCURRENTLY IF EXISTS {name}".format(name=name),
+        )
+        for name, column in INDEXES
+    ]
@@ -1,10 +1,11 @@
 from django.urls import path
 
-from django_rebel.views import EventView, MailContentView
+from django_rebel.views import EventView, EventImportView, MailContentView
 
 app_name = "rebel"
 
 urlpatterns = [
     path("event", EventView.as_view(), name="event"),
+    path("event/import", EventImportView.as_view(), name="event-import"),
     path("content/<str:mail_id>", MailContentView.as_view(), name="content"),
 ]
@@ -1,3 +1,7 @@
+import threading
+from collections import OrderedDict
+
+
 def cached_property(func):
     cached_name = "_cached_{}".format(func)
     sentinel = object()
@@ -11,3 +15,40 @@ def cached_property(func):
         return result
 
     return property(inner)
+
+
+class LRUCache:
+    """
+    Small thread safe LRU mapping
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -1,13 +1,16 @@
+import hmac
 import json
 
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse, FileResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
-from django_rebel.api.constants import EVENT_TYPES
-from django_rebel.models import Mail, MailContent, Event
+from django_rebel.ingestion import INGESTION_MODES, get_ingestion_settings, ingest_event, import_ndjson, \
+    parse_event_data
+from django_rebel.models import Mail, MailBody, MailContent, EventQueueItem
+from django_rebel.settings import get_settings
 
 
 class MailContentView(UserPassesTestMixin, View):
@@ -28,7 +31,18 @@ class MailContentView(UserPassesTestMixin, View):
         if not hasattr(mail, "content"):
             raise Http404("No content")
 
-        return HttpResponse(content=mail.content.body_html)
+        source = mail.content.get_body_source()
+
+        if isinstance(source, MailBody) and source.get_pointer("body_html") is not None:
+            return FileResponse(source.open_body("body_html"), content_type="text/html; charset=utf-8")
+
+        legacy_body = source.get_legacy_body("body_html") if isinstance(source, MailContent) else None
+
+        if legacy_body is not None:
+            return HttpResponse(legacy_body)
+
+        # Body is decompressed while it is sent
+        return StreamingHttpResponse(source._meta.get_field("body_html").iter_text(source))
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -41,59 +55,51 @@ class EventView(View):
         except json.JSONDecodeError:
             raise Http404("Content is not valid")
 
-        event_data = data["event-data"]
+        event_data = data.get("event-data") if isinstance(data, dict) else None
 
         # If there is no message area,
         # Then we could not track mail status
         # Because of that, return 404 error
-        if "message" not in event_data.keys():
+        if not isinstance(event_data, dict) or "message" not in event_data.keys():
             raise Http404("Message area is not defined")
 
-        message_headers = event_data["message"]["headers"]
-
-        message_id = message_headers["message-id"]
-        recipient = event_data["recipient"]
+        # Payloads which do not fit the event and mail columns are refused before they are queued
+        if parse_event_data(event_data) is None:
+            raise Http404("Event data is not valid")
 
-        try:
-            mail = Mail.objects.get(message_id=message_id, email_to=recipient)
-        except Mail.DoesNotExist:
-            return Http404("Mail not found")
+        if get_ingestion_settings()["MODE"] == INGESTION_MODES.QUEUE:
+            # Payload is ingested later in a batch by the queue consumer
+            EventQueueItem.objects.create(payload=event_data)
 
-        storage = event_data.get("storage", None)
+            return HttpResponse(content="ok")
 
-        if not hasattr(mail, "content") and storage:
-            mail.storage_url = storage["url"]
-            mail.save()
+        if not ingest_event(event_data):
+            raise Http404("Mail not found")
 
-            self._generate_content(mail)
+        return HttpResponse(content="ok")
 
-        self._generate_event(event_data, mail)
 
-        return HttpResponse(content="ok")
+@method_decorator(csrf_exempt, name='dispatch')
+class EventImportView(UserPassesTestMixin, View):
+    """
+    Bulk ingestion of Mailgun events, the body is a NDJSON stream of event-data objects.
 
-    def _generate_event(self, event_data, mail):
-        event_type = event_data["event"]
+    Requests are authenticated by the EVENT_IMPORT_TOKEN setting in the Authorization header as a bearer token.
+    """
+    raise_exception = True
 
-        event = Event(mail=mail, name=event_type)
+    def test_func(self):
+        token = get_settings().get("EVENT_IMPORT_TOKEN")
 
-        if event_type == EVENT_TYPES.CLICKED:
-            event.extra_data = {
-                "url": event_data["url"]
-            }
+        if not token:
+            return False
 
-        event.save()
+        authorization = self.request.META.get("HTTP_AUTHORIZATION", "")
 
-        event_field = "has_%s" % event_type.lower()
-        setattr(mail, event_field, True)
-        mail.save(update_fields=[event_field])
+        return hmac.compare_digest(authorization.encode(), ("Bearer %s" % token).encode())
 
-    def _generate_content(self, mail):
-        storage_data = mail.get_storage()
+    def post(self, request, *args, **kwargs):
+        # Request is iterated line by line, so the body is never loaded at once
+        stats = import_ndjson(request)
 
-        MailContent.objects.create(
-            mail=mail,
-            subject=storage_data["subject"],
-            body_text=storage_data["stripped-text"],
-            body_html=storage_data["stripped-html"],
-            body_plain=storage_data["body-plain"]
-        )
+        return JsonResponse(dict(stats))
@@ -53,6 +53,8 @@ version = get_version('django_rebel')
 if __name__ == "__main__":
     INSTALL_REQUIRES = get_requirements(path.join(here, "requirements", "requirement-main.txt"))
     TESTING_REQUIRES = get_requirements(path.join(here, "requirements", "requirement-main.txt"))
+    ASYNC_REQUIRES = get_requirements(path.join(here, "requirements", "requirement-async.txt"))
+    ZSTD_REQUIRES = get_requirements(path.join(here, "requirements", "requirement-compression.txt"))
 
     # Get the long description from the README file
     with open(path.join(here, 'README.MD'), encoding='utf-8') as f:
@@ -124,6 +126,9 @@ setup(
     # simple. Or you can use find_packages().
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
 
+    # Admin template overrides
+    package_data={'django_rebel': ['templates/admin/*.html']},
+
     # Alternatively, if you want to distribute just a my_module.py, uncomment
     # this:
     #   py_modules=["my_module"],
@@ -140,5 +145,7 @@ setup(
     # $ pip install -e .[dev,test]
     extras_require={
         'test': TESTING_REQUIRES,
+        'async': ASYNC_REQUIRES,
+        'zstd': ZSTD_REQUIRES,
     }
 )
@@ -1,8 +1,31 @@
+import copy
+import datetime
+
 import factory
+from django.conf import settings
+from django.test import override_settings
 
 from django_rebel.models import Mail, MailLabel, MailContent, Event
 
-from tests.models import Owner
+from tests.models import Owner, Team
+
+
+def rebel_settings(key, value=None, **values):
+    """
+    Overrides a section of the REBEL settings with the value or the keyword arguments, key is the name of the
+    section or a tuple of the nested names
+    """
+    overridden = copy.deepcopy(settings.REBEL)
+
+    names = (key,) if isinstance(key, str) else key
+    section = overridden
+
+    for name in names[:-1]:
+        section = section.setdefault(name, {})
+
+    section[names[-1]] = value if value is not None else values
+
+    return override_settings(REBEL=overridden)
 
 
 class OwnerFactory(factory.DjangoModelFactory):
@@ -10,6 +33,11 @@ class OwnerFactory(factory.DjangoModelFactory):
         model = Owner
 
 
+class TeamFactory(factory.DjangoModelFactory):
+    class Meta:
+        model = Team
+
+
 class MailFactory(factory.DjangoModelFactory):
     owner_object = factory.SubFactory(OwnerFactory)
 
@@ -34,3 +62,21 @@ class MailContentFactory(factory.DjangoModelFactory):
 class EventFactory(factory.DjangoModelFactory):
     class Meta:
         model = Event
+
+
+def event_data(mail, *, event_id, event="opened", timestamp=None):
+    """
+    Mailgun event-data of the mail, timestamp is a datetime or a unix timestamp, the current time by default
+    """
+    if timestamp is None:
+        timestamp = datetime.datetime.now(datetime.timezone.utc)
+
+    data = {
+        "id": event_id,
+        "event": event,
+        "recipient": mail.email_to,
+        "message": {"headers": {"message-id": mail.message_id}},
+        "timestamp": timestamp.timestamp() if isinstance(timestamp, datetime.datetime) else timestamp,
+    }
+
+    return data
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Team',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('email', models.EmailField(max_length=254)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
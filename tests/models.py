@@ -11,3 +11,14 @@ class Owner(MailOwner):
 
     def get_admin_view_link(self):
         return self.pk
+
+
+class Team(MailOwner):
+    name = models.CharField(max_length=64)
+    email = models.EmailField()
+
+    def get_email(self):
+        return self.email
+
+    def get_admin_view_link(self):
+        return self.pk
@@ -60,6 +60,10 @@ STATIC_URL = '/static/'
 REBEL = {
     "TEST_MODE": True,
     "SEARCH_FIELDS": [],
+    # Tests run in a single process, so the local memory cache reaches every registry
+    "REGISTRY": {
+        "SHARED_CACHE": True
+    },
     "EMAIL_PROFILES": {
         'DEFAULT': {
             'EMAIL': "anyone@example.com",
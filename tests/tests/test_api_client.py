@@ -0,0 +1,39 @@
+import json
+import re
+
+import httpretty
+from django.test import SimpleTestCase
+
+from django_rebel.api.mailgun import Mailgun
+from django_rebel.api.sessions import sessions
+
+
+class SessionRegistryTestCase(SimpleTestCase):
+    def tearDown(self):
+        sessions.clear()
+
+    def test_session_is_shared(self):
+        first_session = Mailgun("DEFAULT").client().get_session()
+        second_session = Mailgun("DEFAULT").client().get_session()
+
+        self.assertIs(first_session, second_session)
+
+    def test_clear(self):
+        first_session = Mailgun("DEFAULT").client().get_session()
+
+        sessions.clear()
+
+        self.assertIsNot(first_session, Mailgun("DEFAULT").client().get_session())
+
+    @httpretty.activate
+    def test_send_uses_shared_session(self):
+        httpretty.register_uri(
+            httpretty.POST,
+            re.compile(r'.*'),
+            body=json.dumps({"id": "<foo>"})
+        )
+
+        response = Mailgun("DEFAULT").message.send(subject="foo", to=["foo@example.com"])
+
+        self.assertEqual(response.message_id(), "foo")
+        self.assertEqual(len(sessions._sessions), 1)
@@ -0,0 +1,108 @@
+import weakref
+from unittest import mock
+
+import httpx
+from django.test import TestCase
+
+from django_rebel.api.mailgun import AsyncMailgun
+from django_rebel.api.sessions import AsyncSessionRegistry
+from django_rebel.exceptions import RebelAPIError
+from django_rebel.models import Mail
+from django_rebel.services import PreparedMail
+
+from tests.factories import OwnerFactory
+from tests.tests.test_mail_senders import TestMailTemplate
+
+
+def mock_transport(status_code=200, content=None):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+
+        return httpx.Response(status_code, json=content if content is not None else {"id": "<foo>"})
+
+    def create_session(registry, api_settings, timeout=None):
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    return mock.patch.object(AsyncSessionRegistry, "create_session", create_session), requests
+
+
+class AsyncSessionRegistryTestCase(TestCase):
+    async def test_clear(self):
+        registry = AsyncSessionRegistry()
+
+        session = registry.get("DEFAULT", "https://api.mailgun.net/v3", {})
+
+        self.assertIs(registry.get("DEFAULT", "https://api.mailgun.net/v3", {}), session)
+
+        registry.clear()
+
+        self.assertIsInstance(registry._sessions, weakref.WeakKeyDictionary)
+        self.assertIsNot(registry.get("DEFAULT", "https://api.mailgun.net/v3", {}), session)
+
+        await session.aclose()
+        await registry.aclear()
+
+
+class AsyncSendTestCase(TestCase):
+    async def test_asend(self):
+        patcher, requests = mock_transport()
+
+        with patcher:
+            prepared_mail = PreparedMail(subject="foo")
+            prepared_mail.add_receiver(email_to="foo@example.com")
+
+            mails, status = await prepared_mail.asend()
+
+        self.assertTrue(status)
+        self.assertEqual(len(requests), 1)
+        self.assertIn(b"foo%40example.com", requests[0].content)
+        self.assertEqual(mails[0].message_id, "foo")
+
+    async def test_asend_fail_silently(self):
+        patcher, _ = mock_transport(status_code=400, content={})
+
+        with patcher:
+            prepared_mail = PreparedMail(subject="foo")
+            prepared_mail.add_receiver(email_to="foo@example.com")
+
+            _, status = await prepared_mail.asend(fail_silently=True)
+
+            self.assertFalse(status)
+
+            with self.assertRaises(RebelAPIError):
+                await prepared_mail.asend(fail_silently=False)
+
+    async def test_iterate_events(self):
+        events_url = "https://api.mailgun.net/v3/mg.example.com/events"
+
+        pages = {
+            "/v3/mg.example.com/events": {"items": [{"id": "1"}], "paging": {"next": events_url + "/2"}},
+            "/v3/mg.example.com/events/2": {"items": [{"id": "2"}], "paging": {"next": events_url + "/3"}},
+            "/v3/mg.example.com/events/3": {"items": [], "paging": {}},
+        }
+
+        def handler(request):
+            return httpx.Response(200, json=pages[request.url.path])
+
+        def create_session(registry, api_settings, timeout=None):
+            return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        with mock.patch.object(AsyncSessionRegistry, "create_session", create_session):
+            items = [item["id"] async for item in AsyncMailgun("DEFAULT").event.iterate()]
+
+        self.assertEqual(items, ["1", "2"])
+
+    def test_template_asend(self):
+        from asgiref.sync import async_to_sync
+
+        owner = OwnerFactory.create()
+
+        patcher, _ = mock_transport(content={"id": "<bar>"})
+
+        with patcher:
+            mail = async_to_sync(TestMailTemplate(owner).asend)()
+
+        self.assertEqual(mail.message_id, "bar")
+        self.assertEqual(Mail.objects.count(), 1)
@@ -0,0 +1,82 @@
+import itertools
+import json
+import threading
+import urllib.parse
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, TestCase
+
+from django_rebel.api.batching import split_recipients
+from django_rebel.models import Mail
+from django_rebel.services import PreparedMail
+
+
+class SplitRecipientsTestCase(SimpleTestCase):
+    def test_chunk_size(self):
+        to = ["user%d@example.com" % i for i in range(5)]
+
+        chunks, _ = split_recipients(to=to, chunk_size=2)
+
+        self.assertEqual([chunk.to for chunk in chunks], [to[0:2], to[2:4], to[4:5]])
+
+    def test_variables(self):
+        to = ["user%d@example.com" % i for i in range(3)]
+        variables = {email: {"name": email} for email in to}
+        variables["nobody@example.com"] = {"no-data": "no"}
+
+        chunks, shared_variables = split_recipients(to=to, variables=variables, chunk_size=2)
+
+        self.assertEqual(shared_variables, {"nobody@example.com": {"no-data": "no"}})
+        self.assertEqual(set(chunks[1].get_send_kwargs(shared_variables)["variables"].keys()),
+                         {"user2@example.com", "nobody@example.com"})
+
+    def test_payload_size(self):
+        to = ["user%d@example.com" % i for i in range(4)]
+        variables = {email: {"data": "x" * 100} for email in to}
+
+        chunks, _ = split_recipients(to=to, variables=variables, chunk_size=1000, max_payload_size=300)
+
+        self.assertEqual(len(chunks), 2)
+
+        for chunk in chunks:
+            self.assertLessEqual(len(json.dumps(chunk.variables)), 300)
+
+
+class ChunkedSendTestCase(TestCase):
+    def test_send_chunked(self):
+        counter = itertools.count()
+        lock = threading.Lock()
+        # Every chunk waits for the others, so the test fails unless they are sent concurrently
+        barrier = threading.Barrier(3, timeout=10)
+
+        def send_request(prepared_request, **kwargs):
+            content = urllib.parse.parse_qs(prepared_request.body)
+
+            self.assertLessEqual(len(content["to"]), 2)
+
+            barrier.wait()
+
+            # httpretty is not thread safe, responses are built here instead
+            with lock:
+                message_id = next(counter)
+
+            response = requests.Response()
+            response.status_code = 200
+            response.request = prepared_request
+            response._content = json.dumps({"id": "<message_%d>" % message_id}).encode()
+
+            return response
+
+        prepared_mail = PreparedMail(subject="foo", chunk_size=2)
+
+        for i in range(5):
+            prepared_mail.add_receiver(email_to="user%d@example.com" % i)
+
+        with mock.patch.object(requests.Session, "send", side_effect=send_request):
+            mails, status = prepared_mail.send()
+
+        self.assertTrue(status)
+        self.assertEqual(len(mails), 5)
+        self.assertEqual(Mail.objects.values("message_id").distinct().count(), 3)
+        self.assertEqual(Mail.objects.filter(message_id__startswith="message_").count(), 5)
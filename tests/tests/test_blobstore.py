@@ -0,0 +1,157 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, SimpleTestCase
+
+from django_rebel.blobstore import FileSystemBlobStore, DjangoStorageBlobStore
+from django_rebel.models import MailBody, MailContent
+from django_rebel.services import PreparedMail
+from django_rebel.storage import move_inline_contents, release_bodies, save_contents
+
+from tests.factories import MailFactory, MailContentFactory, rebel_settings
+
+HTML = "<p>Merhaba dünya</p>" * 500
+
+
+class FileSystemBlobStoreTestCase(SimpleTestCase):
+    def test_put(self):
+        with tempfile.TemporaryDirectory() as location:
+            blob_store = FileSystemBlobStore(location)
+
+            pointers = [blob_store.put(b"x" * 600), blob_store.put(b"y" * 300), blob_store.put(b"")]
+
+            self.assertEqual(len(set(pointers)), 3)
+            self.assertEqual(blob_store.read(pointers[0]), b"x" * 600)
+            self.assertEqual(blob_store.read(pointers[2]), b"")
+
+            with blob_store.open(pointers[1]) as f:
+                self.assertEqual(f.read(100), b"y" * 100)
+                self.assertEqual(f.read(), b"y" * 200)
+
+            blob_store.delete(pointers[0])
+            blob_store.delete(pointers[0])
+
+            self.assertFalse(os.path.exists(blob_store.get_path(pointers[0])))
+
+            with self.assertRaises(FileNotFoundError):
+                blob_store.read(pointers[0])
+
+
+class DjangoStorageBlobStoreTestCase(SimpleTestCase):
+    def test_put(self):
+        with tempfile.TemporaryDirectory() as location:
+            blob_store = DjangoStorageBlobStore()
+            blob_store.storage = FileSystemStorage(location)
+
+            pointer = blob_store.put(b"body")
+
+            self.assertEqual(blob_store.read(pointer), b"body")
+
+            blob_store.delete(pointer)
+
+            self.assertFalse(blob_store.storage.exists(pointer))
+
+
+class BlobStoreBodiesTestCase(TestCase):
+    def setUp(self):
+        self.location = tempfile.TemporaryDirectory()
+
+        # Second override copies the settings of the first one
+        for key, values in [
+            ("BLOB_STORE", {"BACKEND": "django_rebel.blobstore.FileSystemBlobStore",
+                            "OPTIONS": {"LOCATION": self.location.name}}),
+            ("CONTENT_COMPRESSION", {"CODEC": "zlib"}),
+        ]:
+            settings_override = rebel_settings(key, values)
+            settings_override.enable()
+            self.addCleanup(settings_override.disable)
+
+    def tearDown(self):
+        self.location.cleanup()
+
+    def test_bodies(self):
+        mail = MailFactory.create()
+
+        save_contents([(mail.id, {"subject": "Subject", "body_html": HTML, "body_text": "Text"})])
+
+        body = MailBody.objects.get()
+
+        self.assertIsNone(body.body_html)
+        self.assertIsNotNone(body.body_html_pointer)
+        self.assertIsNone(body.body_plain_pointer)
+        self.assertEqual(MailContent.objects.get(mail=mail).get_body_html(), HTML)
+        self.assertEqual(MailContent.objects.get(mail=mail).get_body_text(), "Text")
+
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True))
+
+        response = self.client.get(MailContent.objects.get(mail=mail).get_content_url())
+
+        self.assertEqual(b"".join(response.streaming_content).decode("utf-8"), HTML)
+
+    def get_blob_count(self):
+        return sum(len(names) for _, _, names in os.walk(self.location.name))
+
+    def test_shared_body(self):
+        body = {"subject": "Subject", "body_html": HTML}
+
+        save_contents([(MailFactory.create().id, body)])
+        save_contents([(MailFactory.create().id, body), (MailFactory.create().id, body)])
+
+        self.assertEqual(MailBody.objects.get().ref_count, 3)
+        self.assertEqual(self.get_blob_count(), 1)
+
+    def test_release(self):
+        mail = MailFactory.create()
+
+        save_contents([(mail.id, {"subject": "Subject", "body_html": HTML, "body_plain": "Plain"})])
+
+        body = MailBody.objects.get()
+
+        self.assertEqual(self.get_blob_count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MailContent.objects.filter(mail=mail).delete()
+            release_bodies({body.id: 1})
+
+        self.assertFalse(MailBody.objects.exists())
+        self.assertEqual(self.get_blob_count(), 0)
+
+    def test_rollback(self):
+        mail = MailFactory.create()
+
+        with mock.patch("django_rebel.storage.change_ref_counts", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                save_contents([(mail.id, {"subject": "Subject", "body_html": HTML})])
+
+        self.assertFalse(MailBody.objects.exists())
+        self.assertEqual(self.get_blob_count(), 0)
+
+    def test_move_inline_contents(self):
+        contents = [MailContentFactory.create(mail=MailFactory.create(), subject="Subject", body_html=HTML)
+                    for _ in range(2)]
+
+        self.assertEqual(move_inline_contents([content.id for content in contents]), 2)
+        self.assertEqual(move_inline_contents([content.id for content in contents]), 0)
+
+        self.assertEqual(MailBody.objects.get().ref_count, 2)
+        self.assertEqual(self.get_blob_count(), 1)
+        self.assertEqual(MailContent.objects.get(id=contents[0].id).get_body_html(), HTML)
+
+    def test_send_rollback(self):
+        prepared_mail = PreparedMail(subject="Subject", html=HTML, store_content=True)
+        prepared_mail.add_receiver(email_to="foo@example.com")
+
+        with mock.patch("django_rebel.services.add_daily_stats", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                prepared_mail._save_mails("<message@mg.example.com>")
+
+        self.assertFalse(MailBody.objects.exists())
+        self.assertEqual(self.get_blob_count(), 0)
+
+        prepared_mail._save_mails("<message@mg.example.com>")
+
+        self.assertEqual(MailContent.objects.get().get_body_html(), prepared_mail.html)
+        self.assertEqual(self.get_blob_count(), 1)
@@ -0,0 +1,138 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, SimpleTestCase
+
+from django_rebel.fields import COMPRESSION_CODECS, CompressedData, compress, decompress, iter_decompress
+from django_rebel.management.commands.rebel_compress_content import Command
+from django_rebel.models import MailContent
+from django_rebel.storage import get_legacy_content_columns
+
+from tests.factories import MailFactory, rebel_settings
+
+HTML = "<p>Merhaba dünya, mail içeriği</p>" * 200
+
+
+class CompressTestCase(SimpleTestCase):
+    def test_codecs(self):
+        for codec in (COMPRESSION_CODECS.PLAIN, COMPRESSION_CODECS.ZLIB, COMPRESSION_CODECS.ZSTD):
+            data = compress(HTML, codec=codec)
+
+            self.assertEqual(data.codec, codec)
+            self.assertEqual(decompress(data), HTML)
+            # Multi byte characters are split between the chunks
+            self.assertEqual("".join(iter_decompress(data, chunk_size=7)), HTML)
+
+        self.assertLess(len(compress(HTML, codec=COMPRESSION_CODECS.ZLIB)), len(HTML.encode("utf-8")) / 5)
+
+    def test_min_size(self):
+        self.assertEqual(compress("short", codec=COMPRESSION_CODECS.ZLIB).codec, COMPRESSION_CODECS.PLAIN)
+
+
+class CompressedTextFieldTestCase(TestCase):
+    def get_codec(self, content: MailContent):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT get_byte(body_html, 0) FROM django_rebel_mailcontent WHERE id = %s", [content.id])
+
+            return cursor.fetchone()[0]
+
+    @rebel_settings("CONTENT_COMPRESSION", CODEC="zlib")
+    def test_save_and_load(self):
+        content = MailContent.objects.create(mail=MailFactory.create(), subject="Subject", body_html=HTML,
+                                             body_text="Text")
+
+        self.assertEqual(self.get_codec(content), 1)
+
+        content = MailContent.objects.get(id=content.id)
+
+        # Bodies are decompressed on access
+        self.assertIsInstance(content.__dict__["body_html"], CompressedData)
+        self.assertEqual(content.body_html, HTML)
+        self.assertEqual(content.body_text, "Text")
+        self.assertIsNone(content.body_plain)
+
+        content = MailContent.objects.defer("body_html").get(id=content.id)
+
+        self.assertEqual(content.body_html, HTML)
+
+    def test_compress_command(self):
+        content = MailContent.objects.create(mail=MailFactory.create(), body_html=HTML, body_text="Text")
+
+        self.assertEqual(self.get_codec(content), 0)
+
+        call_command("rebel_compress_content", codec="zstd", chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(self.get_codec(content), 2)
+        self.assertEqual(MailContent.objects.get(id=content.id).body_html, HTML)
+
+        call_command("rebel_compress_content", codec="plain", stdout=StringIO())
+
+        self.assertEqual(self.get_codec(content), 0)
+
+    @rebel_settings("CONTENT_COMPRESSION", CODEC="zlib")
+    @mock.patch.object(MailContent, "legacy_columns_dropped", False)
+    def test_move_legacy_bodies(self):
+        # Text columns which are kept by the migration until the bodies are moved
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE django_rebel_mailcontent ADD COLUMN body_html_legacy text NULL")
+
+        content = MailContent.objects.create(mail=MailFactory.create(), body_text="Text")
+        other_content = MailContent.objects.create(mail=MailFactory.create())
+
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE django_rebel_mailcontent SET body_html_legacy = %s WHERE id IN (%s, %s)",
+                           [HTML, content.id, other_content.id])
+
+        # Bodies are read from the legacy columns until they are moved
+        self.assertEqual(MailContent.objects.get(id=content.id).get_body_html(), HTML)
+        self.assertIsNone(MailContent.objects.get(id=content.id).get_body_plain())
+
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True))
+
+        response = self.client.get(MailContent.objects.get(id=other_content.id).get_content_url())
+
+        self.assertEqual(response.content.decode("utf-8"), HTML)
+
+        call_command("rebel_compress_content", chunk_size=1, drop_legacy=True, stdout=StringIO())
+
+        for moved_content in (content, other_content):
+            self.assertEqual(self.get_codec(moved_content), 1)
+            self.assertEqual(MailContent.objects.get(id=moved_content.id).body_html, HTML)
+
+        self.assertEqual(MailContent.objects.get(id=content.id).body_text, "Text")
+        self.assertEqual(get_legacy_content_columns(), [])
+        self.assertTrue(MailContent.legacy_columns_dropped)
+
+    @rebel_settings("CONTENT_COMPRESSION", CODEC="zlib")
+    @mock.patch.object(MailContent, "legacy_columns_dropped", False)
+    def test_drop_legacy_columns(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE django_rebel_mailcontent ADD COLUMN body_html_legacy text NULL")
+
+        content = MailContent.objects.create(mail=MailFactory.create())
+
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE django_rebel_mailcontent SET body_html_legacy = %s", [HTML])
+
+        # Columns are only dropped once every body is moved
+        with mock.patch.object(Command, "move_legacy_bodies"):
+            with self.assertRaises(CommandError):
+                call_command("rebel_compress_content", drop_legacy=True, stdout=StringIO())
+
+        self.assertEqual(get_legacy_content_columns(), ["body_html"])
+        self.assertEqual(MailContent.objects.get(id=content.id).get_body_html(), HTML)
+
+    @rebel_settings("CONTENT_COMPRESSION", CODEC="zlib")
+    def test_content_view(self):
+        mail = MailFactory.create()
+        MailContent.objects.create(mail=mail, body_html=HTML)
+
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True))
+
+        response = self.client.get(mail.content.get_content_url())
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content).decode("utf-8"), HTML)
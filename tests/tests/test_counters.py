@@ -0,0 +1,119 @@
+import datetime
+import json
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+
+from django_rebel.ingestion import ingest_event, import_ndjson, EventIngestor, rebuild_counters
+from django_rebel.models import Event, Mail
+from django_rebel.retention import EventCapPruner
+
+from tests.factories import MailFactory, event_data, rebel_settings
+
+
+def at(day):
+    return datetime.datetime(2026, 1, day, tzinfo=datetime.timezone.utc)
+
+
+def utc(day):
+    value = at(day)
+
+    # Database returns naive local times when USE_TZ is disabled
+    return value if settings.USE_TZ else timezone.make_naive(value)
+
+
+class EngagementCountersTestCase(TestCase):
+    def assertCounters(self, mail, open_count, click_count, first_opened_at, first_clicked_at, last_event_at):
+        mail = Mail.objects.get(id=mail.id)
+
+        self.assertEqual((mail.open_count, mail.click_count), (open_count, click_count))
+        self.assertEqual((mail.first_opened_at, mail.first_clicked_at, mail.last_event_at),
+                         (first_opened_at, first_clicked_at, last_event_at))
+
+    def test_ingest_event(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        ingest_event(event_data(mail, event_id="event-1", event="delivered", timestamp=at(1)))
+        ingest_event(event_data(mail, event_id="event-2", event="opened", timestamp=at(3)))
+        ingest_event(event_data(mail, event_id="event-3", event="opened", timestamp=at(2)))
+        ingest_event(event_data(mail, event_id="event-3", event="opened", timestamp=at(2)))
+        ingest_event(event_data(mail, event_id="event-4", event="clicked", timestamp=at(4)))
+
+        self.assertCounters(mail, 2, 1, utc(2), utc(4), utc(4))
+        self.assertTrue(Mail.objects.get(id=mail.id).has_opened)
+
+    def test_ingestor(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+        other_mail = MailFactory.create(email_to="bar@example.com")
+
+        ingestor = EventIngestor()
+        ingestor.ingest([
+            event_data(mail, event_id="event-1", event="delivered", timestamp=at(1)),
+            event_data(mail, event_id="event-2", event="opened", timestamp=at(3)),
+            event_data(mail, event_id="event-3", event="opened", timestamp=at(2)),
+            event_data(mail, event_id="event-4", event="clicked", timestamp=at(4)),
+            event_data(other_mail, event_id="event-5", event="delivered", timestamp=at(5)),
+        ])
+        ingestor.ingest([
+            event_data(mail, event_id="event-3", event="opened", timestamp=at(2)),
+            event_data(mail, event_id="event-6", event="opened", timestamp=at(6)),
+        ])
+
+        self.assertCounters(mail, 3, 1, utc(2), utc(4), utc(6))
+        self.assertCounters(other_mail, 0, 0, None, None, utc(5))
+        self.assertTrue(Mail.objects.get(id=mail.id).has_clicked)
+        self.assertTrue(Mail.objects.get(id=other_mail.id).has_delivered)
+        self.assertFalse(Mail.objects.get(id=other_mail.id).has_opened)
+
+        Mail.objects.update(open_count=0, click_count=0, first_opened_at=None, first_clicked_at=None,
+                            last_event_at=None)
+
+        self.assertEqual(rebuild_counters([mail.id, other_mail.id]), 2)
+
+        self.assertCounters(mail, 3, 1, utc(2), utc(4), utc(6))
+        self.assertCounters(other_mail, 0, 0, None, None, utc(5))
+
+    def test_event_cap(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        EventIngestor().ingest(
+            [event_data(mail, event_id="event-%d" % day, event="opened", timestamp=at(day)) for day in range(1, 5)] +
+            [event_data(mail, event_id="event-click", event="clicked", timestamp=at(5))]
+        )
+
+        stats = EventCapPruner(max_events=2, grace=0).run()
+
+        self.assertEqual(stats["events"], 2)
+        self.assertEqual(sorted(Event.objects.values_list("provider_id", flat=True)),
+                         ["event-1", "event-2", "event-click"])
+        self.assertEqual(Mail.objects.get(id=mail.id).open_count, 4)
+
+        # Pruned events are still counted after a rebuild
+        rebuild_counters([mail.id])
+
+        self.assertCounters(mail, 4, 1, utc(1), utc(5), utc(5))
+
+        self.assertEqual(EventCapPruner().run(), {})
+
+    def test_replay_pruned_events(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+        other_mail = MailFactory.create(email_to="bar@example.com")
+
+        events = [event_data(mail, event_id="event-%d" % day, event="opened", timestamp=at(day))
+                  for day in range(1, 5)]
+        EventIngestor().ingest(events)
+
+        EventCapPruner(max_events=2, grace=0).run()
+
+        with rebel_settings("EVENT_CAP", MAX_EVENTS=2):
+            stats = import_ndjson(json.dumps(event) for event in events)
+            ingest_event(events[-1])
+
+            # Events which are older than the grace are counted by the rebuild
+            ingest_event(event_data(other_mail, event_id="event-other", event="opened", timestamp=at(1)))
+
+        self.assertEqual(stats["ingested"], 2)
+        self.assertCounters(mail, 4, 0, utc(1), None, utc(4))
+        self.assertCounters(other_mail, 1, 0, utc(1), None, utc(1))
+
@@ -0,0 +1,170 @@
+import datetime
+import json
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from httpretty import httpretty
+
+from django_rebel.ingestion import ingest_event, EventIngestor
+from django_rebel.models import Mail, MailDailyStat, MailDailyStatDelta
+from django_rebel.services import PreparedMail
+from django_rebel.stats import add_daily_stats, rebuild_daily_stats, rollup_daily_stats
+
+from tests.factories import MailFactory, MailLabelFactory, event_data
+
+
+def today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+class DailyStatsTestCase(TestCase):
+    def setUp(self):
+        self.label = MailLabelFactory.create(name="Welcome", slug="welcome")
+
+    def create_mail(self, email_to, **kwargs):
+        mail = MailFactory.create(email_to=email_to, profile="default", label=self.label, **kwargs)
+
+        add_daily_stats({mail.id: {"sent"}})
+
+        return mail
+
+    def get_row(self, tag="", label=None):
+        rollup_daily_stats()
+
+        return MailDailyStat.objects.values("sent", "delivered", "opened", "clicked", "failed", "complained") \
+            .get(day=today(), tag=tag, label=label or self.label)
+
+    def test_send(self):
+        httpretty.enable()
+        self.addCleanup(httpretty.disable)
+
+        httpretty.register_uri(
+            httpretty.POST,
+            re.compile(r'.*'),
+            body=json.dumps({"id": "<message@mg.example.com>", "message": "Queued. Thank you."}),
+            status=200
+        )
+
+        prepared_mail = PreparedMail(subject="Subject", text="Text", label="welcome", tags=["foo", "bar"])
+        prepared_mail.add_receiver(email_to="foo@example.com")
+        prepared_mail.add_receiver(email_to="bar@example.com")
+        prepared_mail.send()
+
+        self.assertEqual(self.get_row()["sent"], 2)
+        self.assertEqual(self.get_row(tag="foo")["sent"], 2)
+        self.assertEqual(self.get_row(tag="bar")["sent"], 2)
+
+    def test_events(self):
+        mail = self.create_mail("foo@example.com", tags=["foo"])
+        other_mail = self.create_mail("bar@example.com")
+
+        ingest_event(event_data(mail, event_id="event-1", event="delivered"))
+        ingest_event(event_data(mail, event_id="event-2", event="opened"))
+        ingest_event(event_data(mail, event_id="event-3", event="opened"))
+        ingest_event(event_data(mail, event_id="event-3", event="opened"))
+
+        EventIngestor().ingest([
+            event_data(mail, event_id="event-4", event="opened"),
+            event_data(mail, event_id="event-5", event="clicked"),
+            event_data(other_mail, event_id="event-6", event="failed"),
+            event_data(other_mail, event_id="event-7", event="complained"),
+            event_data(other_mail, event_id="event-8", event="complained"),
+        ])
+
+        expected = {"sent": 2, "delivered": 1, "opened": 1, "clicked": 1, "failed": 1, "complained": 1}
+
+        # Changes are only appended until the rollup
+        self.assertFalse(MailDailyStat.objects.exists())
+
+        self.assertEqual(self.get_row(), expected)
+        self.assertEqual(self.get_row(tag="foo"),
+                         {"sent": 1, "delivered": 1, "opened": 1, "clicked": 1, "failed": 0, "complained": 0})
+
+        MailDailyStat.objects.all().delete()
+
+        rebuild_daily_stats(today())
+
+        self.assertEqual(self.get_row(), expected)
+
+    def test_rollup(self):
+        self.create_mail("foo@example.com", tags=["foo"])
+        self.create_mail("bar@example.com")
+
+        self.assertEqual(MailDailyStatDelta.objects.count(), 3)
+        self.assertEqual(rollup_daily_stats(batch_size=2), 2)
+        self.assertEqual(rollup_daily_stats(batch_size=2), 1)
+        self.assertEqual(rollup_daily_stats(), 0)
+
+        self.assertFalse(MailDailyStatDelta.objects.exists())
+        self.assertEqual(self.get_row()["sent"], 2)
+        self.assertEqual(self.get_row(tag="foo")["sent"], 1)
+
+    def test_rebuild_pending_deltas(self):
+        self.create_mail("foo@example.com")
+        rollup_daily_stats()
+        self.create_mail("bar@example.com")
+
+        # Pending delta of the day is counted by the mails, it is not added again by the next rollup
+        rebuild_daily_stats(today())
+
+        self.assertFalse(MailDailyStatDelta.objects.exists())
+        self.assertEqual(self.get_row()["sent"], 2)
+
+    def test_rebuild_purged_day(self):
+        mail = self.create_mail("foo@example.com")
+        self.create_mail("bar@example.com")
+        rollup_daily_stats()
+
+        mail.delete()
+
+        # Stats of the purged mails are kept
+        self.assertIsNone(rebuild_daily_stats(today()))
+        self.assertEqual(self.get_row()["sent"], 2)
+
+        self.assertEqual(rebuild_daily_stats(today(), force=True), 1)
+        self.assertEqual(self.get_row()["sent"], 1)
+
+    def test_report(self):
+        other_label = MailLabelFactory.create(name="Digest", slug="digest")
+
+        mail = self.create_mail("foo@example.com", tags=["foo"])
+        self.create_mail("bar@example.com")
+        MailFactory.create(email_to="baz@example.com", profile="other", label=other_label)
+
+        Mail.objects.filter(id=mail.id).update(has_opened=True)
+        rebuild_daily_stats(today())
+
+        self.assertEqual(list(MailDailyStat.objects.report(label="welcome")),
+                         [{"day": today(), "sent": 2, "delivered": 0, "opened": 1, "clicked": 0, "failed": 0,
+                           "complained": 0}])
+        self.assertEqual(MailDailyStat.objects.totals(since=today(), until=today())["sent"], 3)
+        self.assertEqual(MailDailyStat.objects.totals(tag="foo")["sent"], 1)
+        self.assertEqual(MailDailyStat.objects.totals(profile="other")["sent"], 1)
+        self.assertEqual(MailDailyStat.objects.totals(since=today() + datetime.timedelta(days=1))["sent"], 0)
+        self.assertEqual(
+            [row["label__slug"] for row in MailDailyStat.objects.report(group_by=("label__slug",))],
+            ["digest", "welcome"],
+        )
+
+    def test_admin(self):
+        self.create_mail("foo@example.com", tags=["foo"])
+        rollup_daily_stats()
+
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True, is_staff=True))
+
+        url = reverse("admin:django_rebel_maildailystat_changelist")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if '"django_rebel_mail"' in query["sql"]])
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+
+        response = self.client.get(url, {"tag": "foo"})
+
+        self.assertEqual(response.context["cl"].result_list[0].tag, "foo")
@@ -0,0 +1,58 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from django_rebel.models import Event
+
+from tests.factories import MailFactory, event_data, rebel_settings
+
+
+class EventImportTestCase(TestCase):
+    def get_ndjson(self, mail):
+        lines = [
+            json.dumps(event_data(mail, event_id="event-1", event="delivered")),
+            json.dumps({"event-data": event_data(mail, event_id="event-2", event="opened")}),
+            "not json",
+            "",
+            json.dumps(event_data(mail, event_id="event-2", event="opened")),
+        ]
+
+        return "\n".join(lines)
+
+    def test_view(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        with rebel_settings("EVENT_IMPORT_TOKEN", "secret"):
+            response = self.client.post(reverse("rebel:event-import"), data=self.get_ndjson(mail),
+                                        content_type="application/x-ndjson", HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["invalid"], 1)
+
+        mail.refresh_from_db()
+
+        self.assertTrue(mail.has_delivered)
+        self.assertTrue(mail.has_opened)
+        self.assertEqual(Event.objects.filter(mail=mail).count(), 2)
+
+    def test_view_authentication(self):
+        with rebel_settings("EVENT_IMPORT_TOKEN", "secret"):
+            response = self.client.post(reverse("rebel:event-import"), data="",
+                                        content_type="application/x-ndjson", HTTP_AUTHORIZATION="Bearer wrong")
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_command(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as f:
+            f.write(self.get_ndjson(mail))
+            f.flush()
+
+            call_command("rebel_import_events", f.name, batch_size=1, stdout=StringIO())
+
+        self.assertEqual(Event.objects.filter(mail=mail).count(), 2)
@@ -0,0 +1,162 @@
+import json
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_rebel.ingestion import EventQueueConsumer, get_mail_id_cache
+from django_rebel.models import Event, EventQueueItem, MailContent
+
+from tests.factories import MailFactory, rebel_settings
+
+
+def webhook_payload(mail, event="delivered", **extra):
+    event_data = {
+        "event": event,
+        "recipient": mail.email_to,
+        "message": {"headers": {"message-id": mail.message_id}},
+        "timestamp": 1700000000.0,
+    }
+    event_data.update(extra)
+
+    return json.dumps({"event-data": event_data})
+
+
+class EventViewTestCase(TestCase):
+    def post_event(self, payload):
+        return self.client.post(reverse("rebel:event"), data=payload, content_type="application/json")
+
+    def test_direct(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        response = self.post_event(webhook_payload(mail))
+
+        self.assertEqual(response.status_code, 200)
+
+        mail.refresh_from_db()
+
+        self.assertTrue(mail.has_delivered)
+        self.assertEqual(Event.objects.filter(mail=mail, name="delivered").count(), 1)
+
+    def test_status_flags(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        self.post_event(webhook_payload(mail, "delivered"))
+        self.post_event(webhook_payload(mail, "opened"))
+        self.post_event(webhook_payload(mail, "clicked", url="https://example.com"))
+
+        mail.refresh_from_db()
+
+        self.assertTrue(mail.has_delivered)
+        self.assertTrue(mail.has_opened)
+        self.assertTrue(mail.has_clicked)
+        self.assertEqual(Event.objects.get(mail=mail, name="clicked").extra_data, {"url": "https://example.com"})
+
+    def test_retried_webhook(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        self.post_event(webhook_payload(mail, "opened", id="event-1"))
+        self.post_event(webhook_payload(mail, "opened", id="event-1"))
+        self.post_event(webhook_payload(mail, "opened", id="event-2"))
+
+        self.assertEqual(Event.objects.filter(mail=mail).count(), 2)
+
+    def test_mail_id_cache(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        with rebel_settings("EVENT_INGESTION", MAIL_ID_CACHE_SIZE=1):
+            self.post_event(webhook_payload(mail, "delivered"))
+
+            self.assertEqual(get_mail_id_cache().maxsize, 1)
+            self.assertEqual(get_mail_id_cache().get((mail.message_id, mail.email_to)), mail.id)
+
+            with CaptureQueriesContext(connection) as queries:
+                self.post_event(webhook_payload(mail, "opened"))
+
+        # Mail is not looked up again
+        self.assertFalse([query for query in queries if query["sql"].startswith("SELECT")])
+
+    def test_missing_mail(self):
+        mail = MailFactory.build(email_to="foo@example.com", message_id="missing")
+
+        response = self.post_event(webhook_payload(mail))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_storage_url(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        self.post_event(webhook_payload(mail, storage={"url": "https://storage.example.com/foo"}))
+
+        mail.refresh_from_db()
+
+        self.assertEqual(mail.storage_url, "https://storage.example.com/foo")
+        self.assertFalse(MailContent.objects.exists())
+
+    def test_queue(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        with rebel_settings("EVENT_INGESTION", MODE="queue"):
+            self.post_event(webhook_payload(mail, "delivered"))
+            self.post_event(webhook_payload(mail, "opened"))
+            self.post_event(webhook_payload(mail, "opened"))
+
+        self.assertEqual(EventQueueItem.objects.count(), 3)
+        self.assertFalse(Event.objects.exists())
+
+        self.assertEqual(EventQueueConsumer(batch_size=2).consume(), 3)
+
+        mail.refresh_from_db()
+
+        self.assertTrue(mail.has_delivered)
+        self.assertTrue(mail.has_opened)
+        self.assertEqual(Event.objects.filter(mail=mail).count(), 3)
+        self.assertFalse(EventQueueItem.objects.exists())
+
+    def test_invalid_payload(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        with rebel_settings("EVENT_INGESTION", MODE="queue"):
+            response = self.post_event(webhook_payload(mail, "x" * 33))
+
+        self.assertEqual(response.status_code, 404)
+
+        # Retries of an event without a timestamp could not be skipped
+        with rebel_settings("EVENT_INGESTION", MODE="queue"):
+            response = self.post_event(webhook_payload(mail, timestamp=None))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(EventQueueItem.objects.exists())
+
+    def test_failing_queue_item(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        # Payloads which are queued before they were validated
+        bad_items = [
+            EventQueueItem.objects.create(payload=json.loads(webhook_payload(mail, "x" * 33))["event-data"]),
+            EventQueueItem.objects.create(payload=json.loads(webhook_payload(mail, storage="foo"))["event-data"]),
+        ]
+        EventQueueItem.objects.create(payload=json.loads(webhook_payload(mail, "delivered"))["event-data"])
+
+        consumer = EventQueueConsumer(batch_size=10, max_attempts=2)
+
+        with mock.patch("django_rebel.ingestion.parse_event_data", side_effect=lambda event_data: (
+                event_data["message"]["headers"]["message-id"], event_data["recipient"], event_data["event"])):
+            self.assertEqual(consumer.consume(), 5)
+
+        mail.refresh_from_db()
+
+        # Valid events of the batch are still applied, bad items are kept as dead letters
+        self.assertTrue(mail.has_delivered)
+        self.assertEqual(set(EventQueueItem.objects.values_list("id", flat=True)), {item.id for item in bad_items})
+        self.assertEqual(set(EventQueueItem.objects.values_list("attempts", flat=True)), {2})
+        self.assertIn("too long", EventQueueItem.objects.get(id=bad_items[0].id).last_error)
+        self.assertEqual(consumer.consume(), 0)
+
+        # Items which are queued before the validation are skipped as invalid
+        EventQueueItem.objects.update(attempts=0)
+
+        self.assertEqual(consumer.consume(), 2)
+        self.assertFalse(EventQueueItem.objects.exists())
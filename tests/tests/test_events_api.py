@@ -0,0 +1,49 @@
+import datetime
+import json
+import re
+
+import httpretty
+from django.test import SimpleTestCase
+
+from django_rebel.api.mailgun import Mailgun
+
+EVENTS_URL = "https://api.mailgun.net/v3/mg.example.com/events"
+
+
+def page(items, next_page):
+    return json.dumps({
+        "items": items,
+        "paging": {"next": "%s/%s" % (EVENTS_URL, next_page)}
+    })
+
+
+class EventPaginatorTestCase(SimpleTestCase):
+    def register_pages(self):
+        httpretty.register_uri(httpretty.GET, re.compile(r".*/events/page-2"),
+                               body=page([{"id": "3"}], "page-3"))
+        httpretty.register_uri(httpretty.GET, re.compile(r".*/events/page-3"),
+                               body=page([], "page-4"))
+        httpretty.register_uri(httpretty.GET, re.compile(r".*/events(\?.*)?$"),
+                               body=page([{"id": "1"}, {"id": "2"}], "page-2"))
+
+    @httpretty.activate
+    def test_iterate(self):
+        self.register_pages()
+
+        items = Mailgun("DEFAULT").event.iterate(begin=datetime.datetime(2020, 1, 1), ascending=True, limit=1000)
+
+        self.assertEqual([item["id"] for item in items], ["1", "2", "3"])
+
+        first_request = [request for request in httpretty.latest_requests() if "begin" in request.querystring][0]
+
+        self.assertEqual(first_request.querystring["begin"], ["1577836800.0"])
+        self.assertEqual(first_request.querystring["ascending"], ["yes"])
+        self.assertEqual(first_request.querystring["limit"], ["300"])
+
+    @httpretty.activate
+    def test_iterate_without_prefetch(self):
+        self.register_pages()
+
+        items = Mailgun("DEFAULT").event.iterate(prefetch=False)
+
+        self.assertEqual([item["id"] for item in items], ["1", "2", "3"])
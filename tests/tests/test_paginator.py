@@ -0,0 +1,190 @@
+import datetime
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from django_rebel.admin import KeysetListAdminMixin
+from django_rebel.models import Event, Mail
+from django_rebel.paginator import KeysetPaginator, InvalidCursor, LargeListPaginator
+
+from tests.factories import EventFactory, MailFactory, TeamFactory, rebel_settings
+
+
+class KeysetPaginatorTestCase(TestCase):
+    def setUp(self):
+        for index in range(7):
+            MailFactory.create(email_to="user%d@example.com" % index)
+
+        # Mails which are created at the same time are ordered by id
+        created_at = timezone.now() - datetime.timedelta(days=1)
+        Mail.objects.filter(id__in=list(Mail.objects.order_by("id").values_list("id", flat=True)[:4])) \
+            .update(created_at=created_at)
+
+        self.mail_ids = list(Mail.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def get_ids(self, page):
+        return [mail.id for mail in page]
+
+    def test_pages(self):
+        paginator = KeysetPaginator(None, Mail.objects.all(), 3)
+
+        first_page = paginator.get_cursor_page()
+        self.assertEqual(self.get_ids(first_page), self.mail_ids[:3])
+        self.assertFalse(first_page.has_previous())
+
+        second_page = paginator.get_cursor_page(first_page.next_cursor)
+        self.assertEqual(self.get_ids(second_page), self.mail_ids[3:6])
+
+        last_page = paginator.get_cursor_page(second_page.next_cursor)
+        self.assertEqual(self.get_ids(last_page), self.mail_ids[6:])
+        self.assertFalse(last_page.has_next())
+
+        self.assertEqual(self.get_ids(paginator.get_cursor_page(last_page.previous_cursor)), self.mail_ids[3:6])
+
+        previous_page = paginator.get_cursor_page(second_page.previous_cursor)
+        self.assertEqual(self.get_ids(previous_page), self.mail_ids[:3])
+        self.assertFalse(previous_page.has_previous())
+        self.assertTrue(previous_page.has_next())
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(None, Mail.objects.all(), 3)
+
+        for cursor in ["foo", "W10", "WyJuZXh0IiwxXQ"]:
+            with self.assertRaises(InvalidCursor):
+                paginator.get_cursor_page(cursor)
+
+    def test_admin(self):
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True, is_staff=True))
+
+        url = reverse("admin:django_rebel_mail_changelist")
+
+        cursor = KeysetPaginator(None, Mail.objects.all(), 100).encode_cursor(Mail.objects.get(id=self.mail_ids[2]),
+                                                                              KeysetPaginator.NEXT)
+        response = self.client.get(url, {"cursor": cursor})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "admin/rebel_keyset_pagination.html")
+        self.assertContains(response, "Previous")
+        self.assertEqual([mail.id for mail in response.context["cl"].result_list], self.mail_ids[3:])
+        self.assertIn("cursor=", response.context["cl"].get_previous_url())
+        self.assertIsNone(response.context["cl"].get_next_url())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {"cursor": response.context["cl"].page.previous_cursor})
+
+        self.assertFalse([query for query in queries if "OFFSET" in query["sql"]])
+
+        response = self.client.get(url, {"cursor": "foo"})
+
+        self.assertEqual([mail.id for mail in response.context["cl"].result_list], self.mail_ids)
+
+    def test_other_admin(self):
+        class EventAdmin(KeysetListAdminMixin, admin.ModelAdmin):
+            pass
+
+        mail = Mail.objects.get(id=self.mail_ids[0])
+        for name in ["delivered", "opened", "clicked"]:
+            EventFactory.create(mail=mail, name=name)
+
+        request = RequestFactory().get("/", {"cursor": "foo"})
+        request.user = User.objects.create(username="admin", is_superuser=True, is_staff=True)
+
+        model_admin = EventAdmin(Event, admin.AdminSite())
+        model_admin.list_per_page = 2
+        response = model_admin.changelist_view(request)
+        response.render()
+
+        self.assertContains(response, "Next")
+        self.assertNotContains(response, "Previous")
+        self.assertIn("cursor=", response.context_data["cl"].get_next_url())
+
+
+class LargeListPaginatorTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        for index in range(5):
+            MailFactory.create(email_to="user%d@example.com" % index, profile="default" if index < 3 else "other")
+
+    def get_count(self, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            count = LargeListPaginator(100, queryset.order_by("id"), 10).count
+
+        return count, [query["sql"] for query in queries]
+
+    def test_exact_count(self):
+        count, queries = self.get_count(Mail.objects.filter(profile="default"))
+
+        self.assertEqual(count, 3)
+        self.assertTrue([query for query in queries if query.startswith("EXPLAIN (FORMAT JSON)")])
+        self.assertIn("COUNT(*)", queries[-1])
+
+        self.assertEqual(self.get_count(Mail.objects.filter(profile="default")), (3, []))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(LargeListPaginator(100, Mail.objects.filter(profile="default").order_by("-created_at"),
+                                                10).count, 3)
+
+        self.assertEqual(self.get_count(Mail.objects.filter(profile="other"))[0], 2)
+        self.assertEqual(self.get_count(Mail.objects.filter(id__in=[]))[0], 0)
+
+    @rebel_settings("LIST_COUNT", EXACT_THRESHOLD=0, CACHE_TTL=0)
+    def test_estimate(self):
+        # Planner estimates the rows from the statistics of the table
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE %s" % Mail._meta.db_table)
+
+        count, queries = self.get_count(Mail.objects.filter(profile="default"))
+
+        self.assertEqual(count, 3)
+        self.assertNotIn("COUNT(*)", "".join(queries))
+
+        count, queries = self.get_count(Mail.objects.filter(profile="default"))
+
+        self.assertEqual(count, 3)
+        self.assertTrue(queries)
+
+    @rebel_settings("LIST_COUNT", ESTIMATE=False)
+    def test_without_estimate(self):
+        count, queries = self.get_count(Mail.objects.all())
+
+        self.assertEqual(count, 5)
+        self.assertEqual([query for query in queries if "pg_class" in query or "EXPLAIN" in query], [])
+
+
+class MailAdminTestCase(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True, is_staff=True))
+
+    def get_changelist_queries(self):
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:django_rebel_mail_changelist"))
+
+        self.assertEqual(response.status_code, 200)
+
+        return [query["sql"] for query in queries]
+
+    def create_mails(self, count):
+        # Owners of every content type are fetched with their own query
+        for index in range(count):
+            MailFactory.create(email_to="user%d@example.com" % index)
+            MailFactory.create(email_to="team%d@example.com" % index, owner_object=TeamFactory.create())
+
+    def test_changelist_queries(self):
+        self.create_mails(1)
+
+        queries = self.get_changelist_queries()
+
+        self.create_mails(10)
+
+        self.assertEqual(len(self.get_changelist_queries()), len(queries))
+        self.assertFalse([query for query in queries if "django_rebel_event" in query])
+        self.assertFalse([query for query in queries if "storage_url" in query])
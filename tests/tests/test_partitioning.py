@@ -0,0 +1,126 @@
+import datetime
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from django_rebel.ingestion import ingest_event, EventIngestor
+from django_rebel.models import Event, Mail
+from django_rebel.partitioning import EventPartitionManager
+
+from tests.factories import MailFactory, EventFactory, event_data
+
+NOW = datetime.datetime(2026, 12, 10, tzinfo=datetime.timezone.utc)
+
+
+def utc(*args):
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+
+
+@mock.patch.object(EventPartitionManager, "now", lambda self: NOW)
+class EventPartitionManagerTestCase(TestCase):
+    def test_convert(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+        legacy_event = EventFactory.create(mail=mail, name="delivered")
+        Event.objects.filter(id=legacy_event.id).update(created_at=None)
+
+        manager = EventPartitionManager(partitions_ahead=2)
+
+        self.assertFalse(manager.is_partitioned())
+        self.assertTrue(manager.convert(batch_size=1))
+        self.assertTrue(manager.is_partitioned())
+        self.assertFalse(manager.convert())
+        self.assertIsNotNone(Event.objects.get(id=legacy_event.id).created_at)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'django_rebel_event_legacy'")
+
+            index_names = {name for name, in cursor.fetchall()}
+
+        # Prebuilt indexes are attached, none of them is built again
+        self.assertIn("django_rebel_event_legacy_part_pkey", index_names)
+        self.assertIn("django_rebel_event_legacy_provider_id_part_key", index_names)
+        self.assertEqual(len(index_names), 5)
+
+        partitions = {partition.name: partition for partition in manager.get_partitions()}
+
+        self.assertEqual(set(partitions.keys()), {
+            "django_rebel_event_legacy", "django_rebel_event_default",
+            "django_rebel_event_p202702",
+        })
+        self.assertIsNone(partitions["django_rebel_event_legacy"].lower)
+        self.assertEqual(partitions["django_rebel_event_legacy"].upper, utc(2027, 2, 1))
+        self.assertTrue(partitions["django_rebel_event_default"].is_default)
+
+        self.assertTrue(ingest_event(event_data(mail, event_id="event-1", timestamp=utc(2027, 1, 5))))
+        # Retried event has the same timestamp, so it is still skipped
+        self.assertTrue(ingest_event(event_data(mail, event_id="event-1", timestamp=utc(2027, 1, 5))))
+
+        ingestor = EventIngestor()
+        ingestor.ingest([
+            event_data(mail, event_id="event-2", event="clicked", timestamp=utc(2027, 3, 5)),
+            event_data(mail, event_id="event-1", timestamp=utc(2027, 1, 5)),
+        ])
+
+        self.assertEqual(ingestor.stats["ingested"], 1)
+        self.assertEqual(ingestor.stats["duplicate"], 1)
+
+        self.assertEqual(Event.objects.filter(mail=mail).count(), 3)
+        self.assertTrue(Event.objects.filter(id=legacy_event.id).exists())
+
+        mail = Mail.objects.get(id=mail.id)
+
+        self.assertTrue(mail.has_opened)
+        self.assertTrue(mail.has_clicked)
+
+        mail.delete()
+
+        self.assertFalse(Event.objects.exists())
+
+    def test_late_partition(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        manager = EventPartitionManager(partitions_ahead=1)
+        manager.convert()
+
+        # Partition of the event is not created yet, so it lands in the default partition
+        self.assertTrue(ingest_event(event_data(mail, event_id="event-1", timestamp=utc(2027, 3, 5))))
+
+        with mock.patch.object(EventPartitionManager, "now", lambda self: utc(2027, 3, 10)):
+            self.assertEqual(manager.create_partitions(), ["django_rebel_event_p202703", "django_rebel_event_p202704"])
+
+        self.assertEqual(manager.moved_events, {"django_rebel_event_p202703": 1})
+        self.assertTrue(any(partition.is_default for partition in manager.get_partitions()))
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM django_rebel_event WHERE provider_id = 'event-1'")
+
+            self.assertEqual(cursor.fetchall(), [("django_rebel_event_p202703",)])
+
+        # Retried event is still skipped
+        self.assertTrue(ingest_event(event_data(mail, event_id="event-1", timestamp=utc(2027, 3, 5))))
+        self.assertEqual(Event.objects.filter(mail=mail).count(), 1)
+
+    def test_drop_expired_partitions(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        manager = EventPartitionManager(partitions_ahead=1, retention_days=30)
+        manager.convert()
+
+        ingest_event(event_data(mail, event_id="event-1", timestamp=utc(2027, 1, 5)))
+        ingest_event(event_data(mail, event_id="event-2", timestamp=utc(2027, 6, 15)))
+
+        self.assertEqual(manager.drop_expired_partitions(), [])
+
+        with mock.patch.object(EventPartitionManager, "now", lambda self: datetime.datetime(
+                2027, 3, 10, tzinfo=datetime.timezone.utc)):
+            self.assertEqual(manager.create_partitions(), ["django_rebel_event_p202703", "django_rebel_event_p202704"])
+            self.assertEqual(manager.drop_expired_partitions(), ["django_rebel_event_legacy"])
+
+        with mock.patch.object(EventPartitionManager, "now", lambda self: datetime.datetime(
+                2027, 7, 1, tzinfo=datetime.timezone.utc)):
+            self.assertEqual(manager.drop_expired_partitions(),
+                             ["django_rebel_event_p202703", "django_rebel_event_p202704"])
+
+        # Event after every partition is kept in the default partition until it expires
+        self.assertEqual(list(Event.objects.values_list("provider_id", flat=True)), ["event-2"])
@@ -1,9 +1,11 @@
+import json
 import re
 
 from django.test import TestCase
 from httpretty import httpretty
 
 from django_rebel.exceptions import RebelAPIError
+from django_rebel.models import MailBody, MailContent
 from django_rebel.services import PreparedMail
 
 
@@ -33,3 +35,34 @@ class PreparedMailTestCase(TestCase):
 
         with self.assertRaises(RebelAPIError):
             prepared_mail.send(fail_silently=False)
+
+    def test_store_content(self):
+        httpretty.enable()
+        self.addCleanup(httpretty.disable)
+
+        httpretty.register_uri(
+            httpretty.POST,
+            re.compile(r'.*'),
+            body=json.dumps({"id": "<message@mg.example.com>", "message": "Queued. Thank you."}),
+            status=200
+        )
+
+        prepared_mail = PreparedMail(subject="Subject", text="Text", html="<p>Html</p>", store_content=True)
+        prepared_mail.add_receiver(email_to="foo@example.com")
+        prepared_mail.add_receiver(email_to="bar@example.com")
+
+        mails, status = prepared_mail.send()
+
+        self.assertTrue(status)
+        self.assertEqual(MailContent.objects.filter(mail__in=mails).count(), 2)
+        self.assertEqual(MailBody.objects.get().ref_count, 2)
+
+        content = MailContent.objects.get(mail=mails[0])
+
+        self.assertEqual(content.subject, "Subject")
+        self.assertEqual(content.get_body_text(), "Text")
+        self.assertIn("<p>Html</p>", content.get_body_html())
+
+        PreparedMail(subject="Subject", text="Text").send()
+
+        self.assertEqual(MailContent.objects.count(), 2)
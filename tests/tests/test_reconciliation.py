@@ -0,0 +1,68 @@
+import json
+import re
+
+import httpretty
+from django.test import TestCase
+
+from django_rebel.api.sessions import sessions
+from django_rebel.models import Event, EventSyncCursor, Mail
+from django_rebel.reconciliation import EventReconciler
+
+from tests.factories import MailFactory, event_data
+
+EVENTS_URL = "https://api.mailgun.net/v3/mg.example.com/events"
+
+
+class EventReconcilerTestCase(TestCase):
+    def tearDown(self):
+        sessions.clear()
+
+    def register_events(self, items):
+        httpretty.register_uri(httpretty.GET, re.compile(r".*/events/end"),
+                               body=json.dumps({"items": [], "paging": {}}))
+        httpretty.register_uri(httpretty.GET, re.compile(r".*/events(\?.*)?$"),
+                               body=json.dumps({"items": items, "paging": {"next": EVENTS_URL + "/end"}}))
+
+    @httpretty.activate
+    def test_run(self):
+        mail = MailFactory.create(email_to="foo@example.com")
+
+        items = [
+            event_data(mail, event_id="event-1", event="delivered", timestamp=100.0),
+            event_data(mail, event_id="event-2", event="opened", timestamp=101.0),
+            event_data(mail, event_id="event-3", event="opened", timestamp=102.0),
+            event_data(mail, event_id="event-1", event="delivered", timestamp=103.0),
+            {"event": "opened", "id": "event-5", "timestamp": 104.0},
+        ]
+
+        self.register_events(items)
+
+        stats = EventReconciler("DEFAULT", batch_size=2).run(end=1000.0)
+
+        mail.refresh_from_db()
+
+        self.assertTrue(mail.has_delivered)
+        self.assertTrue(mail.has_opened)
+        self.assertFalse(mail.has_clicked)
+        self.assertEqual(Event.objects.filter(mail=mail, name="opened").count(), 2)
+        self.assertEqual(Event.objects.filter(mail=mail, name="delivered").count(), 1)
+        self.assertEqual(stats["invalid"], 1)
+        self.assertEqual(EventSyncCursor.objects.get(profile="DEFAULT").timestamp, 104.0)
+
+        # Repeated runs do not create the same events again
+        EventReconciler("DEFAULT").run()
+
+        self.assertEqual(Event.objects.filter(mail=mail).count(), 3)
+        self.assertEqual(Mail.objects.filter(has_opened=True).count(), 1)
+
+    @httpretty.activate
+    def test_run_without_events(self):
+        self.register_events([])
+
+        EventReconciler("DEFAULT", overlap=60).run(end=1000.0)
+
+        self.assertEqual(EventSyncCursor.objects.get(profile="DEFAULT").timestamp, 940.0)
+
+        EventReconciler("DEFAULT", overlap=60).run()
+
+        self.assertEqual(httpretty.last_request().querystring["begin"], ["880.0"])
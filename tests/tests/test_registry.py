@@ -0,0 +1,119 @@
+import json
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from httpretty import httpretty
+
+from django_rebel.models import Mail, MailLabel
+from django_rebel.registry import label_registry, content_type_registry, LabelRegistry
+from django_rebel.services import PreparedMail
+
+from tests.factories import MailLabelFactory, OwnerFactory, rebel_settings
+from tests.models import Owner
+
+
+class RegistryTestCase(TestCase):
+    def setUp(self):
+        label_registry.invalidate()
+        content_type_registry.invalidate()
+
+    def test_labels(self):
+        label = MailLabelFactory.create(name="Welcome", slug="welcome")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(label_registry.get_choices(), [("welcome", "Welcome")])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(label_registry.get_id("welcome"), label.id)
+
+        # Missing labels are not trusted to the loaded registry
+        with self.assertNumQueries(1):
+            self.assertIsNone(label_registry.get_id("missing"))
+
+        label.name = "Hello"
+        label.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(label_registry.get_choices(), [("welcome", "Hello")])
+
+        label.delete()
+
+        self.assertIsNone(label_registry.get_id("welcome"))
+
+    def test_rolled_back_label(self):
+        label_registry.get_or_create_id("welcome")
+
+        # Label is not kept until its transaction is committed
+        MailLabel.objects.all().delete()
+
+        self.assertIsNone(label_registry.get_id("welcome"))
+
+    def test_other_process(self):
+        label = MailLabelFactory.create(name="Welcome", slug="welcome")
+        other_registry = LabelRegistry()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_registry.load()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(other_registry.get_id("welcome"), label.id)
+
+        label_registry.invalidate()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(other_registry.get_id("welcome"), label.id)
+
+    def test_unannounced_label(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            label_registry.load()
+
+        # Label of another process which is not announced by a per process cache
+        label = MailLabel.objects.bulk_create([MailLabel(name="Welcome", slug="welcome")])[0]
+
+        self.assertEqual(label_registry.get_id("welcome"), label.id)
+
+    def test_process_local_cache(self):
+        label = MailLabelFactory.create(name="Welcome", slug="welcome")
+
+        # Deleted labels would not be dropped by the other processes, so labels are not kept
+        with rebel_settings("REGISTRY"), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(label_registry.get_choices(), [("welcome", "Welcome")])
+
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    self.assertEqual(label_registry.get_id("welcome"), label.id)
+
+    def test_send(self):
+        httpretty.enable()
+        self.addCleanup(httpretty.disable)
+
+        httpretty.register_uri(
+            httpretty.POST,
+            re.compile(r'.*'),
+            body=json.dumps({"id": "<message@mg.example.com>", "message": "Queued. Thank you."}),
+            status=200
+        )
+
+        def send(owner):
+            prepared_mail = PreparedMail(subject="Subject", text="Text", label="welcome")
+            prepared_mail.add_receiver(owner=owner)
+
+            with CaptureQueriesContext(connection) as queries:
+                mails, _ = prepared_mail.send()
+
+            return mails, [query["sql"] for query in queries]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            send(OwnerFactory.create(email="foo@example.com"))
+
+        owner = OwnerFactory.create(email="bar@example.com")
+        mails, queries = send(owner)
+
+        self.assertFalse([query for query in queries if "django_rebel_maillabel" in query or
+                          "django_content_type" in query])
+        self.assertEqual(mails[0].owner_object, owner)
+        self.assertEqual(Mail.objects.get(id=mails[0].id).owner_object, owner)
+        self.assertEqual(Mail.objects.get(id=mails[0].id).label.slug, "welcome")
+        self.assertEqual(content_type_registry.get_id(Owner), content_type_registry.get_id(owner))
@@ -0,0 +1,45 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from django_rebel.models import Mail, MailContent, Event
+from django_rebel.retention import MailPurger
+
+from tests.factories import MailFactory, MailLabelFactory, MailContentFactory, EventFactory
+
+
+class MailPurgerTestCase(TestCase):
+    def create_mail(self, days_ago, **kwargs):
+        mail = MailFactory.create(**kwargs)
+        MailContentFactory.create(mail=mail, subject="Subject")
+        EventFactory.create(mail=mail, name="delivered")
+        EventFactory.create(mail=mail, name="opened")
+
+        Mail.objects.filter(id=mail.id).update(created_at=timezone.now() - timezone.timedelta(days=days_ago))
+
+        return mail
+
+    def test_run(self):
+        label = MailLabelFactory.create(name="Newsletter", slug="newsletter")
+
+        old_mails = [self.create_mail(40, label=label, profile="DEFAULT") for _ in range(5)]
+        other_profile_mail = self.create_mail(40, label=label, profile="OTHER")
+        unlabeled_mail = self.create_mail(40, profile="DEFAULT")
+        new_mail = self.create_mail(1, label=label, profile="DEFAULT")
+
+        progress = []
+
+        purger = MailPurger(timezone.now() - timezone.timedelta(days=30), label="newsletter", profile="DEFAULT",
+                            chunk_size=2, sleep=0, progress=lambda stats: progress.append(dict(stats)))
+
+        self.assertEqual(purger.count(), 5)
+
+        stats = purger.run()
+
+        self.assertEqual(stats, {"mails": 5, "contents": 5, "events": 10, "chunks": 3})
+        self.assertEqual([item["mails"] for item in progress], [2, 4, 5])
+
+        self.assertFalse(Mail.objects.filter(id__in=[mail.id for mail in old_mails]).exists())
+        self.assertEqual(set(Mail.objects.values_list("id", flat=True)),
+                         {other_profile_mail.id, unlabeled_mail.id, new_mail.id})
+        self.assertEqual(MailContent.objects.count(), 3)
+        self.assertEqual(Event.objects.count(), 6)
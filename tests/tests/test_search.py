@@ -0,0 +1,140 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from django_rebel.models import Mail, MailBody, MailContent
+from django_rebel.search import get_search_text, search_mails
+from django_rebel.stats import add_daily_stats, rollup_daily_stats
+from django_rebel.storage import save_contents
+
+from tests.factories import MailFactory, MailContentFactory, rebel_settings
+
+
+class TagSearchTestCase(TestCase):
+    def setUp(self):
+        self.foo = MailFactory.create(tags=["foo"])
+        self.foo_bar = MailFactory.create(tags=["foo", "bar"])
+        self.baz = MailFactory.create(tags=["baz"])
+        MailFactory.create(tags=None)
+
+        add_daily_stats({mail.id: {"sent"} for mail in (self.foo, self.foo_bar, self.baz)})
+        rollup_daily_stats()
+
+    def test_lookups(self):
+        self.assertEqual(set(Mail.objects.with_tags("foo")), {self.foo, self.foo_bar})
+        self.assertEqual(set(Mail.objects.with_tags("foo", "bar")), {self.foo_bar})
+        self.assertEqual(set(Mail.objects.with_any_tags("bar", "baz")), {self.foo_bar, self.baz})
+
+    def test_admin_filter(self):
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True, is_staff=True))
+
+        url = reverse("admin:django_rebel_mail_changelist")
+
+        response = self.client.get(url, {"tag": "foo"})
+
+        self.assertEqual(set(response.context["cl"].result_list), {self.foo, self.foo_bar})
+
+        tag_filter = next(spec for spec in response.context["cl"].filter_specs if spec.parameter_name == "tag")
+
+        self.assertIn(("baz", "baz"), list(tag_filter.lookup_choices))
+
+        response = self.client.get(url, {"tag": "bar,baz"})
+
+        self.assertEqual(set(response.context["cl"].result_list), {self.foo_bar, self.baz})
+
+
+class FullTextSearchTestCase(TestCase):
+    def setUp(self):
+        self.invoice = MailFactory.create(email_to="foo@example.com")
+        self.welcome = MailFactory.create(email_to="bar@example.com")
+
+    def save_contents(self):
+        save_contents([
+            (self.invoice.id, {"subject": "Your invoice", "body_text": "Payment is due on Monday"}),
+            (self.welcome.id, {"subject": "Welcome", "body_html": "<p>Thanks for joining, see your invoice</p>"}),
+        ])
+
+    @rebel_settings("SEARCH", FULL_TEXT=True)
+    def test_search(self):
+        self.save_contents()
+
+        self.assertEqual(set(search_mails("invoice")), {self.invoice, self.welcome})
+        self.assertEqual(list(search_mails("payment due")), [self.invoice])
+        self.assertEqual(list(search_mails("joining -payment")), [self.welcome])
+        # Tags of the html are not indexed
+        self.assertEqual(list(search_mails("p")), [])
+
+    def test_not_indexed(self):
+        self.save_contents()
+
+        self.assertFalse(MailBody.objects.filter(search_vector__isnull=False).exists())
+        self.assertEqual(list(search_mails("invoice")), [])
+
+    @rebel_settings("SEARCH", FULL_TEXT=True, MAX_LENGTH=7)
+    def test_index_contents(self):
+        with rebel_settings("SEARCH"):
+            self.save_contents()
+
+        call_command("rebel_index_contents", chunk_size=1, stdout=StringIO())
+
+        self.assertFalse(MailBody.objects.filter(search_vector__isnull=True).exists())
+        self.assertEqual(list(search_mails("payment")), [self.invoice])
+        self.assertEqual(list(search_mails("due")), [])
+
+    @rebel_settings("SEARCH", MAX_LENGTH=12)
+    def test_search_text(self):
+        self.assertEqual(get_search_text({"body_html": "<p>Payment</p><p>is due</p>"}), "Payment")
+        self.assertEqual(get_search_text({"body_text": "Payment is due", "body_html": "<p>Hello</p>"}),
+                         "Payment is d")
+
+    @rebel_settings("SEARCH", FULL_TEXT=True)
+    def test_inline_content(self):
+        # Content which is saved before the shared bodies keeps its body inline
+        content = MailContentFactory.create(mail=self.invoice, subject="Your invoice",
+                                            body_text="Payment is due on Monday")
+        MailContentFactory.create(mail=self.welcome, subject="Welcome", body_text="Payment is due on Monday")
+
+        stdout = StringIO()
+        call_command("rebel_index_contents", chunk_size=1, stdout=stdout)
+
+        # Inline contents are only moved on request
+        self.assertIn("--move-inline", stdout.getvalue())
+        self.assertEqual(MailContent.objects.get(id=content.id).body_text, "Payment is due on Monday")
+        self.assertEqual(list(search_mails("monday")), [])
+
+        call_command("rebel_index_contents", chunk_size=1, move_inline=True, stdout=StringIO())
+
+        content = MailContent.objects.get(id=content.id)
+
+        self.assertIsNone(content.body_text)
+        self.assertEqual(content.get_body_text(), "Payment is due on Monday")
+        self.assertEqual(content.body.ref_count, 1)
+        self.assertEqual(list(search_mails("invoice")), [self.invoice])
+        self.assertEqual(set(search_mails("monday")), {self.invoice, self.welcome})
+
+    @rebel_settings("SEARCH", FULL_TEXT=True, ADMIN_MODE="content")
+    def test_admin_content_mode(self):
+        self.save_contents()
+
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True, is_staff=True))
+
+        url = reverse("admin:django_rebel_mail_changelist")
+
+        response = self.client.get(url, {"q": "payment"})
+
+        self.assertEqual(list(response.context["cl"].result_list), [self.invoice])
+
+        response = self.client.get(url, {"q": "bar@example.com"})
+
+        self.assertEqual(list(response.context["cl"].result_list), [self.welcome])
+
+    @rebel_settings("SEARCH", ADMIN_MODE="substring")
+    def test_admin_substring_mode(self):
+        self.client.force_login(User.objects.create(username="admin", is_superuser=True, is_staff=True))
+
+        response = self.client.get(reverse("admin:django_rebel_mail_changelist"), {"q": "FOO@"})
+
+        self.assertEqual(list(response.context["cl"].result_list), [self.invoice])
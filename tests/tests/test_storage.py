@@ -0,0 +1,99 @@
+import json
+import re
+
+import httpretty
+from django.test import TestCase
+from django.utils import timezone
+
+from django_rebel.models import Mail, MailBody, MailContent
+from django_rebel.retention import MailPurger
+from django_rebel.storage import StorageFetcher, save_contents
+
+from tests.factories import MailFactory
+
+STORAGE_URL = "https://storage.mailgun.net/v3/domains/mg.example.com/messages/%s"
+
+
+class StorageFetcherTestCase(TestCase):
+    @httpretty.activate
+    def test_run(self):
+        requested_urls = []
+
+        def storage_request(request, uri, response_headers):
+            requested_urls.append(uri)
+
+            if uri.endswith("missing"):
+                return [404, response_headers, "{}"]
+
+            if uri.endswith("forbidden"):
+                return [403, response_headers, "{}"]
+
+            return [200, response_headers, json.dumps({
+                "subject": "Subject",
+                "stripped-text": "Text",
+                "stripped-html": "<p>Html</p>",
+                "body-plain": "Plain",
+            })]
+
+        httpretty.register_uri(httpretty.GET, re.compile(r".*"), body=storage_request)
+
+        shared_mail_1 = MailFactory.create(profile="DEFAULT", storage_url=STORAGE_URL % "shared")
+        shared_mail_2 = MailFactory.create(profile="DEFAULT", storage_url=STORAGE_URL % "shared")
+        missing_mail = MailFactory.create(profile="DEFAULT", storage_url=STORAGE_URL % "missing")
+        forbidden_mail = MailFactory.create(profile="DEFAULT", storage_url=STORAGE_URL % "forbidden")
+        MailFactory.create()
+
+        stats = StorageFetcher(batch_size=2).run()
+
+        self.assertEqual(stats["fetched"], 2)
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(stats["gone"], 1)
+        self.assertEqual(set(MailContent.objects.values_list("mail_id", flat=True)),
+                         {shared_mail_1.id, shared_mail_2.id})
+        self.assertEqual(MailContent.objects.get(mail=shared_mail_1).get_body_html(), "<p>Html</p>")
+        # Mails which share a storage url share the body
+        self.assertEqual(MailBody.objects.get().ref_count, 2)
+        self.assertFalse(MailContent.objects.filter(mail=missing_mail).exists())
+
+        # Messages which are gone are not requested again, the other failures are retried
+        self.assertIsNone(Mail.objects.get(id=missing_mail.id).storage_url)
+        self.assertEqual(Mail.objects.get(id=forbidden_mail.id).storage_url, STORAGE_URL % "forbidden")
+
+        requested_urls.clear()
+        StorageFetcher().run()
+
+        self.assertEqual(requested_urls, [STORAGE_URL % "forbidden"])
+
+
+class SaveContentsTestCase(TestCase):
+    def test_shared_bodies(self):
+        newsletter = {"subject": "Newsletter", "body_text": "Text", "body_html": "<p>Html</p>", "body_plain": "Plain"}
+        other = dict(newsletter, body_html="<p>Other</p>")
+
+        mails = [MailFactory.create() for _ in range(4)]
+
+        self.assertEqual(save_contents([(mails[0].id, newsletter), (mails[1].id, newsletter),
+                                        (mails[2].id, newsletter), (mails[3].id, other)]), 4)
+        # Mails which already have a content are skipped without a new reference
+        self.assertEqual(save_contents([(mails[0].id, newsletter)]), 0)
+
+        newsletter_body = MailContent.objects.get(mail=mails[0]).body
+
+        self.assertEqual(MailBody.objects.count(), 2)
+        self.assertEqual(newsletter_body.ref_count, 3)
+        self.assertEqual(MailContent.objects.get(mail=mails[1]).get_body_html(), "<p>Html</p>")
+        self.assertEqual(MailContent.objects.get(mail=mails[3]).get_body_html(), "<p>Other</p>")
+        self.assertEqual(MailContent.objects.get(mail=mails[3]).subject, "Newsletter")
+
+        mails[0].delete()
+
+        self.assertEqual(MailBody.objects.get(id=newsletter_body.id).ref_count, 2)
+
+        Mail.objects.filter(id__in=[mails[1].id, mails[2].id]).update(
+            created_at=timezone.now() - timezone.timedelta(days=10))
+
+        MailPurger(timezone.now() - timezone.timedelta(days=1), sleep=0).run()
+
+        # Last contents of the body are purged
+        self.assertFalse(MailBody.objects.filter(id=newsletter_body.id).exists())
+        self.assertEqual(MailBody.objects.get().ref_count, 1)
@@ -0,0 +1,91 @@
+import json
+import re
+from unittest import mock
+
+import httpretty
+from django.test import SimpleTestCase
+
+from django_rebel.api.mailgun import Mailgun
+from django_rebel.api.throttling import TokenBucket, throttles
+from django_rebel.exceptions import RebelAPIError
+
+from tests.factories import rebel_settings
+
+# Rate limit of the default profile
+RATE_LIMIT_KEY = ("EMAIL_PROFILES", "DEFAULT", "API", "RATE_LIMIT")
+
+
+class TokenBucketTestCase(SimpleTestCase):
+    def test_unlimited(self):
+        bucket = TokenBucket()
+
+        self.assertEqual(bucket.reserve(), 0)
+
+    def test_reserve(self):
+        bucket = TokenBucket(rate=10, burst=2)
+
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertGreater(bucket.reserve(), 0)
+
+    def test_pause(self):
+        bucket = TokenBucket()
+        bucket.pause(5)
+
+        self.assertGreater(bucket.reserve(), 4)
+
+    def test_decrease_and_increase(self):
+        bucket = TokenBucket(rate=10)
+
+        bucket.decrease()
+        self.assertEqual(bucket.rate, 5)
+
+        bucket.increase()
+        self.assertEqual(bucket.rate, 5.5)
+
+
+class ThrottledClientTestCase(SimpleTestCase):
+    def setUp(self):
+        throttles.clear()
+
+    def tearDown(self):
+        throttles.clear()
+
+    @httpretty.activate
+    @mock.patch("django_rebel.api.client.time.sleep")
+    def test_retry_rate_limited_request(self, sleep):
+        httpretty.register_uri(
+            httpretty.POST,
+            re.compile(r'.*'),
+            responses=[
+                httpretty.Response(body="{}", status=429, adding_headers={"Retry-After": "2"}),
+                httpretty.Response(body=json.dumps({"id": "<foo>"}), status=200),
+            ]
+        )
+
+        with rebel_settings(RATE_LIMIT_KEY, BACKOFF_BASE=0.01):
+            response = Mailgun("DEFAULT").message.send(subject="foo", to=["foo@example.com"])
+
+        self.assertEqual(response.message_id(), "foo")
+        self.assertGreaterEqual(max(call.args[0] for call in sleep.call_args_list), 2)
+
+    @httpretty.activate
+    @mock.patch("django_rebel.api.client.time.sleep")
+    def test_max_retries(self, sleep):
+        httpretty.register_uri(httpretty.POST, re.compile(r'.*'), body="{}", status=503)
+
+        with rebel_settings(RATE_LIMIT_KEY, MAX_RETRIES=2):
+            with self.assertRaises(RebelAPIError):
+                Mailgun("DEFAULT").message.send(subject="foo", to=["foo@example.com"])
+
+        self.assertEqual(sleep.call_count, 2)
+
+    @httpretty.activate
+    @mock.patch("django_rebel.api.client.time.sleep")
+    def test_post_is_not_retried_on_server_error(self, sleep):
+        httpretty.register_uri(httpretty.POST, re.compile(r'.*'), body="{}", status=500)
+
+        with self.assertRaises(RebelAPIError):
+            Mailgun("DEFAULT").message.send(subject="foo", to=["foo@example.com"])
+
+        sleep.assert_not_called()